@@ -4,9 +4,13 @@ API routes
 from fastapi import APIRouter
 from .game import router as game_router
 from .auth import router as auth_router
+from .stats import router as stats_router
+from .admin import router as admin_router
 
 router = APIRouter()
 
 # Include sub-routers
 router.include_router(game_router, tags=["game"])
-router.include_router(auth_router, prefix="/auth", tags=["auth"])
\ No newline at end of file
+router.include_router(auth_router, prefix="/auth", tags=["auth"])
+router.include_router(stats_router, prefix="/stats", tags=["stats"])
+router.include_router(admin_router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+管理员运维API
+"""
+from typing import Dict, Literal, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from app.core.security import require_admin, CurrentUser
+from app.core.log_config import current_levels, set_levels
+from app.core.profiler import profiler, ProfileAlreadyRunning
+
+router = APIRouter()
+
+MAX_PROFILE_SECONDS = 60
+
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    mode: Literal["sampling", "cprofile"] = "sampling",
+    room_id: Optional[str] = None,
+    format: Literal["text", "pstats"] = "text",
+    sort: Literal["cumulative", "tottime", "ncalls"] = "cumulative",
+    limit: int = Query(50, ge=1, le=500),
+    interval_ms: float = Query(5, ge=1, le=100),
+    admin: CurrentUser = Depends(require_admin)
+):
+    """
+    剖析 seconds 秒后返回结果（请求会等待剖析结束）
+    mode=sampling: 折叠栈文本，可直接生成火焰图
+    mode=cprofile: format=text 返回 pstats 文本，format=pstats 返回可由 pstats.Stats 读取的文件
+    room_id: 只剖析该房间的消息处理和自动出牌
+    """
+    try:
+        session = await profiler.run(mode, seconds, room_id=room_id, interval=interval_ms / 1000)
+    except ProfileAlreadyRunning:
+        raise HTTPException(status_code=409, detail="已有剖析任务在运行")
+
+    if mode == "sampling":
+        return Response(
+            session.collapsed(),
+            media_type="text/plain; charset=utf-8",
+            headers={"X-Profile-Samples": str(session.samples),
+                     "X-Profile-Skipped-Samples": str(session.skipped_samples)}
+        )
+    if format == "pstats":
+        return Response(
+            session.pstats_bytes(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="profile.pstats"'}
+        )
+    return Response(session.pstats_text(sort, limit), media_type="text/plain; charset=utf-8")
+
+
+@router.get("/profile/status")
+async def profile_status(admin: CurrentUser = Depends(require_admin)):
+    """当前是否有剖析任务在运行"""
+    return profiler.status()
+
+
+@router.get("/log-levels")
+async def get_log_levels(admin: CurrentUser = Depends(require_admin)):
+    """根日志（键为空字符串）和单独设置过级别的模块"""
+    return current_levels()
+
+
+@router.put("/log-levels")
+async def put_log_levels(
+    levels: Dict[str, str] = Body(..., examples=[{"app.websocket.game_websocket.countdown": "DEBUG"}]),
+    admin: CurrentUser = Depends(require_admin)
+):
+    """运行中调整模块的日志级别（重启后恢复为 LOG_LEVEL / LOG_LEVELS）"""
+    try:
+        return set_levels(levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
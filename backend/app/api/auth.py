@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
 from app.db.database import get_db
 from app.models.user import User, Stats
-from app.core.security import get_password_hash, verify_password, create_access_token, get_current_user_optional
+from app.services.user_cleanup import user_cleanup, CleanupAlreadyRunning
+from app.core.security import password_hasher, create_access_token, CurrentUser, require_admin
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta
+from datetime import datetime
 
 router = APIRouter()
 
@@ -40,7 +40,7 @@ async def register(user_in: UserRegister, db: AsyncSession = Depends(get_db)):
         )
     
     # 创建新用户
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await password_hasher.hash(user_in.password)
     # 第一个注册的用户设为管理员（简单演示用）
     user_count_result = await db.execute(select(User))
     is_admin = user_count_result.scalars().first() is None
@@ -74,7 +74,7 @@ async def login(user_in: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.username == user_in.username))
     user = result.scalars().first()
     
-    if not user or not verify_password(user_in.password, user.password_hash):
+    if not user or not await password_hasher.verify(user_in.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误"
@@ -93,48 +93,22 @@ async def login(user_in: UserLogin, db: AsyncSession = Depends(get_db)):
         "is_admin": user.is_admin
     }
 
-@router.delete("/cleanup")
+@router.delete("/cleanup", status_code=status.HTTP_202_ACCEPTED)
 async def cleanup_inactive_users(
-    days: int = 30,
-    username: str = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    days: int = Query(30, ge=1),
+    admin: CurrentUser = Depends(require_admin)
 ):
     """
-    管理员清理不活跃用户
+    管理员清理不活跃用户（后台分批执行，进度见 /cleanup/status）
     days: 清理多少天未登录的用户，默认30天
     """
-    if not username:
-        raise HTTPException(status_code=401, detail="未登录")
-    
-    # 检查是否为管理员
-    result = await db.execute(select(User).where(User.username == username))
-    admin_user = result.scalars().first()
-    if not admin_user or not admin_user.is_admin:
-        raise HTTPException(status_code=403, detail="没有管理员权限")
-    
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    # 查找不活跃且非管理员的用户
-    inactive_query = select(User).where(
-        User.last_active < cutoff_date,
-        User.is_admin == False
-    )
-    result = await db.execute(inactive_query)
-    users_to_delete = result.scalars().all()
-    user_ids = [u.id for u in users_to_delete]
-    
-    if not user_ids:
-        return {"message": "没有找到需要清理的用户", "deleted_count": 0}
-    
-    # 删除对应的统计数据
-    await db.execute(delete(Stats).where(Stats.user_id.in_(user_ids)))
-    # 删除用户
-    await db.execute(delete(User).where(User.id.in_(user_ids)))
-    
-    await db.commit()
-    
-    return {
-        "message": f"成功清理了 {len(user_ids)} 个 {days} 天未登录的用户",
-        "deleted_count": len(user_ids)
-    }
+    try:
+        state = user_cleanup.start(days)
+    except CleanupAlreadyRunning:
+        raise HTTPException(status_code=409, detail="已有清理任务在运行")
+    return {"message": f"已开始清理 {days} 天未登录的用户", **state}
 
+@router.get("/cleanup/status")
+async def cleanup_status(admin: CurrentUser = Depends(require_admin)):
+    """清理任务的进度"""
+    return user_cleanup.status()
@@ -1,16 +1,17 @@
 """
 Game API endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Optional
 from pydantic import BaseModel
-import uuid
-from app.models.game import GameRoom, Player, PlayerPosition
-from app.core.security import get_current_user_optional
-from app.db.database import get_db
-from app.models.user import User
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from app.models.game import GameRoom, GameStatus
+from app.core.security import get_current_user_optional, get_current_user_cached, CurrentUser
+from app.services.room_store import room_store
+from app.core.sharding import shard_map
+from app.core.http_cache import etag_matches
+from app.services.drain import drain_state
+from app.services.room_registry import room_registry, RoomCapacityExceeded, SeatError
+from app.services.room_summary import room_summaries, summarize_room, paginate, HIDDEN_ROOMS, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -26,13 +27,46 @@ class JoinRoomRequest(BaseModel):
 class ReconnectRequest(BaseModel):
     token: str
 
-# In-memory storage for demo (will be replaced with database)
-rooms: dict[str, GameRoom] = {}
+# 本进程的房间（映射接口，带令牌/玩家/状态索引）
+rooms = room_registry
+
+async def get_room(room_id: str) -> Optional[GameRoom]:
+    """本进程的房间直接返回，其他房间从房间存储读取最新状态（其他worker创建的或重启前的房间）"""
+    return await rooms.load(room_id)
 
 @router.get("/rooms")
-async def get_rooms() -> List[GameRoom]:
-    """Get all game rooms"""
-    return [room for room in rooms.values() if room.id != "demo"]
+async def get_rooms(
+    request: Request,
+    status: Optional[GameStatus] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    大厅房间列表（摘要，不含手牌和令牌）
+    status: 只返回该状态的房间（waiting / playing / finished）
+    带 If-None-Match 请求且房间列表未变化时返回 304
+    """
+    status_value = status.value if status else None
+    if shard_map.enabled:
+        # 分片部署时其他分片的房间只能从共享的房间存储中读取，不缓存
+        summaries = room_summaries.values()
+        for room_id in await room_store.room_ids():
+            if room_id not in rooms and room_id not in HIDDEN_ROOMS:
+                room = await room_store.load_room(room_id)
+                if room is not None:
+                    summaries.append(summarize_room(room))
+        # version 与本进程大厅推送的版本号一致，客户端据此判断是否比推送的列表旧
+        return {"version": room_summaries.version, **paginate(summaries, status_value, offset, limit)}
+
+    etag = room_summaries.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=room_summaries.page(status_value, offset, limit),
+        media_type="application/json",
+        headers=headers
+    )
 
 @router.post("/rooms")
 async def create_room(
@@ -40,6 +74,7 @@ async def create_room(
     username: Optional[str] = Depends(get_current_user_optional)
 ) -> GameRoom:
     """Create a new game room"""
+    drain_state.reject_if_draining()
     # ... (原有验证逻辑保持不变)
     room_name = request.name.strip()
     if not room_name:
@@ -48,7 +83,8 @@ async def create_room(
     play_time_limit = request.play_time_limit
     level_up_mode = request.level_up_mode
     
-    room_id = str(uuid.uuid4())
+    # 分片部署时生成归属当前分片的房间ID
+    room_id = shard_map.new_room_id()
     room = GameRoom(
         id=room_id,
         name=room_name,
@@ -56,80 +92,53 @@ async def create_room(
         level_up_mode=level_up_mode,
         ace_reset_enabled=request.ace_reset_enabled
     )
-    rooms[room_id] = room
+    try:
+        rooms.create(room)
+    except RoomCapacityExceeded:
+        raise HTTPException(status_code=503, detail="房间数已达上限，请稍后再试", headers={"Retry-After": "10"})
+    await rooms.save(room)
     return room
 
 @router.post("/rooms/{room_id}/join")
 async def join_room(
     room_id: str, 
     request: JoinRoomRequest,
-    username: Optional[str] = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    user: Optional[CurrentUser] = Depends(get_current_user_cached)
 ) -> GameRoom:
     """Join a game room"""
-    if room_id not in rooms:
+    drain_state.reject_if_draining()
+    room = await get_room(room_id)
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room = rooms[room_id]
     player_name = request.player_name.strip()
     
-    # 识别已登录用户
+    # 识别已登录用户（令牌缓存命中时不查询数据库）
     user_id = None
-    if username:
-        result = await db.execute(select(User).where(User.username == username))
-        user = result.scalars().first()
-        if user:
-            user_id = user.id
-            player_name = user.username  # 登录用户强制使用用户名
+    if user:
+        user_id = user.id
+        player_name = user.username  # 登录用户强制使用用户名
     
     if not player_name:
         raise HTTPException(status_code=400, detail="玩家名不能为空")
     
-    # 检查是否重复加入
-    existing_player = None
-    if user_id:
-        existing_player = next((p for p in room.players if p.id == user_id), None)
-    else:
-        existing_player = next((p for p in room.players if p.name == player_name), None)
-        
-    if existing_player:
-        return room
-    
-    if any(p.name == player_name for p in room.players):
-        raise HTTPException(status_code=400, detail="该名称已被使用，请选择其他名称")
-    
-    if room.is_full:
-        raise HTTPException(status_code=400, detail="Room is full")
-    
-    # 分配位置
-    positions = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
-    used_positions = {player.position for player in room.players}
-    available_positions = [pos for pos in positions if pos not in used_positions]
-    
-    if not available_positions:
-        raise HTTPException(status_code=400, detail="No available positions")
-    
-    player = Player(
-        id=user_id if user_id else str(uuid.uuid4()),
-        name=player_name,
-        position=available_positions[0],
-        is_ready=True,
-        token=str(uuid.uuid4())
-    )
-    
-    room.players.append(player)
-    if room.owner_id is None:
-        room.owner_id = player.id
+    # 查重和入座一次完成（重复加入时返回原来的座位）
+    try:
+        _, seated = rooms.assign_seat(room, player_name, user_id)
+    except SeatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if seated:
+        await rooms.save(room)
 
     return room
 
 @router.post("/rooms/{room_id}/reconnect")
 async def reconnect(room_id: str, request: ReconnectRequest) -> GameRoom:
     """Reconnect to a room using token"""
-    if room_id not in rooms:
+    room = await get_room(room_id)
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
-    room = rooms[room_id]
-    player = next((p for p in room.players if p.token == request.token), None)
-    if not player:
+    found = rooms.find_by_token(request.token)
+    if found is None or found[0] is not room:
         raise HTTPException(status_code=401, detail="Invalid token")
     return room
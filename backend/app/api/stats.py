@@ -0,0 +1,134 @@
+"""
+战绩与对局历史API
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db
+from app.models.history import GameRound, RoundPlayer
+from app.core.security import require_user, CurrentUser
+from app.core.http_cache import etag_matches
+from app.services.leaderboard import leaderboard, leaderboard_requests_total, RANKINGS, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+MAX_HISTORY_LIMIT = 100
+
+
+def _round_to_dict(game_round: GameRound, players, me: RoundPlayer):
+    return {
+        "round_id": game_round.id,
+        "room_id": game_round.room_id,
+        "started_at": game_round.started_at.isoformat() if game_round.started_at else None,
+        "ended_at": game_round.ended_at.isoformat(),
+        "duration_seconds": game_round.duration_seconds,
+        "dealer_side": game_round.dealer_side,
+        "dealer_position": game_round.dealer_position,
+        "idle_score": game_round.idle_score,
+        "bottom_score": game_round.bottom_score,
+        "bottom_bonus": game_round.bottom_bonus,
+        "total_score": game_round.total_score,
+        "dealer_level_up": game_round.dealer_level_up,
+        "idle_level_up": game_round.idle_level_up,
+        "north_south_level": [game_round.old_north_south_level, game_round.new_north_south_level],
+        "east_west_level": [game_round.old_east_west_level, game_round.new_east_west_level],
+        "dealer_wins": game_round.dealer_wins,
+        # 当前用户在本局的结果
+        "position": me.position,
+        "is_dealer_side": me.is_dealer_side,
+        "won": me.won,
+        "level_up": me.level_up,
+        "players": [{"position": p.position, "name": p.player_name} for p in players],
+    }
+
+
+@router.get("/me/history")
+async def my_history(
+    limit: int = Query(20, ge=1, le=MAX_HISTORY_LIMIT),
+    before: Optional[datetime] = None,
+    user: CurrentUser = Depends(require_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    我最近的对局（按结束时间倒序）
+    limit: 返回局数
+    before: 只返回此时间之前结束的对局（翻页时传上一页最后一局的 ended_at）
+    """
+    # 走 (user_id, ended_at) 索引倒序读取，不扫描整张表
+    query = select(RoundPlayer).where(RoundPlayer.user_id == user.id)
+    if before is not None:
+        query = query.where(RoundPlayer.ended_at < before)
+    query = query.order_by(RoundPlayer.ended_at.desc()).limit(limit)
+    mine = (await db.execute(query)).scalars().all()
+    if not mine:
+        return {"rounds": [], "next_before": None}
+
+    round_ids = [p.round_id for p in mine]
+    rounds = {r.id: r for r in (await db.execute(select(GameRound).where(GameRound.id.in_(round_ids)))).scalars().all()}
+    seats = {}
+    for p in (await db.execute(select(RoundPlayer).where(RoundPlayer.round_id.in_(round_ids)))).scalars().all():
+        seats.setdefault(p.round_id, []).append(p)
+
+    items = [_round_to_dict(rounds[p.round_id], seats.get(p.round_id, []), p) for p in mine if p.round_id in rounds]
+    return {
+        "rounds": items,
+        "next_before": mine[-1].ended_at.isoformat() if len(mine) == limit else None,
+    }
+
+
+@router.get("/me/summary")
+async def my_summary(
+    days: Optional[int] = Query(None, ge=1),
+    user: CurrentUser = Depends(require_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    我的对局汇总
+    days: 只统计最近多少天的对局，默认全部
+    """
+    query = (
+        select(
+            func.count(RoundPlayer.round_id),
+            func.sum(cast(RoundPlayer.won, Integer)),
+            func.sum(RoundPlayer.level_up),
+            func.sum(RoundPlayer.score),
+            func.avg(GameRound.duration_seconds),
+            func.max(RoundPlayer.ended_at),
+        )
+        .join(GameRound, GameRound.id == RoundPlayer.round_id)
+        .where(RoundPlayer.user_id == user.id)
+    )
+    if days is not None:
+        query = query.where(RoundPlayer.ended_at >= datetime.utcnow() - timedelta(days=days))
+    rounds, wins, level_ups, score, avg_duration, last_played = (await db.execute(query)).one()
+    return {
+        "rounds": rounds,
+        "wins": wins or 0,
+        "level_ups": level_ups or 0,
+        "total_score": score or 0,
+        "avg_duration_seconds": round(avg_duration, 1) if avg_duration is not None else None,
+        "last_played_at": last_played.isoformat() if last_played else None,
+    }
+
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    request: Request,
+    by: str = Query("wins", pattern="^(" + "|".join(RANKINGS) + ")$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    排行榜（来自内存，不访问数据库）
+    by: 排名方式 wins / win_rate / level_ups
+    带 If-None-Match 请求且排行榜未变化时返回 304
+    """
+    etag = leaderboard.etag(by)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        leaderboard_requests_total.labels("not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    leaderboard_requests_total.labels("ok").inc()
+    return Response(content=leaderboard.page(by, offset, limit), media_type="application/json", headers=headers)
@@ -19,14 +19,29 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Sharding：各分片的 http 基础地址（JSON 数组）和当前进程的分片序号，少于两个地址时不分片
+    shard_urls: List[str] = []
+    shard_id: int = 0
+    
     # Database
-    database_url: Optional[str] = None
+    database_url: Optional[str] = None  # 未设置时使用本地 SQLite（game.db）
+    db_pool_size: int = 10  # 连接池大小（PostgreSQL 等服务端数据库）
+    db_max_overflow: int = 20  # 连接池满时允许额外创建的连接数
+    db_pool_timeout: int = 30  # 等待空闲连接的超时（秒）
+    db_pool_recycle: int = 1800  # 连接最长复用时间（秒），避免被服务端断开
     redis_url: str = "redis://localhost:6379"
+    room_store: str = "memory"  # 房间状态存储："memory" 或 "redis"（多worker/重启恢复）
+    broadcast_bus: str = "memory"  # 房间事件广播总线："memory" 或 "redis"（跨进程投递）
+    command_log_dir: Optional[str] = None  # 房间命令日志目录（崩溃恢复），不设置时不记录
     
     # Security
     secret_key: str = "your-secret-key-here"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    password_hash_workers: int = 2  # bcrypt 工作线程数
+    password_hash_max_pending: int = 64  # 排队的密码哈希/校验上限，超过时返回503
+    token_cache_size: int = 10000  # 已验证令牌缓存的条目上限
+    token_cache_ttl_seconds: int = 300  # 令牌缓存的最长有效期（不超过令牌本身的 exp）
     
     # CORS - 默认值，会从环境变量覆盖
     allowed_origins: List[str] = [
@@ -39,7 +54,27 @@ class Settings(BaseSettings):
     
     # Game settings
     max_players_per_room: int = 4
-    game_timeout_minutes: int = 60
+    max_rooms: int = 1000  # 本进程房间数上限（0 表示不限制），达到后创建房间返回503
+    game_timeout_minutes: int = 60  # 房间无连接超过该时长后被回收
+    room_reap_interval_seconds: int = 60  # 空闲房间扫描间隔
+    room_archive_dir: Optional[str] = None  # 回收房间时把 GameState 检查点写入该目录，不设置时不归档
+    stats_queue_size: int = 10000  # 战绩写入队列上限（局）
+    stats_flush_interval_seconds: float = 1.0  # 战绩批量写入间隔
+    leaderboard_min_games: int = 10  # 参与胜率排名的最少局数
+    leaderboard_reload_seconds: float = 0  # 定期从数据库重新加载排行榜的间隔（多个 worker 共用数据库时设置，0 表示不重新加载）
+    lobby_queue_size: int = 256  # 大厅推送每个连接的待发送上限，超过后改为重发完整列表
+    
+    # Monitoring
+    loop_block_threshold_ms: int = 100  # 事件循环被阻塞超过该时长时记录调用栈
+    loop_block_log: bool = True  # 阻塞时是否写警告日志（带调用栈）
+    loop_block_log_interval_seconds: float = 10.0  # 阻塞日志的最小间隔（限流）
+    
+    # Logging
+    log_level: str = "INFO"  # 根日志级别
+    log_levels: str = ""  # 按模块设置级别，例如 "app.websocket.game_websocket.countdown=DEBUG"
+    log_format: str = "text"  # text 或 json（每条一行）
+    log_sample_every: int = 20  # 高频日志（倒计时等）每多少条写出一条
+    log_queue_size: int = 10000  # 日志队列上限，写出跟不上时丢弃
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,22 @@
+"""
+HTTP 条件请求（ETag / If-None-Match）
+
+排行榜和大厅房间列表用同一套规则判断是否返回 304：
+If-None-Match 可以是逗号分隔的多个 ETag 或 "*"，按弱比较（忽略 W/ 前缀）匹配。
+"""
+from typing import Optional
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否匹配当前 ETag（匹配时应返回 304）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = _opaque(etag)
+    return any(_opaque(tag) == current for tag in if_none_match.split(","))
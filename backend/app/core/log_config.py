@@ -0,0 +1,186 @@
+"""
+日志配置
+
+- 事件循环中只把日志记录（的浅拷贝）放入队列，异常堆栈格式化、JSON 编码和写 stdout
+  都由后台线程（QueueListener）完成，不会阻塞事件循环；队列满时丢弃记录并计入 log_records_dropped_total。
+  参数都是不可变值（字符串、数字等）时消息也在后台线程拼接；参数中有手牌、字典、GameState 等
+  可变对象时在入队前拼接，避免后台线程读到事件循环随后修改过的对象
+- 按模块设置级别：LOG_LEVELS="app.websocket.game_websocket.countdown=DEBUG,app.services=WARNING"，
+  运行中也可以通过 /api/admin/log-levels 调整，排查问题时临时打开某个模块的调试日志
+- 高频事件（例如每秒一次的倒计时）在 extra 中带上 sampled=True，只写出每 LOG_SAMPLE_EVERY 条中的一条
+- 结构化字段通过 extra 传入（例如 room_id），文本格式追加为 key=value，JSON 格式作为字段输出
+
+日志调用一律使用 %s 占位符（logger.debug("... %s", x)），级别未开启时不会格式化消息。
+"""
+import copy
+import itertools
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.metrics import counter
+
+log_records_dropped_total = counter("log_records_dropped_total", "日志队列已满时丢弃的记录数")
+
+# LogRecord 自带的属性，其余属性都是通过 extra 传入的结构化字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sampled"}
+
+_TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# 可以留给后台线程拼接的参数类型
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class StructuredFormatter(logging.Formatter):
+    """文本格式：在消息后追加 extra 中的字段（key=value）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = _extra_fields(record)
+        if not fields:
+            return text
+        pairs = " ".join(f"{key}={value}" for key, value in fields.items())
+        head, sep, tail = text.partition("\n")
+        return f"{head} {pairs}{sep}{tail}"
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON 格式：每条记录一行"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """带 sampled=True 的记录按消息模板分别计数，每 every 条只保留一条"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters: Dict[tuple, itertools.count] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        seq = self._counters.get(key)
+        if seq is None:
+            seq = self._counters[key] = itertools.count()
+        return next(seq) % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃记录（不阻塞事件循环）"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare 会在调用线程格式化消息并清掉 args/exc_info，
+        # 这里只复制记录，exc_info 原样交给监听线程的格式化器（JSON 格式才能输出 exc_info 字段）
+        record = copy.copy(record)
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in args)):
+            # 可变参数只引用不复制，监听线程格式化时可能已被事件循环修改
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.inc()
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """解析 "模块=级别,模块=级别"，级别不区分大小写"""
+    levels: Dict[str, int] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, level = item.partition("=")
+        if not sep:
+            raise ValueError(f"日志级别格式错误: {item}")
+        levels[name.strip()] = _level_number(level)
+    return levels
+
+
+def _level_number(level: str) -> int:
+    number = logging.getLevelName(level.strip().upper())
+    if not isinstance(number, int):
+        raise ValueError(f"未知的日志级别: {level}")
+    return number
+
+
+def set_levels(levels: Dict[str, str]) -> Dict[str, str]:
+    """运行中调整模块的日志级别，返回调整后的级别（先全部校验，有错误时不做任何修改）"""
+    numbers = {name: _level_number(level) for name, level in levels.items()}
+    for name, number in numbers.items():
+        logging.getLogger(name or None).setLevel(number)
+    return current_levels()
+
+
+def current_levels() -> Dict[str, str]:
+    """根日志和单独设置过级别的模块"""
+    result = {"": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            result[name] = logging.getLevelName(logger.level)
+    return result
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+def setup_logging(level: Optional[str] = None, levels: Optional[str] = None, fmt: Optional[str] = None,
+                  sample_every: Optional[int] = None, queue_size: Optional[int] = None,
+                  stream=None) -> QueueHandler:
+    """配置根日志（未传的参数取自 settings）；重复调用时替换上一次的配置"""
+    stop_logging()
+    global _listener, _handler
+    output = logging.StreamHandler(stream or sys.stdout)
+    if (fmt or settings.log_format) == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(StructuredFormatter(_TEXT_FORMAT))
+
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size or settings.log_queue_size))
+    # 采样在入队前进行，被丢弃的记录不会进入队列
+    _handler.addFilter(SamplingFilter(sample_every or settings.log_sample_every))
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(_level_number(level or settings.log_level))
+    root.addHandler(_handler)
+    for name, number in parse_levels(settings.log_levels if levels is None else levels).items():
+        logging.getLogger(name).setLevel(number)
+    _listener.start()
+    return _handler
+
+
+def stop_logging():
+    """写出队列中剩余的记录并移除 setup_logging 添加的处理器"""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
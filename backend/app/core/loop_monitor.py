@@ -0,0 +1,165 @@
+"""
+事件循环延迟监控
+
+引擎调用、bcrypt、战绩写入都在同一个事件循环上，某个回调同步执行太久时所有房间都会卡住。
+LoopMonitor 由两部分组成：
+- 心跳任务：每 interval 秒醒来一次，把实际醒来时间比预定晚的部分记入 event_loop_lag_seconds
+- 看门狗线程：心跳超过 threshold 没有按时醒来时，说明事件循环正被某个回调阻塞，
+  此时用 sys._current_frames() 抓取事件循环线程的调用栈，连同正在处理的消息类型和房间ID
+  记为一次阻塞事件（最近的事件通过 recent() 查看，可选地写日志，按 log_interval 限流）
+
+消息类型和房间ID由 track() 登记在当前任务上（分发器处理每条消息时调用），开销为一次字典写入。
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+loop_lag_seconds = histogram("event_loop_lag_seconds", "事件循环调度延迟（心跳实际醒来比预定晚的时长）",
+                             buckets=LAG_BUCKETS)
+loop_blocked_total = counter("event_loop_blocked_total", "事件循环被阻塞超过阈值的次数")
+
+
+class LoopMonitor:
+    """事件循环延迟与阻塞检测"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, log_blocking: bool = True,
+                 log_interval: float = 10.0, max_events: int = 50, stack_limit: int = 30):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_blocking = log_blocking
+        self.log_interval = log_interval
+        self.stack_limit = stack_limit
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        # 任务 -> (消息类型, 房间ID)
+        self._tags: Dict[asyncio.Task, Tuple[str, Optional[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._captured_beat = -1.0
+        self._last_log = 0.0
+        self._suppressed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在事件循环中调用：启动心跳任务和看门狗线程"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    @contextmanager
+    def track(self, message_type: str, room_id: Optional[str] = None):
+        """把当前任务标记为正在处理 message_type（阻塞事件中会带上这些信息）"""
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+        previous = self._tags.get(task)
+        self._tags[task] = (message_type, room_id)
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._tags.pop(task, None)
+            else:
+                self._tags[task] = previous
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """最近的阻塞事件（新的在前）"""
+        return list(reversed(self._events))
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - due)
+            loop_lag_seconds.observe(lag)
+            self._last_beat = time.monotonic()
+
+    def _watchdog(self):
+        poll = max(0.005, self.threshold / 2)
+        while not self._stop.wait(poll):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled >= self.threshold and beat != self._captured_beat:
+                # 每次阻塞只记录一次
+                self._captured_beat = beat
+                self._capture(stalled)
+
+    def _capture(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=self.stack_limit) if frame is not None else []
+        message_type, room_id = None, None
+        # 看门狗线程中读取事件循环当前运行的任务（只读，不修改）
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        if task is not None:
+            message_type, room_id = self._tags.get(task, (None, None))
+        event = {
+            "at": datetime.utcnow().isoformat(),
+            "blocked_ms": round(stalled * 1000, 1),
+            "message_type": message_type,
+            "room_id": room_id,
+            "task": task.get_name() if task is not None else None,
+            "stack": "".join(stack),
+        }
+        self._events.append(event)
+        loop_blocked_total.inc()
+        if self.log_blocking:
+            self._log(event)
+
+    def _log(self, event: Dict[str, Any]):
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval:
+            self._suppressed += 1
+            return
+        suppressed, self._suppressed = self._suppressed, 0
+        self._last_log = now
+        logger.warning(
+            "事件循环阻塞 %.0fms（消息: %s, 房间: %s, 之前 %d 次未记录）\n%s",
+            event["blocked_ms"], event["message_type"], event["room_id"], suppressed, event["stack"]
+        )
+
+
+loop_monitor = LoopMonitor(
+    threshold=settings.loop_block_threshold_ms / 1000,
+    log_blocking=settings.loop_block_log,
+    log_interval=settings.loop_block_log_interval_seconds
+)
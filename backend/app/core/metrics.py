@@ -0,0 +1,282 @@
+"""
+轻量级进程内指标
+
+提供 Counter / Gauge / Histogram 三种指标，支持标签，开销仅为一次字典查找和一次加法，
+可以在生产环境常开。所有指标注册到全局 REGISTRY。
+CallbackGauge 在采集时才调用函数取值（房间数、连接数、队列长度等已有的状态），平时没有开销。
+exposition() 把注册表输出为 Prometheus 文本格式（/metrics）。
+"""
+import logging
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+# 默认延迟分桶（秒）：覆盖 0.1ms ~ 2.5s
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # counts[i] 为落在 (buckets[i-1], buckets[i]] 的样本数，最后一个为 +Inf
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶估算分位数（返回所在桶的上界），无样本时返回None"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._new_child()
+            self._children[key] = child
+        return child
+
+    def children(self) -> Dict[Tuple[str, ...], object]:
+        return dict(self._children)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class CallbackGauge(_Metric):
+    """
+    采集时调用 fn 取值的仪表
+
+    fn 没有标签时返回数值，有标签时返回 {标签值元组（单个标签可以直接用字符串）: 数值}
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Union[float, Mapping]],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def children(self) -> Dict[Tuple[str, ...], object]:
+        try:
+            result = self.fn()
+        except Exception:
+            logger.exception("采集指标 %s 失败", self.name)
+            return {}
+        if not self.labelnames:
+            child = _GaugeChild()
+            child.set(float(result))
+            return {(): child}
+        children: Dict[Tuple[str, ...], object] = {}
+        for key, value in result.items():
+            child = _GaugeChild()
+            child.set(float(value))
+            children[key if isinstance(key, tuple) else (key,)] = child
+        return children
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"指标 {metric.name} 已注册为不同类型")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def metrics(self) -> List[_Metric]:
+        return list(self._metrics.values())
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """创建（或获取已存在的）计数器"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """创建（或获取已存在的）仪表"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+    """创建（或获取已存在的）直方图"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge_callback(name: str, documentation: str, fn: Callable[[], Union[float, Mapping]],
+                   labelnames: Sequence[str] = ()) -> CallbackGauge:
+    """创建采集时取值的仪表；同名指标已存在时改用新的 fn"""
+    metric = REGISTRY.register(CallbackGauge(name, documentation, fn, labelnames))
+    metric.fn = fn
+    return metric
+
+
+# ---------- Prometheus 文本格式 ----------
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_INF_BUCKET = 'le="+Inf"'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def exposition(registry: Optional[MetricsRegistry] = None) -> str:
+    """按 Prometheus 文本格式（0.0.4）输出所有指标"""
+    registry = registry or REGISTRY
+    lines: List[str] = []
+    for metric in sorted(registry.metrics(), key=lambda m: m.name):
+        name = metric.name
+        doc = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {doc}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        children = metric.children()
+        if not children and not metric.labelnames:
+            # 没有标签的指标即使还没有记录过也输出零值
+            children = {(): metric.labels()}
+        for values, child in sorted(children.items()):
+            if isinstance(child, _HistogramChild):
+                cumulative = 0
+                for bound, count in zip(child.buckets, child.counts):
+                    cumulative += count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{name}_bucket{_labels(metric.labelnames, values, le)} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(metric.labelnames, values, _INF_BUCKET)} {child.count}")
+                lines.append(f"{name}_sum{_labels(metric.labelnames, values)} {_format_value(child.sum)}")
+                lines.append(f"{name}_count{_labels(metric.labelnames, values)} {child.count}")
+            else:
+                lines.append(f"{name}{_labels(metric.labelnames, values)} {_format_value(child.value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,164 @@
+"""
+按需性能剖析
+
+管理员通过 /api/admin/profile 在线上开启一次持续 N 秒的剖析，不用重新部署：
+- sampling：采样线程每隔 interval 读取事件循环线程的调用栈（sys._current_frames），
+  输出折叠栈文本（每行 "帧;帧;帧 次数"，可直接交给 flamegraph.pl / speedscope）。
+  指定房间时只统计该房间的任务（按 loop_monitor.track() 登记的房间ID判断），结果是准确的。
+- cprofile：用 cProfile 统计函数调用次数和耗时，输出 pstats 文本或可由 pstats.Stats 读取的二进制。
+  不指定房间时剖析整个事件循环线程；指定房间时只在该房间的消息处理期间开启
+  （处理函数 await 期间切换到的其他任务也会被计入，只能作为近似）。
+
+同一时间只允许一个剖析会话；没有会话时 scope() 只多一次属性读取。
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+from app.core.loop_monitor import loop_monitor
+
+MODES = ("sampling", "cprofile")
+
+_NULL_SCOPE = nullcontext()
+
+
+class ProfileAlreadyRunning(Exception):
+    """已有剖析会话在运行"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """一次剖析会话及其结果"""
+
+    def __init__(self, mode: str, seconds: float, room_id: Optional[str] = None, interval: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"未知的剖析模式: {mode}")
+        self.mode = mode
+        self.seconds = seconds
+        self.room_id = room_id
+        self.interval = interval
+        self.samples = 0
+        self.skipped_samples = 0
+        self.stacks: Counter = Counter()
+        self.profile: Optional[cProfile.Profile] = cProfile.Profile() if mode == "cprofile" else None
+        self._depth = 0
+        self._stop = threading.Event()
+
+    # ---------- cProfile ----------
+
+    @contextmanager
+    def handler_scope(self):
+        """房间范围的 cProfile：在该房间的处理函数期间开启（支持同一房间的处理嵌套/交错）"""
+        if self._depth == 0:
+            self.profile.enable()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.profile.disable()
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def pstats_bytes(self) -> bytes:
+        """与 Profile.dump_stats 写出的文件内容相同"""
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    # ---------- 采样 ----------
+
+    def _sample_loop(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            task = asyncio.current_task(loop)
+            if frame is None or task is None:
+                # 事件循环空闲或正在执行不属于任务的回调
+                self.skipped_samples += 1
+                continue
+            if self.room_id is not None:
+                tag = loop_monitor._tags.get(task)
+                if tag is None or tag[1] != self.room_id:
+                    self.skipped_samples += 1
+                    continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """折叠栈文本，按次数从多到少"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """剖析会话的入口（事件循环中使用）"""
+
+    def __init__(self):
+        self._session: Optional[ProfileSession] = None
+
+    @property
+    def running(self) -> bool:
+        return self._session is not None
+
+    def scope(self, room_id: Optional[str]):
+        """消息处理期间的剖析范围：只有房间范围的 cProfile 会话且房间匹配时才生效"""
+        session = self._session
+        if session is None or session.profile is None or session.room_id is None or session.room_id != room_id:
+            return _NULL_SCOPE
+        return session.handler_scope()
+
+    async def run(self, mode: str, seconds: float, room_id: Optional[str] = None,
+                  interval: float = 0.005) -> ProfileSession:
+        """剖析 seconds 秒后返回结果；已有会话时抛出 ProfileAlreadyRunning"""
+        if self._session is not None:
+            raise ProfileAlreadyRunning()
+        session = ProfileSession(mode, seconds, room_id, interval)
+        self._session = session
+        sampler = None
+        try:
+            if mode == "sampling":
+                sampler = threading.Thread(
+                    target=session._sample_loop,
+                    args=(asyncio.get_running_loop(), threading.get_ident()),
+                    name="profiler-sampler",
+                    daemon=True
+                )
+                sampler.start()
+            elif room_id is None:
+                session.profile.enable()
+            await asyncio.sleep(seconds)
+        finally:
+            if sampler is not None:
+                session._stop.set()
+                sampler.join(timeout=1)
+            elif room_id is None:
+                session.profile.disable()
+            self._session = None
+        return session
+
+    def status(self) -> Dict[str, Optional[str]]:
+        session = self._session
+        if session is None:
+            return {"running": False}
+        return {"running": True, "mode": session.mode, "room_id": session.room_id, "seconds": session.seconds}
+
+
+profiler = Profiler()
@@ -1,13 +1,35 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Callable, Dict, Iterable, Set, Tuple, Union, Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+from app.db.database import get_db
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
 
 # 密码加密配置
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+password_hash_seconds = histogram("password_hash_seconds", "密码哈希/校验在工作线程中的耗时", ["op"])
+password_hash_wait_seconds = histogram("password_hash_wait_seconds", "密码哈希/校验在队列中等待的时间", ["op"])
+password_hash_pending = gauge("password_hash_pending", "排队和执行中的密码哈希/校验数")
+password_hash_rejected_total = counter("password_hash_rejected_total", "因队列已满被拒绝的密码哈希/校验数")
+token_cache_requests_total = counter("token_cache_requests_total", "令牌缓存查询数", ["result"])
+token_cache_size = gauge("token_cache_size", "令牌缓存中的条目数")
+
 # JWT 配置
 SECRET_KEY = "quatre-vingt-secret-key-keep-it-safe" 
 ALGORITHM = "HS256"
@@ -21,6 +43,75 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+
+class PasswordHasher:
+    """
+    在专用线程池中执行 bcrypt（每次数十到数百毫秒），不阻塞事件循环
+
+    排队和执行中的任务数达到 max_pending 时直接返回 503，而不是让登录请求无限排队。
+    任务被计入队列直到在线程中真正执行完（请求被取消后线程仍会把它算完）。
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+            password_hash_pending.set(self._pending)
+
+    async def _run(self, op: str, fn: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                password_hash_rejected_total.inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="登录请求过多，请稍后再试",
+                    headers={"Retry-After": "1"}
+                )
+            self._pending += 1
+            password_hash_pending.set(self._pending)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="password-hash")
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            password_hash_wait_seconds.labels(op).observe(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                password_hash_seconds.labels(op).observe(time.perf_counter() - started)
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -31,16 +122,144 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """已验证令牌对应的用户（缓存中的只读副本）"""
+    id: str
+    username: str
+    is_admin: bool
+
+
+class TokenCache:
+    """
+    已验证令牌 -> 用户 的 LRU 缓存
+
+    条目在令牌的 exp 和缓存 TTL 中较早的时刻过期；用户被删除时按用户ID清除其全部令牌。
+    只在事件循环中使用。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # token -> (用户, 过期时间戳)
+        self._entries: "OrderedDict[str, Tuple[CurrentUser, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        entry = self._entries.get(token)
+        if entry is None:
+            token_cache_requests_total.labels("miss").inc()
+            return None
+        user, expires_at = entry
+        if time.time() >= expires_at:
+            self._remove(token)
+            token_cache_requests_total.labels("expired").inc()
+            return None
+        self._entries.move_to_end(token)
+        token_cache_requests_total.labels("hit").inc()
+        return user
+
+    def put(self, token: str, user: CurrentUser, exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (user, expires_at)
+        self._by_user.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+        token_cache_size.set(len(self._entries))
+
+    def invalidate_users(self, user_ids: Iterable[str]):
+        """清除这些用户的全部令牌（用户被删除时调用）"""
+        for user_id in user_ids:
+            for token in self._by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+        token_cache_size.set(len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+        token_cache_size.set(0)
+
+    def _remove(self, token: str):
+        user, _ = self._entries.pop(token)
+        tokens = self._by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user.id]
+        token_cache_size.set(len(self._entries))
+
+
+token_cache = TokenCache(
+    max_size=settings.token_cache_size,
+    ttl_seconds=settings.token_cache_ttl_seconds
+)
+
+
+def _decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """校验签名和 exp，失败返回None"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload if payload.get("sub") is not None else None
+
+
 async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[str]:
     """可选的身份验证：如果提供了 token 则返回用户名，否则返回 None"""
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
-    except JWTError:
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached.username
+    payload = _decode_token(token)
+    return payload["sub"] if payload else None
+
+
+async def get_current_user_cached(
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Optional[CurrentUser]:
+    """
+    可选的身份验证：返回令牌对应的用户，未登录或用户不存在时返回 None
+
+    命中缓存时不校验签名也不查询数据库。必须登录的接口使用 require_user。
+    """
+    if not token:
+        return None
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    payload = _decode_token(token)
+    if payload is None:
+        return None
+    result = await db.execute(
+        select(User.id, User.username, User.is_admin).where(User.username == payload["sub"])
+    )
+    row = result.first()
+    if row is None:
         return None
+    user = CurrentUser(id=row.id, username=row.username, is_admin=bool(row.is_admin))
+    token_cache.put(token, user, payload.get("exp"))
+    return user
+
+
+async def require_user(user: Optional[CurrentUser] = Depends(get_current_user_cached)) -> CurrentUser:
+    """必须登录的接口的身份验证：未登录返回 401"""
+    if user is None:
+        raise HTTPException(status_code=401, detail="未登录")
+    return user
+
 
+async def require_admin(user: CurrentUser = Depends(require_user)) -> CurrentUser:
+    """管理员接口的身份验证：未登录返回 401，不是管理员返回 403"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="没有管理员权限")
+    return user
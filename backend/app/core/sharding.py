@@ -0,0 +1,149 @@
+"""
+房间分片
+
+多个 uvicorn 进程（分片）部署时，房间按 room_id 一致性哈希分配到分片，
+同一房间的所有 REST 请求和 WebSocket 连接都由同一个进程处理。
+请求落到错误的分片时：
+- HTTP 请求返回 307 重定向到目标分片（保留方法和请求体），并带上 X-Shard 头
+- WebSocket 连接先接受再以 4010 关闭，关闭原因为目标分片的 WebSocket 地址，客户端据此重连
+
+通过 SHARD_URLS（各分片的 http 基础地址，JSON 数组）和 SHARD_ID 配置，
+SHARD_URLS 少于两个时不分片。
+"""
+import hashlib
+import re
+import uuid
+from bisect import bisect
+from typing import List, Optional, Sequence
+from urllib.parse import urlsplit
+from app.core.config import settings
+
+# 错误分片时 WebSocket 关闭码（4000-4999 为应用自定义）
+WRONG_SHARD_CLOSE_CODE = 4010
+SHARD_HEADER = "x-shard"
+
+# 需要按房间路由的路径
+_ROOM_PATHS = (
+    re.compile(r"^/api/rooms/([^/]+)(?:/|$)"),
+    re.compile(r"^/ws/game/([^/]+)/?$"),
+)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """一致性哈希环：每个分片在环上放置 vnodes 个虚拟节点"""
+
+    def __init__(self, shard_count: int, vnodes: int = 128):
+        if shard_count < 1:
+            raise ValueError("shard_count 必须大于0")
+        points = sorted(
+            (_hash(f"shard-{shard}#{i}"), shard)
+            for shard in range(shard_count)
+            for i in range(vnodes)
+        )
+        self._keys = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+        self.shard_count = shard_count
+
+    def shard_for(self, key: str) -> int:
+        if self.shard_count == 1:
+            return 0
+        idx = bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._shards[idx]
+
+
+class ShardMap:
+    """当前进程所在分片及房间归属"""
+
+    def __init__(self, shard_id: int = 0, shard_urls: Sequence[str] = ()):
+        self.shard_urls: List[str] = [u.rstrip("/") for u in shard_urls]
+        self.shard_count = max(len(self.shard_urls), 1)
+        if not 0 <= shard_id < self.shard_count:
+            raise ValueError(f"SHARD_ID={shard_id} 超出分片数量 {self.shard_count}")
+        self.shard_id = shard_id
+        self.ring = HashRing(self.shard_count)
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count > 1
+
+    def owner(self, room_id: str) -> int:
+        return self.ring.shard_for(room_id)
+
+    def is_local(self, room_id: str) -> bool:
+        return not self.enabled or self.owner(room_id) == self.shard_id
+
+    def http_url(self, shard: int) -> str:
+        return self.shard_urls[shard]
+
+    def ws_url(self, shard: int) -> str:
+        parts = urlsplit(self.shard_urls[shard])
+        scheme = "wss" if parts.scheme == "https" else "ws"
+        return f"{scheme}://{parts.netloc}"
+
+    def new_room_id(self) -> str:
+        """生成归属当前分片的房间ID（平均尝试 shard_count 次）"""
+        while True:
+            room_id = str(uuid.uuid4())
+            if self.is_local(room_id):
+                return room_id
+
+
+def room_id_from_path(path: str) -> Optional[str]:
+    for pattern in _ROOM_PATHS:
+        match = pattern.match(path)
+        if match:
+            return match.group(1)
+    return None
+
+
+class ShardRoutingMiddleware:
+    """把属于其他分片的房间请求重定向到目标分片（ASGI中间件）"""
+
+    def __init__(self, app, shard_map: ShardMap):
+        self.app = app
+        self.shard_map = shard_map
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or not self.shard_map.enabled:
+            await self.app(scope, receive, send)
+            return
+        room_id = room_id_from_path(scope.get("path", ""))
+        if room_id is None or self.shard_map.is_local(room_id):
+            await self.app(scope, receive, send)
+            return
+
+        owner = self.shard_map.owner(room_id)
+        if scope["type"] == "http":
+            location = self.shard_map.http_url(owner) + scope.get("raw_path", scope["path"].encode()).decode("latin-1")
+            query = scope.get("query_string", b"")
+            if query:
+                location += "?" + query.decode("latin-1")
+            await send({
+                "type": "http.response.start",
+                "status": 307,
+                "headers": [
+                    (b"location", location.encode("latin-1")),
+                    (SHARD_HEADER.encode(), str(owner).encode()),
+                    (b"content-length", b"0"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        # WebSocket：浏览器不会跟随握手阶段的重定向，先接受再带上目标地址关闭
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        await send({"type": "websocket.accept"})
+        await send({
+            "type": "websocket.close",
+            "code": WRONG_SHARD_CLOSE_CODE,
+            "reason": self.shard_map.ws_url(owner),
+        })
+
+
+shard_map = ShardMap(settings.shard_id, settings.shard_urls)
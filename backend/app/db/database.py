@@ -1,21 +1,107 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+"""
+数据库引擎与 Session
+
+引擎由 Settings.database_url 创建（未配置时使用本地 SQLite 文件 game.db）：
+- sqlite:// 自动换成 sqlite+aiosqlite://，postgres:// / postgresql:// 换成 postgresql+asyncpg://
+- PostgreSQL 等服务端数据库使用连接池（大小见 db_pool_* 配置），读写共用一个引擎
+- SQLite 每个连接开启 WAL、synchronous=NORMAL 和 busy_timeout；
+  另建一个只有一个连接的写引擎，进程内的批量写入（战绩等）排队使用，避免多个连接争抢写锁
+"""
+from typing import Any, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-import os
+from app.core.config import settings
 
-# 数据库文件路径
+# 数据库文件路径（未配置 DATABASE_URL 时）
 DB_FILE = "game.db"
-DATABASE_URL = f"sqlite+aiosqlite:///./{DB_FILE}"
+DEFAULT_DATABASE_URL = f"sqlite+aiosqlite:///./{DB_FILE}"
+
+# SQLite 连接参数
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+def normalize_database_url(url: Optional[str]) -> str:
+    """把常见的同步驱动地址换成对应的异步驱动"""
+    if not url:
+        return DEFAULT_DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"无效的数据库地址: {url}")
+    if scheme == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    elif scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        scheme = "postgresql+asyncpg"
+    return f"{scheme}://{rest}"
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def create_engine_from_url(url: str, writer: bool = False, **pool_options: Any) -> AsyncEngine:
+    """
+    创建异步引擎
+
+    Args:
+        url: 已经过 normalize_database_url 处理的地址
+        writer: 是否为 SQLite 的专用写引擎（只有一个连接）
+        pool_options: 连接池参数（pool_size/max_overflow/pool_timeout/pool_recycle），SQLite 写引擎忽略
+    """
+    if not is_sqlite(url):
+        return create_async_engine(url, pool_pre_ping=True, **pool_options)
+
+    kwargs: Dict[str, Any] = {
+        "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    }
+    if writer:
+        kwargs.update(pool_size=1, max_overflow=0)
+    engine = create_async_engine(url, **kwargs)
+    if not _is_memory_sqlite(url):
+        # 内存数据库不支持 WAL
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+DATABASE_URL = normalize_database_url(settings.database_url)
 
 # 创建异步引擎
-engine = create_async_engine(
+engine = create_engine_from_url(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite 异步需要
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
 )
+# 写引擎：SQLite 为独立的单连接引擎，其他数据库与 engine 相同
+writer_engine = create_engine_from_url(DATABASE_URL, writer=True) \
+    if is_sqlite(DATABASE_URL) and not _is_memory_sqlite(DATABASE_URL) else engine
 
 # 创建异步 Session 工厂
 async_session = sessionmaker(
-    engine, 
-    class_=AsyncSession, 
+    engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+# 后台批量写入使用的 Session 工厂
+writer_session = sessionmaker(
+    writer_engine,
+    class_=AsyncSession,
     expire_on_commit=False
 )
 
@@ -31,4 +117,3 @@ async def get_db():
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-
@@ -0,0 +1,77 @@
+"""
+卡牌紧凑编码
+
+每张牌映射为一个0~55之间的整数编码，用于二进制协议和状态快照：
+- 0~51：普通牌，编码 = 花色序号 * 13 + 点数序号（花色按 Suit 定义顺序，点数从2到A）
+- 52/53：小王/大王，对应 str(card) 的 "JOKER-B/小王" / "JOKER-A/大王"
+- 54/55：小王/大王的简写 "JOKER-B" / "JOKER-A"（前端发来的格式）
+"""
+from typing import Dict, List, Optional
+from app.models.game import Card, Suit, Rank
+
+
+SUIT_ORDER: List[Suit] = [Suit.SPADES, Suit.HEARTS, Suit.DIAMONDS, Suit.CLUBS]
+RANK_ORDER: List[Rank] = [
+    Rank.TWO, Rank.THREE, Rank.FOUR, Rank.FIVE, Rank.SIX, Rank.SEVEN, Rank.EIGHT,
+    Rank.NINE, Rank.TEN, Rank.JACK, Rank.QUEEN, Rank.KING, Rank.ACE
+]
+
+SMALL_JOKER_CODE = 52
+BIG_JOKER_CODE = 53
+SMALL_JOKER_SHORT_CODE = 54
+BIG_JOKER_SHORT_CODE = 55
+CARD_CODE_COUNT = 56
+
+# 编码 -> 卡牌字符串（与 str(card) 及前端格式保持一致，保证往返无损）
+CODE_TO_CARD_STRING: List[str] = (
+    [f"{rank.value}{suit.value}" for suit in SUIT_ORDER for rank in RANK_ORDER]
+    + ["JOKER-B/小王", "JOKER-A/大王", "JOKER-B", "JOKER-A"]
+)
+
+# 卡牌字符串 -> 编码
+CARD_STRING_TO_CODE: Dict[str, int] = {s: code for code, s in enumerate(CODE_TO_CARD_STRING)}
+
+# 解析时额外接受的别名（不参与编码）
+_PARSE_ALIASES: Dict[str, int] = {
+    "JOKER/小王": SMALL_JOKER_CODE,
+    "JOKER/大王": BIG_JOKER_CODE,
+}
+
+_SUIT_INDEX: Dict[Suit, int] = {suit: i for i, suit in enumerate(SUIT_ORDER)}
+_RANK_INDEX: Dict[Rank, int] = {rank: i for i, rank in enumerate(RANK_ORDER)}
+
+
+def card_to_code(card: Card) -> int:
+    """将Card对象转换为编码（王牌使用52/53）"""
+    if card.is_joker or card.rank in (Rank.SMALL_JOKER, Rank.BIG_JOKER):
+        return BIG_JOKER_CODE if card.rank == Rank.BIG_JOKER else SMALL_JOKER_CODE
+    return _SUIT_INDEX[card.suit] * 13 + _RANK_INDEX[card.rank]
+
+
+def code_to_card(code: int) -> Card:
+    """将编码转换为新的Card对象"""
+    if code in (SMALL_JOKER_CODE, SMALL_JOKER_SHORT_CODE):
+        return Card(rank=Rank.SMALL_JOKER, is_joker=True)
+    if code in (BIG_JOKER_CODE, BIG_JOKER_SHORT_CODE):
+        return Card(rank=Rank.BIG_JOKER, is_joker=True)
+    if not 0 <= code < 52:
+        raise ValueError(f"无效的卡牌编码: {code}")
+    return Card(suit=SUIT_ORDER[code // 13], rank=RANK_ORDER[code % 13])
+
+
+def card_string_to_code(card_str: str) -> Optional[int]:
+    """将卡牌字符串转换为编码，无法识别时返回None"""
+    code = CARD_STRING_TO_CODE.get(card_str)
+    if code is None:
+        code = _PARSE_ALIASES.get(card_str)
+    return code
+
+
+def cards_to_bytes(cards: List[Card]) -> bytes:
+    """将卡牌列表编码为字节串（每张牌一个字节）"""
+    return bytes(card_to_code(card) for card in cards)
+
+
+def bytes_to_cards(data: bytes) -> List[Card]:
+    """将字节串解码为卡牌列表"""
+    return [code_to_card(code) for code in data]
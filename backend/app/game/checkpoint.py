@@ -0,0 +1,421 @@
+"""
+GameState 检查点
+
+把一局进行中的 GameState（房间、手牌、亮主、扣底、出牌系统的当前墩与领出牌、倒计时）
+保存为带版本号的紧凑二进制，或便于调试的 JSON，并能完整恢复。
+
+二进制格式：b"QVCK" + 版本号(1字节) + CompactCodec 编码的字段列表
+- 字段按下面的字段表顺序以列表存放，不存字段名
+- 卡牌列表存为卡牌编码字节串（每张1字节）
+- 玩家ID在房间之外的位置存为座位序号，UUID 存为16字节
+- 方位、花色存为序号
+
+字段表只能在末尾追加；删除或调整字段时必须提升 CHECKPOINT_VERSION。
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.models.game import GameRoom, Player, PlayerPosition, GameStatus, Suit, Card
+from app.game.card_codes import cards_to_bytes, bytes_to_cards, card_string_to_code, code_to_card
+from app.game.compact_codec import CompactCodec, CompactCodecError
+from app.game.bidding_system import Bid, BidType
+from app.game.card_playing import CardPlayingSystem, CardType
+from app.game.game_state import GameState
+
+CHECKPOINT_MAGIC = b"QVCK"
+CHECKPOINT_VERSION = 1
+
+# 检查点内自由结构（出牌记录、本局总结）中的常用字符串，只能在末尾追加
+CHECKPOINT_INTERNED = [
+    "player_id", "player_position", "cards", "slingshot_failed",
+    "north", "west", "south", "east", "north_south", "east_west",
+    "idle_score", "bottom_score", "bottom_bonus", "total_score", "dealer_side", "idle_side",
+    "dealer_level_up", "idle_level_up", "old_north_south_level", "old_east_west_level",
+    "new_north_south_level", "new_east_west_level", "next_dealer", "next_dealer_name",
+    "bottom_cards", "tricks_won", "dealer_wins", "winner_side", "winner_side_name",
+    "dealer_penalty", "north_south_ace_count", "east_west_ace_count",
+    "north_south_ace_count_before", "east_west_ace_count_before", "dealer_is_playing_ace",
+    "multiplier", "bonus", "南北方", "东西方",
+    "dealer_position", "started_at", "ended_at", "duration_seconds",
+]
+
+_codec = CompactCodec(CHECKPOINT_INTERNED)
+_POSITIONS = list(PlayerPosition)
+_SUITS = list(Suit)
+
+
+class CheckpointError(ValueError):
+    """检查点格式错误或版本不支持"""
+
+
+class _Context:
+    """编解码上下文：房间玩家列表，用于把玩家ID压缩为座位序号"""
+
+    def __init__(self, players: List[Player]):
+        self.player_ids = [p.id for p in players]
+        self.index = {pid: i for i, pid in enumerate(self.player_ids)}
+
+
+# ---------- 字段类型：(转JSON, 从JSON, 转二进制值, 从二进制值) ----------
+
+def _uid_to_bin(value: Optional[str]) -> Any:
+    if value is None:
+        return None
+    try:
+        parsed = uuid.UUID(value)
+    except (ValueError, AttributeError, TypeError):
+        return value
+    return parsed.bytes if str(parsed) == value else value
+
+
+def _uid_from_bin(value: Any) -> Optional[str]:
+    if isinstance(value, bytes):
+        return str(uuid.UUID(bytes=value))
+    return value
+
+
+def _pid_to_bin(value: Optional[str], ctx: _Context) -> Any:
+    idx = ctx.index.get(value) if value is not None else None
+    return idx if idx is not None else _uid_to_bin(value)
+
+
+def _pid_from_bin(value: Any, ctx: _Context) -> Optional[str]:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return ctx.player_ids[value]
+    return _uid_from_bin(value)
+
+
+def _time_to_bin(value: datetime) -> Any:
+    # 不依赖所在主机的时区：不带时区的时间按 UTC 换算（恢复后的值不变），
+    # 带时区的时间另存 UTC 偏移（秒），恢复后仍带时区
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc).timestamp()
+    return [value.timestamp(), int(value.utcoffset().total_seconds())]
+
+
+def _time_from_bin(value: Any) -> datetime:
+    if isinstance(value, list):
+        timestamp, offset = value
+        return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=offset)))
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+def _cards_to_json(cards: List[Card]) -> List[str]:
+    return [str(c) for c in cards]
+
+
+def _cards_from_json(values: List[str]) -> List[Card]:
+    return [code_to_card(card_string_to_code(v)) for v in values]
+
+
+def _enum_index(members: list):
+    return (
+        lambda v, ctx: None if v is None else members.index(v),
+        lambda v, ctx: None if v is None else members[v],
+    )
+
+
+def _identity(v, ctx):
+    return v
+
+
+_pos_bin = _enum_index(_POSITIONS)
+_suit_bin = _enum_index(_SUITS)
+
+# kind -> (to_json, from_json, to_bin, from_bin)
+_KINDS: Dict[str, Tuple[Callable, Callable, Callable, Callable]] = {
+    "int": (_identity, _identity, _identity, _identity),
+    "bool": (_identity, _identity, _identity, _identity),
+    "str": (_identity, _identity, _identity, _identity),
+    "any": (_identity, _identity, _identity, _identity),
+    "uid": (_identity, _identity, lambda v, ctx: _uid_to_bin(v), lambda v, ctx: _uid_from_bin(v)),
+    "pid": (_identity, _identity, _pid_to_bin, _pid_from_bin),
+    "pids": (
+        lambda v, ctx: sorted(v),
+        lambda v, ctx: list(v),
+        lambda v, ctx: [_pid_to_bin(p, ctx) for p in sorted(v)],
+        lambda v, ctx: [_pid_from_bin(p, ctx) for p in v],
+    ),
+    "time": (
+        lambda v, ctx: v.isoformat(),
+        lambda v, ctx: datetime.fromisoformat(v),
+        lambda v, ctx: _time_to_bin(v),
+        lambda v, ctx: _time_from_bin(v),
+    ),
+    "pos": (
+        lambda v, ctx: v.value if v is not None else None,
+        lambda v, ctx: PlayerPosition(v) if v is not None else None,
+        _pos_bin[0], _pos_bin[1],
+    ),
+    "positions": (
+        lambda v, ctx: [p.value for p in v],
+        lambda v, ctx: [PlayerPosition(p) for p in v],
+        lambda v, ctx: bytes(_POSITIONS.index(p) for p in v),
+        lambda v, ctx: [_POSITIONS[i] for i in v],
+    ),
+    "suit": (
+        lambda v, ctx: v.value if v is not None else None,
+        lambda v, ctx: Suit(v) if v is not None else None,
+        _suit_bin[0], _suit_bin[1],
+    ),
+    "cards": (
+        lambda v, ctx: _cards_to_json(v),
+        lambda v, ctx: _cards_from_json(v),
+        lambda v, ctx: cards_to_bytes(v),
+        lambda v, ctx: bytes_to_cards(v),
+    ),
+    "cards_opt": (
+        lambda v, ctx: _cards_to_json(v) if v is not None else None,
+        lambda v, ctx: _cards_from_json(v) if v is not None else None,
+        lambda v, ctx: cards_to_bytes(v) if v is not None else None,
+        lambda v, ctx: bytes_to_cards(v) if v is not None else None,
+    ),
+    # {player_id: [Card]}
+    "pid_cards": (
+        lambda v, ctx: {pid: _cards_to_json(cards) for pid, cards in v.items()},
+        lambda v, ctx: {pid: _cards_from_json(cards) for pid, cards in v.items()},
+        lambda v, ctx: [[_pid_to_bin(pid, ctx), cards_to_bytes(cards)] for pid, cards in v.items()],
+        lambda v, ctx: {_pid_from_bin(pid, ctx): bytes_to_cards(cards) for pid, cards in v},
+    ),
+    # [{"player_id": ..., "player_position": ..., "cards": [...]}]，卡牌字符串由编解码器压缩
+    "trick": (
+        _identity, _identity,
+        lambda v, ctx: [{**e, "player_id": _pid_to_bin(e.get("player_id"), ctx)} for e in v],
+        lambda v, ctx: [{**e, "player_id": _pid_from_bin(e.get("player_id"), ctx)} for e in v],
+    ),
+    # [(PlayerPosition, [Card])]
+    "pos_cards": (
+        lambda v, ctx: [[p.value, _cards_to_json(cards)] for p, cards in v],
+        lambda v, ctx: [(PlayerPosition(p), _cards_from_json(cards)) for p, cards in v],
+        lambda v, ctx: [[_POSITIONS.index(p), cards_to_bytes(cards)] for p, cards in v],
+        lambda v, ctx: [(_POSITIONS[p], bytes_to_cards(cards)) for p, cards in v],
+    ),
+}
+
+
+# ---------- 字段表（只能在末尾追加） ----------
+
+PLAYER_FIELDS = [
+    ("id", "uid"), ("name", "str"), ("position", "pos"), ("cards", "cards"),
+    ("is_ready", "bool"), ("score", "int"), ("token", "uid"), ("user_id", "uid"),
+]
+
+ROOM_FIELDS = [
+    ("id", "uid"), ("name", "str"), ("status", "str"), ("current_level", "int"),
+    ("dealer_position", "pos"), ("trump_suit", "suit"), ("created_at", "time"),
+    ("owner_id", "pid"), ("play_time_limit", "int"), ("level_up_mode", "str"),
+    ("ace_reset_enabled", "bool"),
+]
+
+STATE_FIELDS = [
+    ("card_level", "int"),
+    ("trump_suit", "suit"), ("north_south_level", "int"), ("east_west_level", "int"),
+    ("level_up_mode", "str"), ("ace_reset_enabled", "bool"),
+    ("dealer_position", "pos"), ("current_player", "pos"),
+    ("current_trick", "cards"), ("current_trick_with_player", "trick"), ("last_trick", "trick"),
+    ("trick_leader", "pos"), ("max_play_time", "int"), ("current_countdown", "int"),
+    ("countdown_active", "bool"), ("current_player_id", "pid"), ("selected_cards", "cards_opt"),
+    ("game_phase", "str"), ("idle_score", "int"), ("tricks_won", "any"),
+    ("bottom_cards", "cards"), ("original_bottom_cards", "cards"), ("dealer_has_bottom", "bool"),
+    ("dealing_order", "positions"), ("next_deal_turn_index", "int"), ("dealing_deck", "cards"),
+    ("trump_locked", "bool"), ("dealt_count", "int"),
+    ("bidding_cards", "pid_cards"), ("bidding_display_cards", "pid_cards"),
+    ("is_first_round", "bool"), ("fixed_dealer_position", "pos"), ("bottom_pending", "bool"),
+    ("bidding_turn_player_id", "pid"), ("_bidding_queue", "pids_ordered"),
+    ("current_trick_max_player_id", "pid"),
+    ("players_ready_for_next_round", "pids"), ("players_ready_to_start", "pids"),
+    ("round_summary", "any"), ("bottom_bonus_info", "any"),
+    ("north_south_ace_count", "int"), ("east_west_ace_count", "int"), ("stats_recorded", "bool"),
+    ("round_started_at", "any"),
+]
+
+BIDDING_FIELDS = [
+    ("current_level", "int"), ("bidding_phase", "bool"), ("bids", "bids"), ("current_bid", "int"),
+]
+
+CARD_PLAYING_FIELDS = [
+    ("trump_suit", "suit"), ("current_trick", "pos_cards"), ("trick_leader", "pos"),
+    ("led_suit", "any"), ("led_card_type", "any"), ("led_cards", "cards"),
+    ("idle_positions", "positions"), ("idle_score", "int"), ("expected_leader", "pos"),
+    ("bottom_cards", "cards"),
+]
+
+# 亮主队列有顺序，不排序
+_KINDS["pids_ordered"] = (
+    lambda v, ctx: list(v),
+    lambda v, ctx: list(v),
+    lambda v, ctx: [_pid_to_bin(p, ctx) for p in v],
+    lambda v, ctx: [_pid_from_bin(p, ctx) for p in v],
+)
+# [(player_id, bid_type, suit, [Card])]
+_KINDS["bids"] = (
+    lambda v, ctx: [[pid, t, s.value if s else None, _cards_to_json(c)] for pid, t, s, c in v],
+    lambda v, ctx: [(pid, t, Suit(s) if s else None, _cards_from_json(c)) for pid, t, s, c in v],
+    lambda v, ctx: [[_pid_to_bin(pid, ctx), t, _suit_bin[0](s, ctx), cards_to_bytes(c)] for pid, t, s, c in v],
+    lambda v, ctx: [(_pid_from_bin(pid, ctx), t, _suit_bin[1](s, ctx), bytes_to_cards(c)) for pid, t, s, c in v],
+)
+
+
+def _convert(values: Dict[str, Any], fields, ctx: _Context, which: int) -> Dict[str, Any]:
+    # 旧检查点没有后来追加的字段，取 None
+    return {name: _KINDS[kind][which](values[name], ctx) if name in values else None for name, kind in fields}
+
+
+# ---------- 采集与恢复 ----------
+
+def _capture(gs: GameState) -> Dict[str, Any]:
+    """采集 GameState 为原生值字典（卡牌为 Card 对象、方位为枚举）"""
+    room = gs.room
+    state = {name: getattr(gs, name) for name, _ in STATE_FIELDS if name != "card_level"}
+    state["card_level"] = gs.card_system.current_level
+
+    bidding = gs.bidding_system
+    bids = [(b.player_id, b.bid_type.value, b.suit, list(b.cards)) for b in bidding.bids]
+    current_bid = -1
+    if bidding.current_bid is not None:
+        current_bid = next((i for i, b in enumerate(bidding.bids) if b is bidding.current_bid), -1)
+        if current_bid < 0:
+            b = bidding.current_bid
+            bids.append((b.player_id, b.bid_type.value, b.suit, list(b.cards)))
+            current_bid = len(bids) - 1
+
+    card_playing = None
+    cps = gs.card_playing_system
+    if cps is not None:
+        card_playing = {name: getattr(cps, name) for name, _ in CARD_PLAYING_FIELDS}
+        card_playing["led_card_type"] = cps.led_card_type.value if cps.led_card_type else None
+        card_playing["idle_positions"] = sorted(cps.idle_positions, key=_POSITIONS.index)
+
+    return {
+        "room": {name: getattr(room, name) for name, _ in ROOM_FIELDS},
+        "players": [{name: getattr(p, name) for name, _ in PLAYER_FIELDS} for p in room.players],
+        "state": state,
+        "bidding": {
+            "current_level": bidding.current_level,
+            "bidding_phase": bidding.bidding_phase,
+            "bids": bids,
+            "current_bid": current_bid,
+        },
+        "card_playing": card_playing,
+    }
+
+
+def _restore(native: Dict[str, Any]) -> GameState:
+    """由原生值字典重建 GameState"""
+    room_values = dict(native["room"])
+    room_values["status"] = GameStatus(room_values["status"])
+    room = GameRoom(players=[Player(**p) for p in native["players"]], **room_values)
+
+    state = native["state"]
+    gs = GameState(room, level_up_mode=state["level_up_mode"], ace_reset_enabled=state["ace_reset_enabled"])
+    gs.card_system.current_level = state["card_level"]
+    for name, _ in STATE_FIELDS:
+        if name != "card_level":
+            setattr(gs, name, state[name])
+    gs.players_ready_for_next_round = set(state["players_ready_for_next_round"])
+    gs.players_ready_to_start = set(state["players_ready_to_start"])
+
+    bidding_values = native["bidding"]
+    bidding = gs.bidding_system
+    bidding.current_level = bidding_values["current_level"]
+    bidding.bidding_phase = bidding_values["bidding_phase"]
+    bidding.bids = []
+    for player_id, bid_type, suit, cards in bidding_values["bids"]:
+        bid = Bid(player_id, BidType(bid_type), suit)
+        bid.cards = cards
+        bidding.bids.append(bid)
+    idx = bidding_values["current_bid"]
+    bidding.current_bid = bidding.bids[idx] if idx is not None and idx >= 0 else None
+
+    cp_values = native["card_playing"]
+    if cp_values is not None:
+        cps = CardPlayingSystem(gs.card_system, cp_values["trump_suit"])
+        for name, _ in CARD_PLAYING_FIELDS:
+            setattr(cps, name, cp_values[name])
+        cps.led_card_type = CardType(cp_values["led_card_type"]) if cp_values["led_card_type"] else None
+        cps.idle_positions = set(cp_values["idle_positions"])
+        # 出牌系统引用的是玩家手牌列表本身
+        cps.set_player_hands({p.position: p.cards for p in room.players})
+        gs.card_playing_system = cps
+    return gs
+
+
+def _sections(native: Dict[str, Any]):
+    yield "room", ROOM_FIELDS
+    yield "state", STATE_FIELDS
+    yield "bidding", BIDDING_FIELDS
+
+
+def _to_form(native: Dict[str, Any], which: int) -> Dict[str, Any]:
+    ctx = _Context([Player(id=p["id"], name="", position=p["position"]) for p in native["players"]])
+    out: Dict[str, Any] = {
+        "players": [_convert(p, PLAYER_FIELDS, ctx, which) for p in native["players"]],
+    }
+    for section, fields in _sections(native):
+        out[section] = _convert(native[section], fields, ctx, which)
+    cp = native["card_playing"]
+    out["card_playing"] = _convert(cp, CARD_PLAYING_FIELDS, ctx, which) if cp is not None else None
+    return out
+
+
+def _from_form(form: Dict[str, Any], which: int) -> Dict[str, Any]:
+    # 先还原玩家（其他字段中的玩家序号依赖玩家列表）
+    players = [_convert(p, PLAYER_FIELDS, _Context([]), which) for p in form["players"]]
+    ctx = _Context([Player(id=p["id"], name="", position=p["position"]) for p in players])
+    native: Dict[str, Any] = {"players": players}
+    for section, fields in _sections(form):
+        native[section] = _convert(form[section], fields, ctx, which)
+    cp = form["card_playing"]
+    native["card_playing"] = _convert(cp, CARD_PLAYING_FIELDS, ctx, which) if cp is not None else None
+    return native
+
+
+# ---------- 对外接口 ----------
+
+def dump_checkpoint(gs: GameState) -> bytes:
+    """保存为紧凑二进制检查点"""
+    form = _to_form(_capture(gs), 2)
+    body = [
+        [[p[name] for name, _ in PLAYER_FIELDS] for p in form["players"]],
+        [form["room"][name] for name, _ in ROOM_FIELDS],
+        [form["state"][name] for name, _ in STATE_FIELDS],
+        [form["bidding"][name] for name, _ in BIDDING_FIELDS],
+        [form["card_playing"][name] for name, _ in CARD_PLAYING_FIELDS] if form["card_playing"] else None,
+    ]
+    out = bytearray(CHECKPOINT_MAGIC)
+    out.append(CHECKPOINT_VERSION)
+    _codec.encode_into(out, body)
+    return bytes(out)
+
+
+def load_checkpoint(data: bytes) -> GameState:
+    """由紧凑二进制检查点恢复 GameState"""
+    if not data.startswith(CHECKPOINT_MAGIC) or len(data) < len(CHECKPOINT_MAGIC) + 1:
+        raise CheckpointError("不是GameState检查点")
+    version = data[len(CHECKPOINT_MAGIC)]
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError(f"不支持的检查点版本: {version}")
+    try:
+        players, room, state, bidding, card_playing = _codec.decode(data[len(CHECKPOINT_MAGIC) + 1:])
+        form = {
+            "players": [dict(zip((n for n, _ in PLAYER_FIELDS), p)) for p in players],
+            "room": dict(zip((n for n, _ in ROOM_FIELDS), room)),
+            "state": dict(zip((n for n, _ in STATE_FIELDS), state)),
+            "bidding": dict(zip((n for n, _ in BIDDING_FIELDS), bidding)),
+            "card_playing": dict(zip((n for n, _ in CARD_PLAYING_FIELDS), card_playing)) if card_playing else None,
+        }
+        return _restore(_from_form(form, 3))
+    except (CompactCodecError, ValueError, KeyError, IndexError, TypeError) as e:
+        raise CheckpointError(f"检查点损坏: {e}") from e
+
+
+def checkpoint_to_json(gs: GameState) -> Dict[str, Any]:
+    """调试用 JSON 形式（字段名完整，卡牌为字符串）"""
+    return {"version": CHECKPOINT_VERSION, **_to_form(_capture(gs), 0)}
+
+
+def checkpoint_from_json(data: Dict[str, Any]) -> GameState:
+    """由调试用 JSON 形式恢复 GameState"""
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise CheckpointError(f"不支持的检查点版本: {data.get('version')}")
+    return _restore(_from_form(data, 1))
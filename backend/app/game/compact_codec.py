@@ -0,0 +1,238 @@
+"""
+紧凑二进制值编码
+
+对 JSON 兼容的值（None/bool/int/float/str/list/dict）以及 bytes 做带类型标签的二进制编码。
+与 JSON 相比：
+- 0~127 的整数只占1个字节
+- 卡牌字符串（如 "10♥"、"JOKER-A"）只占1个字节
+- 常用字符串（字段名、阶段名、方位等）通过驻留表编码为1~2个字节
+
+标签布局：
+    0x00-0x7F  小整数 0~127
+    0x80-0xB7  卡牌（0x80 + 卡牌编码）
+    0xC0       None
+    0xC2/0xC3  False/True
+    0xC4       int32（大端有符号）
+    0xC5       float64
+    0xC6       字符串（varint长度 + UTF-8）
+    0xC7       列表（varint个数 + 元素）
+    0xC8       字典（varint个数 + 键值对）
+    0xC9       驻留字符串（扩展区，后跟1字节序号）
+    0xCA       int64（大端有符号）
+    0xCB       bytes（varint长度 + 原始字节）
+    0xD0-0xFF  驻留字符串（前48个，单字节）
+"""
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+from app.game.card_codes import CARD_STRING_TO_CODE, CODE_TO_CARD_STRING
+
+
+TAG_CARD_BASE = 0x80
+TAG_NIL = 0xC0
+TAG_FALSE = 0xC2
+TAG_TRUE = 0xC3
+TAG_INT32 = 0xC4
+TAG_FLOAT64 = 0xC5
+TAG_STR = 0xC6
+TAG_LIST = 0xC7
+TAG_MAP = 0xC8
+TAG_INTERNED_EXT = 0xC9
+TAG_INT64 = 0xCA
+TAG_BYTES = 0xCB
+TAG_INTERNED_BASE = 0xD0
+
+INTERNED_SHORT_COUNT = 0x100 - TAG_INTERNED_BASE  # 48
+MAX_INTERNED = 256
+
+_INT32 = struct.Struct(">i")
+_INT64 = struct.Struct(">q")
+_FLOAT64 = struct.Struct(">d")
+
+
+class CompactCodecError(ValueError):
+    """编码或解码失败"""
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise CompactCodecError("varint 被截断")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+class CompactCodec:
+    """
+    紧凑二进制编解码器
+
+    Args:
+        interned: 驻留字符串表（编码端和解码端必须一致，最多256个）
+        encode_cards: 是否将卡牌字符串编码为单字节
+    """
+
+    def __init__(self, interned: Sequence[str] = (), encode_cards: bool = True):
+        if len(interned) > MAX_INTERNED:
+            raise ValueError(f"驻留字符串表最多 {MAX_INTERNED} 个")
+        if len(set(interned)) != len(interned):
+            raise ValueError("驻留字符串表存在重复项")
+        self.interned: List[str] = list(interned)
+        self._interned_index: Dict[str, int] = {s: i for i, s in enumerate(self.interned)}
+        self.encode_cards = encode_cards
+
+    # ---------- 编码 ----------
+
+    def encode(self, value: Any) -> bytes:
+        out = bytearray()
+        self.encode_into(out, value)
+        return bytes(out)
+
+    def encode_into(self, out: bytearray, value: Any) -> None:
+        # 注意：bool 是 int 的子类，必须先判断
+        if value is None:
+            out.append(TAG_NIL)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif isinstance(value, str):
+            self._encode_str(out, value)
+        elif isinstance(value, int):
+            if 0 <= value < 0x80:
+                out.append(value)
+            elif -0x80000000 <= value <= 0x7FFFFFFF:
+                out.append(TAG_INT32)
+                out += _INT32.pack(value)
+            else:
+                out.append(TAG_INT64)
+                out += _INT64.pack(value)
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT64)
+            out += _FLOAT64.pack(value)
+        elif isinstance(value, dict):
+            out.append(TAG_MAP)
+            write_varint(out, len(value))
+            for k, v in value.items():
+                self._encode_str(out, k if isinstance(k, str) else str(k))
+                self.encode_into(out, v)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            out.append(TAG_LIST)
+            write_varint(out, len(value))
+            for item in value:
+                self.encode_into(out, item)
+        elif isinstance(value, (bytes, bytearray)):
+            out.append(TAG_BYTES)
+            write_varint(out, len(value))
+            out += value
+        elif hasattr(value, "value") and isinstance(value.value, (str, int)):
+            # 枚举值（如 PlayerPosition、Suit）按其值编码
+            self.encode_into(out, value.value)
+        else:
+            raise CompactCodecError(f"不支持的类型: {type(value).__name__}")
+
+    def _encode_str(self, out: bytearray, value: str) -> None:
+        if self.encode_cards:
+            code = CARD_STRING_TO_CODE.get(value)
+            if code is not None:
+                out.append(TAG_CARD_BASE + code)
+                return
+        idx = self._interned_index.get(value)
+        if idx is not None:
+            if idx < INTERNED_SHORT_COUNT:
+                out.append(TAG_INTERNED_BASE + idx)
+            else:
+                out.append(TAG_INTERNED_EXT)
+                out.append(idx)
+            return
+        raw = value.encode("utf-8")
+        out.append(TAG_STR)
+        write_varint(out, len(raw))
+        out += raw
+
+    # ---------- 解码 ----------
+
+    def decode(self, data: bytes, pos: int = 0) -> Any:
+        try:
+            value, end = self.decode_from(data, pos)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise CompactCodecError(f"数据格式错误: {e}") from e
+        if end != len(data):
+            raise CompactCodecError("数据末尾存在多余字节")
+        return value
+
+    def decode_from(self, data: bytes, pos: int) -> Tuple[Any, int]:
+        if pos >= len(data):
+            raise CompactCodecError("数据被截断")
+        tag = data[pos]
+        pos += 1
+        if tag < 0x80:
+            return tag, pos
+        if tag < TAG_NIL:
+            code = tag - TAG_CARD_BASE
+            if code >= len(CODE_TO_CARD_STRING):
+                raise CompactCodecError(f"无效的卡牌编码: {code}")
+            return CODE_TO_CARD_STRING[code], pos
+        if tag >= TAG_INTERNED_BASE:
+            return self._interned_at(tag - TAG_INTERNED_BASE), pos
+        if tag == TAG_NIL:
+            return None, pos
+        if tag == TAG_TRUE:
+            return True, pos
+        if tag == TAG_FALSE:
+            return False, pos
+        if tag == TAG_INT32:
+            return _INT32.unpack_from(data, pos)[0], pos + 4
+        if tag == TAG_INT64:
+            return _INT64.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_FLOAT64:
+            return _FLOAT64.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_STR:
+            length, pos = read_varint(data, pos)
+            end = pos + length
+            if end > len(data):
+                raise CompactCodecError("字符串被截断")
+            return data[pos:end].decode("utf-8"), end
+        if tag == TAG_BYTES:
+            length, pos = read_varint(data, pos)
+            end = pos + length
+            if end > len(data):
+                raise CompactCodecError("字节串被截断")
+            return bytes(data[pos:end]), end
+        if tag == TAG_LIST:
+            count, pos = read_varint(data, pos)
+            items = []
+            for _ in range(count):
+                item, pos = self.decode_from(data, pos)
+                items.append(item)
+            return items, pos
+        if tag == TAG_MAP:
+            count, pos = read_varint(data, pos)
+            result: Dict[str, Any] = {}
+            for _ in range(count):
+                key, pos = self.decode_from(data, pos)
+                value, pos = self.decode_from(data, pos)
+                result[key] = value
+            return result, pos
+        if tag == TAG_INTERNED_EXT:
+            if pos >= len(data):
+                raise CompactCodecError("驻留字符串序号被截断")
+            return self._interned_at(data[pos]), pos + 1
+        raise CompactCodecError(f"未知标签: 0x{tag:02X}")
+
+    def _interned_at(self, idx: int) -> str:
+        if idx >= len(self.interned):
+            raise CompactCodecError(f"无效的驻留字符串序号: {idx}")
+        return self.interned[idx]
+
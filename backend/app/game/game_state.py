@@ -3,7 +3,9 @@
 """
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import functools
 import random
+import time
 import asyncio
 from app.models.game import GameRoom, Player, PlayerPosition, GameStatus, Suit, Card, Rank
 from app.game.card_system import CardSystem
@@ -11,6 +13,21 @@ from app.game.bidding_system import BiddingSystem
 from app.game.card_sorter import CardSorter
 from app.game.card_playing import CardPlayingSystem
 from app.game.leveling import calculate_level_up
+from app.game.card_codes import card_string_to_code, code_to_card
+from app.core.metrics import counter
+
+engine_calls_total = counter("engine_calls_total", "游戏引擎（GameState）状态变更方法的调用次数", ["op"])
+
+
+def _engine_call(func):
+    """统计引擎调用次数（标签在定义时绑定，每次调用只多一次加法）"""
+    calls = engine_calls_total.labels(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        calls.inc()
+        return func(*args, **kwargs)
+    return wrapper
 
 
 class GameState:
@@ -94,6 +111,7 @@ class GameState:
         self.north_south_ace_count: int = 0  # 南北方坐庄且级牌为A的次数
         self.east_west_ace_count: int = 0    # 东西方坐庄且级牌为A的次数
         self.stats_recorded: bool = False   # 是否已记录本局战绩
+        self.round_started_at: Optional[float] = None  # 本局开始发牌的时间（Unix时间戳，用于计算本局时长）
     
     def _reset_round_state(self):
         """
@@ -136,6 +154,7 @@ class GameState:
         # 总结信息（新一轮开始时清空）
         self.round_summary = None
         self.stats_recorded = False
+        self.round_started_at = time.time()
         
         # 重置倒计时
         if self.max_play_time > 0:
@@ -145,6 +164,7 @@ class GameState:
         self.countdown_active = False
         self.countdown_task = None
         
+    @_engine_call
     def start_game(self) -> bool:
         """开始游戏（当所有玩家都准备时自动调用）"""
         # 检查是否有4名玩家
@@ -223,6 +243,7 @@ class GameState:
         self.bottom_pending = True
         return True
     
+    @_engine_call
     def dealer_discard_bottom(self, cards_to_discard: List[Card]) -> bool:
         """庄家扣底（从手中扣出8张牌作为新底牌）"""
         if not self.dealer_has_bottom:
@@ -287,6 +308,7 @@ class GameState:
         """获取庄家"""
         return self.get_player_by_position(self.dealer_position)
     
+    @_engine_call
     def make_bid(self, player_id: str, cards: List[Card]) -> Dict[str, Any]:
         """玩家亮主"""
         if self.game_phase not in ["dealing", "bidding"]:
@@ -333,6 +355,7 @@ class GameState:
         
         return result
 
+    @_engine_call
     def pass_bid(self, player_id: str) -> Dict[str, Any]:
         """玩家选择不反主"""
         if self.game_phase not in ["dealing", "bidding"]:
@@ -360,6 +383,7 @@ class GameState:
             "finished": finished
         }
 
+    @_engine_call
     def finish_bidding(self) -> bool:
         """结束亮主阶段"""
         if self.game_phase not in ["bidding"]:
@@ -443,6 +467,7 @@ class GameState:
         self.trump_locked = True
         return True
 
+    @_engine_call
     def deal_tick(self) -> Dict[str, Any]:
         """发一张牌（逆时针下一位玩家），用于0.2s调用一次。发完100张后自动进入bidding阶段。"""
         if self.game_phase != "dealing":
@@ -524,6 +549,7 @@ class GameState:
             else:
                 self.card_playing_system.idle_positions = {PlayerPosition.NORTH, PlayerPosition.SOUTH}
     
+    @_engine_call
     def play_card(self, player_id: str, cards: List[Card]) -> Dict[str, Any]:
         """
         玩家出牌（支持多张牌：单张、对子、连对、甩牌）
@@ -728,6 +754,7 @@ class GameState:
             return self.current_countdown == 0
         return False
     
+    @_engine_call
     def auto_play(self) -> Dict[str, Any]:
         """
         自动出牌 - 支持优先使用玩家选中的卡牌
@@ -929,6 +956,7 @@ class GameState:
             }
             return next_dealer_map[current_dealer]
     
+    @_engine_call
     def end_round(self, idle_score: int) -> bool:
         """
         结束一局游戏，计算下一局的庄家
@@ -1234,6 +1262,10 @@ class GameState:
             else:
                 winner_side_name = "东西方"
         
+        # 本局时长（由检查点恢复的旧对局可能没有开始时间）
+        ended_at = time.time()
+        duration_seconds = int(ended_at - self.round_started_at) if self.round_started_at else None
+        
         # 保存本局总结信息（包括底牌，用于查看）
         self.round_summary = {
             "idle_score": base_idle_score,  # 基础得分（不含扣底）
@@ -1260,7 +1292,11 @@ class GameState:
             "east_west_ace_count": self.east_west_ace_count,  # 需求3：东西方打A次数（当前）
             "north_south_ace_count_before": north_south_ace_count_before,  # 需求3：南北方打A次数（本轮前）
             "east_west_ace_count_before": east_west_ace_count_before,  # 需求3：东西方打A次数（本轮前）
-            "dealer_is_playing_ace": dealer_is_playing_ace  # 需求3：本轮庄家是否在打A
+            "dealer_is_playing_ace": dealer_is_playing_ace,  # 需求3：本轮庄家是否在打A
+            "dealer_position": self.dealer_position.value if self.dealer_position else None,  # 本局庄家方位
+            "started_at": self.round_started_at,  # 本局开始时间（Unix时间戳）
+            "ended_at": ended_at,  # 本局结束时间（Unix时间戳）
+            "duration_seconds": duration_seconds  # 本局时长（秒）
         }
         
         # 进入scoring阶段
@@ -1269,6 +1305,7 @@ class GameState:
         self.players_ready_for_next_round = set()
         # 注意：不清空players_ready_to_start，因为下一轮开始时需要重新准备
     
+    @_engine_call
     def ready_to_start_game(self, player_id: str) -> Dict[str, Any]:
         """
         玩家准备开始游戏（waiting阶段使用）
@@ -1316,6 +1353,7 @@ class GameState:
             "game_started": False
         }
     
+    @_engine_call
     def cancel_ready_to_start_game(self, player_id: str) -> Dict[str, Any]:
         """
         玩家取消准备开始游戏（waiting阶段使用）
@@ -1344,6 +1382,7 @@ class GameState:
             "ready_players": list(self.players_ready_to_start)
         }
     
+    @_engine_call
     def ready_for_next_round(self, player_id: str) -> Dict[str, Any]:
         """
         玩家准备进入下一轮
@@ -1376,6 +1415,7 @@ class GameState:
             "ready_players": list(self.players_ready_for_next_round)  # 包含所有已准备玩家的ID列表
         }
     
+    @_engine_call
     def start_next_round(self) -> bool:
         """
         开始下一轮游戏（当所有玩家都准备好时自动调用）
@@ -1457,6 +1497,9 @@ class GameState:
     
     def _parse_card_string(self, card_str: str) -> Optional[Card]:
         """解析卡牌字符串为Card对象"""
+        code = card_string_to_code(card_str)
+        if code is not None:
+            return code_to_card(code)
         try:
             if "JOKER-A" in card_str or "JOKER/大王" in card_str:
                 return Card(rank=Rank.BIG_JOKER, is_joker=True)
@@ -72,6 +72,7 @@ class Player(BaseModel):
     is_ready: bool = False
     score: int = 0
     token: Optional[str] = None
+    user_id: Optional[str] = None  # 登录用户的账号ID（入座时记录），游客为 None
 
 
 class GameStatus(str, Enum):
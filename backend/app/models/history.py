@@ -0,0 +1,51 @@
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+import uuid
+from app.db.database import Base
+
+class GameRound(Base):
+    """每一局的结果（由战绩写入队列批量写入）"""
+    __tablename__ = "game_rounds"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    room_id = Column(String, index=True)
+    started_at = Column(DateTime, nullable=True)  # 开始发牌的时间（旧检查点恢复的对局可能没有）
+    ended_at = Column(DateTime, nullable=False, index=True)
+    duration_seconds = Column(Integer, nullable=True)
+
+    dealer_side = Column(String, nullable=False)      # "north_south" 或 "east_west"
+    dealer_position = Column(String, nullable=True)   # 本局庄家方位
+    idle_score = Column(Integer, default=0)           # 闲家基础得分（不含扣底）
+    bottom_score = Column(Integer, default=0)
+    bottom_bonus = Column(Integer, default=0)
+    total_score = Column(Integer, default=0)          # 闲家总得分（含扣底）
+    dealer_level_up = Column(Integer, default=0)
+    idle_level_up = Column(Integer, default=0)
+    old_north_south_level = Column(Integer)
+    old_east_west_level = Column(Integer)
+    new_north_south_level = Column(Integer)
+    new_east_west_level = Column(Integer)
+    dealer_wins = Column(Boolean, default=False)
+
+    players = relationship("RoundPlayer", back_populates="round", cascade="all, delete-orphan")
+
+class RoundPlayer(Base):
+    """一局中每个座位的玩家（游客的 user_id 为空）"""
+    __tablename__ = "round_players"
+
+    round_id = Column(String, ForeignKey("game_rounds.id"), primary_key=True)
+    position = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    player_name = Column(String)
+    # 冗余存放结束时间，"我最近N局" 只需按 (user_id, ended_at) 索引倒序读取
+    ended_at = Column(DateTime, nullable=False)
+    is_dealer_side = Column(Boolean, default=False)
+    won = Column(Boolean, default=False)
+    level_up = Column(Integer, default=0)  # 本方在本局的升级数
+    score = Column(Integer, default=0)     # 闲家方为本局得分，庄家方为0
+
+    round = relationship("GameRound", back_populates="players")
+
+    __table_args__ = (
+        Index("ix_round_players_user_ended", "user_id", "ended_at"),
+    )
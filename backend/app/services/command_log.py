@@ -0,0 +1,314 @@
+"""
+房间命令日志（预写日志）
+
+每个房间一个只追加的日志文件 {directory}/{room_id}.wal，记录已被接受的命令
+（发牌、亮主、扣底、出牌、超时自动出牌、准备下一轮）。
+洗牌是随机的，因此每局开始（洗牌之后）写入 GameState 检查点并丢弃之前的记录：
+日志 = 最近一次检查点 + 之后的命令，进程重启后恢复检查点再按顺序重放命令即可重建房间。
+
+写入不在出牌的关键路径上：append 只把记录放入内存队列，后台任务把队列中的记录
+按房间合并写入，每批每个文件只 fsync 一次（组提交）。
+
+记录格式：长度(4字节) + CRC32(4字节) + CompactCodec 编码的 [类型, 数据]，
+进程崩溃时写了一半的最后一条记录在读取时丢弃。
+
+某个房间的写入或 fsync 失败时，该房间的日志标记为损坏：之后的命令不再追加，
+直到下一次检查点重写整个文件。这样磁盘上始终是检查点 + 连续的命令前缀，
+恢复时不会跳过丢失的记录去重放后面的命令。
+"""
+import asyncio
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Set, Tuple
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+from app.game.card_codes import cards_to_bytes, bytes_to_cards
+from app.game.checkpoint import load_checkpoint
+from app.game.compact_codec import CompactCodec, CompactCodecError
+from app.game.game_state import GameState
+from app.models.game import Card
+
+logger = logging.getLogger(__name__)
+
+command_log_records_total = counter("command_log_records_total", "写入命令日志的记录数")
+command_log_pending = gauge("command_log_pending", "等待写入命令日志的记录数")
+command_log_flush_seconds = histogram("command_log_flush_seconds", "命令日志每批写入（含fsync）耗时")
+command_log_errors_total = counter("command_log_errors_total", "命令日志写入失败次数（该房间的日志标记为损坏）")
+command_log_skipped_total = counter("command_log_skipped_total", "日志损坏期间未追加的命令数（等待下一次检查点）")
+
+RECORD_CHECKPOINT = "k"
+RECORD_COMMAND = "c"
+
+# 可以重放的命令
+COMMANDS = (
+    "deal_tick", "make_bid", "pass_bid", "finish_bidding", "submit_bottom",
+    "play_card", "ready_for_next_round",
+)
+
+_HEADER = struct.Struct("<II")
+_SUFFIX = ".wal"
+_SAFE_ROOM_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+_codec = CompactCodec([RECORD_CHECKPOINT, RECORD_COMMAND, *COMMANDS])
+
+# 写入队列中的操作
+_OP_APPEND = "append"
+_OP_RESET = "reset"  # 以这条记录为开头重写整个文件（检查点）
+_OP_DROP = "drop"
+
+
+def encode_record(kind: str, data: Any) -> bytes:
+    payload = _codec.encode([kind, data])
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(data: bytes) -> List[Tuple[str, Any]]:
+    """解析日志内容，遇到不完整或校验失败的记录即停止"""
+    records = []
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, pos)
+        start = pos + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning("命令日志在偏移 %d 处截断（%d 字节未读）", pos, len(data) - pos)
+            break
+        try:
+            kind, value = _codec.decode(payload)
+        except (CompactCodecError, ValueError):
+            logger.warning("命令日志在偏移 %d 处无法解析", pos)
+            break
+        records.append((kind, value))
+        pos = start + length
+    return records
+
+
+class CommandLog:
+    """
+    按房间的命令日志
+
+    directory 为 None 时不写入（未开启），所有方法都是空操作。
+    """
+
+    def __init__(self, directory: Optional[str], flush_interval: float = 0.005, fsync: bool = True):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._pending: List[Tuple[str, str, bytes]] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # close() 通知后台任务写完当前一批后退出（不能取消：写入线程无法随任务一起中断）
+        self._stopping = False
+        # 仅在写入线程中使用
+        self._files: Dict[str, BinaryIO] = {}
+        # 写入失败、等待下一次检查点的房间
+        self._broken: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, room_id: str) -> str:
+        return os.path.join(self.directory, room_id + _SUFFIX)
+
+    def _enqueue(self, op: str, room_id: str, record: bytes = b""):
+        if not self.enabled:
+            return
+        if not _SAFE_ROOM_ID.match(room_id):
+            logger.debug("房间ID %r 不能作为文件名，不记录命令日志", room_id)
+            return
+        self._pending.append((op, room_id, record))
+        command_log_pending.set(len(self._pending))
+        self._wakeup.set()
+
+    def append(self, room_id: str, command: str, player_id: Optional[str] = None,
+               cards: Optional[Sequence[Card]] = None):
+        """记录一条已被接受的命令（不等待写盘）"""
+        self._enqueue(_OP_APPEND, room_id, encode_record(
+            RECORD_COMMAND, [command, player_id, cards_to_bytes(cards) if cards is not None else None]
+        ))
+
+    def checkpoint(self, room_id: str, data: bytes):
+        """写入检查点并丢弃之前的命令（不等待写盘）"""
+        self._enqueue(_OP_RESET, room_id, encode_record(RECORD_CHECKPOINT, bytes(data)))
+
+    def drop(self, room_id: str):
+        """删除房间的日志（房间被回收）"""
+        self._enqueue(_OP_DROP, room_id)
+
+    def room_ids(self) -> List[str]:
+        """有日志的房间"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(_SUFFIX))
+
+    def read(self, room_id: str) -> List[Tuple[str, Any]]:
+        """读取房间日志中的全部记录"""
+        try:
+            with open(self._path(room_id), "rb") as f:
+                return decode_records(f.read())
+        except FileNotFoundError:
+            return []
+
+    def start(self):
+        """启动后台写入任务"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """等待此前的所有记录写入磁盘"""
+        async with self._lock:
+            if self._pending:
+                await self._write_pending()
+
+    async def close(self):
+        """写完剩余记录并停止后台任务"""
+        if self._task is not None:
+            # 等后台任务自己退出：正在写入线程中的一批写完之后才能关闭文件
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    async def _run(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._stopping:
+                # 攒一小段时间，把这期间所有房间的记录合并为一批
+                await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("写入命令日志失败")
+
+    async def _write_pending(self):
+        batch, self._pending = self._pending, []
+        command_log_pending.set(0)
+        start = time.perf_counter()
+        await asyncio.to_thread(self._write_batch, batch)
+        command_log_flush_seconds.observe(time.perf_counter() - start)
+        command_log_records_total.inc(len(batch))
+
+    def broken_rooms(self) -> List[str]:
+        """写入失败、下一次检查点之前不再追加命令的房间"""
+        return sorted(self._broken)
+
+    def _mark_broken(self, room_id: str, action: str):
+        logger.exception("命令日志%s失败，房间 %s 的日志在下一次检查点之前不再追加", action, room_id)
+        command_log_errors_total.inc()
+        self._broken.add(room_id)
+        f = self._files.pop(room_id, None)
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    def _write_batch(self, batch: List[Tuple[str, str, bytes]]):
+        dirty: Dict[str, BinaryIO] = {}
+        for op, room_id, record in batch:
+            if op == _OP_APPEND:
+                if room_id in self._broken:
+                    command_log_skipped_total.inc()
+                    continue
+                try:
+                    f = self._files.get(room_id)
+                    if f is None:
+                        f = self._files[room_id] = open(self._path(room_id), "ab")
+                    f.write(record)
+                    dirty[room_id] = f
+                except OSError:
+                    dirty.pop(room_id, None)
+                    self._mark_broken(room_id, "写入")
+                continue
+            f = self._files.pop(room_id, None)
+            dirty.pop(room_id, None)
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+            path = self._path(room_id)
+            if op == _OP_DROP:
+                self._broken.discard(room_id)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            # 检查点：先写临时文件再替换，任何时刻磁盘上都是完整的检查点+命令
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "wb") as tmp:
+                    tmp.write(record)
+                    tmp.flush()
+                    if self.fsync:
+                        os.fsync(tmp.fileno())
+                os.replace(tmp_path, path)
+                self._files[room_id] = open(path, "ab")
+                self._broken.discard(room_id)
+            except OSError:
+                # 旧文件中的命令属于上一个检查点，不能再追加新一局的命令
+                self._mark_broken(room_id, "写入检查点")
+        for room_id, f in dirty.items():
+            try:
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            except OSError:
+                self._mark_broken(room_id, "fsync")
+
+
+def apply_command(gs: GameState, command: str, player_id: Optional[str], cards: Optional[List[Card]]):
+    """把一条命令重放到 GameState（与 WebSocket 处理函数中对 GameState 的修改一致）"""
+    if command == "deal_tick":
+        gs.deal_tick()
+    elif command == "make_bid":
+        gs.make_bid(player_id, cards or [])
+    elif command == "pass_bid":
+        gs.pass_bid(player_id)
+    elif command == "finish_bidding":
+        gs.finish_bidding()
+    elif command == "submit_bottom":
+        gs.dealer_discard_bottom(cards or [])
+    elif command == "play_card":
+        gs.play_card(player_id, cards or [])
+        gs.selected_cards = None
+        # 一墩结束后处理函数在广播完成后清空当前墩
+        if len(gs.current_trick_with_player) == 4:
+            gs.current_trick_with_player = []
+        # 本局结束时处理函数已经提交了战绩记录
+        if gs.game_phase == "scoring" and gs.round_summary:
+            gs.stats_recorded = True
+    elif command == "ready_for_next_round":
+        gs.ready_for_next_round(player_id)
+    else:
+        raise ValueError(f"未知的命令: {command}")
+
+
+def rebuild_game_state(records: List[Tuple[str, Any]]) -> Optional[GameState]:
+    """由检查点和之后的命令重建 GameState，没有检查点时返回None"""
+    gs = None
+    for kind, data in records:
+        if kind == RECORD_CHECKPOINT:
+            gs = load_checkpoint(data)
+        elif kind == RECORD_COMMAND and gs is not None:
+            command, player_id, cards = data
+            apply_command(gs, command, player_id, bytes_to_cards(cards) if cards is not None else None)
+    return gs
+
+
+command_log = CommandLog(settings.command_log_dir)
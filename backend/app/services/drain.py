@@ -0,0 +1,94 @@
+"""
+优雅停机（排空）
+
+部署时进程收到 SIGTERM 后先排空房间，再交给 uvicorn 退出：
+1. 不再接受新房间、新加入和新连接（HTTP 返回 503，WebSocket 以 1012 关闭），
+   已连接的客户端发来的游戏操作也不再处理（回复错误，见 MessageDispatcher 的 reject）
+2. 停止自动发牌并暂停倒计时（保留剩余时间）
+3. 等待未完成的战绩写入
+4. 为每个进行中的 GameState 写检查点（命令日志和房间存储）
+5. 通知客户端服务器正在重启，并以 1012 关闭连接，客户端稍后重连到新进程
+
+具体步骤见 game_websocket.drain_rooms，新进程启动时由 game_websocket.recover_rooms 恢复。
+uvicorn 在执行 shutdown 事件之前就会关闭所有 WebSocket，所以排空在信号处理中进行；
+shutdown 事件中会再调用一次（已排空时为空操作），覆盖不经过信号的退出。
+"""
+import asyncio
+import logging
+import signal
+from typing import Awaitable, Callable
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# WebSocket 关闭码 1012：Service Restart，关闭原因为建议的重连延迟（毫秒）
+SERVICE_RESTART_CLOSE_CODE = 1012
+RECONNECT_DELAY_MS = 2000
+
+
+class DrainState:
+    """进程的排空状态"""
+
+    def __init__(self):
+        self.draining = False  # 已开始排空：拒绝新房间、新连接和游戏操作
+        self.drained = False  # 已完成排空
+
+    def reset(self):
+        self.draining = False
+        self.drained = False
+
+    def begin(self):
+        if not self.draining:
+            logger.info("开始排空：不再接受新房间和新连接")
+        self.draining = True
+
+    def reject_if_draining(self):
+        """排空期间拒绝创建/加入房间"""
+        if self.draining:
+            raise HTTPException(
+                status_code=503,
+                detail="服务器正在重启，请稍后再试",
+                headers={"Retry-After": str(max(RECONNECT_DELAY_MS // 1000, 1))}
+            )
+
+
+drain_state = DrainState()
+
+
+def install_drain_on_signal(drain: Callable[[], Awaitable[object]], timeout: float = 20):
+    """
+    在 uvicorn 的 SIGTERM/SIGINT 处理之前先执行排空
+
+    收到信号后在事件循环中执行 drain()，完成（或超时）后再调用原来的信号处理函数让 uvicorn 退出；
+    排空期间再次收到信号时直接交给原处理函数（强制退出）。
+    不在主线程中（例如测试客户端）时无法设置信号处理，直接跳过。
+    """
+    loop = asyncio.get_running_loop()
+    started = False
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            nonlocal started
+            if started:
+                previous(signum, frame)
+                return
+            started = True
+
+            async def run():
+                try:
+                    await asyncio.wait_for(drain(), timeout)
+                except Exception:
+                    logger.exception("排空失败，直接退出")
+                finally:
+                    previous(signum, frame)
+
+            loop.call_soon_threadsafe(lambda: loop.create_task(run()))
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            return
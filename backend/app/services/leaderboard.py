@@ -0,0 +1,274 @@
+"""
+排行榜
+
+启动时从 user_stats 读取一次全部已上场用户，之后在本进程的战绩写入队列提交成功时按增量更新，
+查询排行榜不访问数据库。
+
+增量只来自本进程的提交：多个 worker 共用一个数据库时，其他 worker 写入的战绩要等到
+重新加载才会出现。设置 LEADERBOARD_RELOAD_SECONDS 后由后台任务定期从 user_stats 重新加载，
+各 worker 的排行榜最多落后一个周期；不设置时（默认）只适用于单进程部署。
+
+每种排名方式维护一个有序列表（bisect 插入/删除），排名即列表下标：
+- wins：胜场（相同时场次少者在前）
+- win_rate：胜率（至少 min_games 局才参与，相同时场次多者在前）
+- level_ups：累计升级数（庄家方 + 闲家方）
+
+每次更新递增版本号（进程内计数），同一版本下每一页编码后的 JSON 会被缓存。
+ETag 由排行榜内容计算（每个用户战绩摘要之和），与进程和加载顺序无关：
+内容相同的 worker 给出相同的 ETag，客户端轮询到任一 worker 都能用 If-None-Match 得到 304。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+from app.models.user import User, Stats
+
+logger = logging.getLogger(__name__)
+
+leaderboard_users = gauge("leaderboard_users", "排行榜中的用户数")
+leaderboard_requests_total = counter("leaderboard_requests_total", "排行榜请求数", ["result"])
+
+RANKINGS = ("wins", "win_rate", "level_ups")
+DEFAULT_MIN_GAMES = 10
+MAX_PAGE_SIZE = 100
+# 每个版本最多缓存的页数
+MAX_CACHED_PAGES = 256
+_DIGEST_MOD = 1 << 64
+
+
+class _Entry:
+    __slots__ = ("user_id", "username", "games_played", "wins", "dealer_level_ups", "idle_level_ups")
+
+    def __init__(self, user_id: str, username: str, games_played: int = 0, wins: int = 0,
+                 dealer_level_ups: int = 0, idle_level_ups: int = 0):
+        self.user_id = user_id
+        self.username = username
+        self.games_played = games_played
+        self.wins = wins
+        self.dealer_level_ups = dealer_level_ups
+        self.idle_level_ups = idle_level_ups
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games_played if self.games_played else 0.0
+
+    @property
+    def level_ups(self) -> int:
+        return self.dealer_level_ups + self.idle_level_ups
+
+    def digest(self) -> int:
+        """战绩摘要（跨进程稳定，不使用受 PYTHONHASHSEED 影响的 hash()）"""
+        raw = "\0".join(str(v) for v in (self.user_id, self.username, self.games_played, self.wins,
+                                          self.dealer_level_ups, self.idle_level_ups))
+        return int.from_bytes(hashlib.blake2b(raw.encode(), digest_size=8).digest(), "big")
+
+    def to_dict(self, rank: int) -> Dict[str, Any]:
+        return {
+            "rank": rank,
+            "username": self.username,
+            "games_played": self.games_played,
+            "wins": self.wins,
+            "win_rate": round(self.win_rate, 4),
+            "level_ups": self.level_ups,
+        }
+
+
+class Leaderboard:
+    """内存排行榜（只在事件循环中使用，不需要加锁）"""
+
+    def __init__(self, min_games: int = DEFAULT_MIN_GAMES):
+        self.min_games = min_games
+        self.version = 0
+        # 上榜用户战绩摘要之和（模 2^64），随 _link/_unlink 增量维护，作为 ETag
+        self._digest = 0
+        self._entries: Dict[str, _Entry] = {}
+        # 排名方式 -> 有序的排序键列表，键的最后一项为 user_id
+        self._sorted: Dict[str, List[Tuple]] = {name: [] for name in RANKINGS}
+        self._pages: Dict[Tuple[str, int, int], bytes] = {}
+        self._session_factory: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _keys(self, e: _Entry) -> Dict[str, Optional[Tuple]]:
+        return {
+            "wins": (-e.wins, e.games_played, e.username, e.user_id),
+            "win_rate": (-e.win_rate, -e.games_played, e.username, e.user_id)
+            if e.games_played >= self.min_games else None,
+            "level_ups": (-e.level_ups, e.games_played, e.username, e.user_id),
+        }
+
+    def _unlink(self, e: _Entry):
+        self._digest = (self._digest - e.digest()) % _DIGEST_MOD
+        for name, key in self._keys(e).items():
+            if key is None:
+                continue
+            keys = self._sorted[name]
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    def _link(self, e: _Entry):
+        self._digest = (self._digest + e.digest()) % _DIGEST_MOD
+        for name, key in self._keys(e).items():
+            if key is not None:
+                insort(self._sorted[name], key)
+
+    def _changed(self):
+        self.version += 1
+        self._pages.clear()
+        leaderboard_users.set(len(self._entries))
+
+    def _replace(self, e: _Entry):
+        old = self._entries.get(e.user_id)
+        if old is not None:
+            self._unlink(old)
+        if e.games_played > 0:
+            self._entries[e.user_id] = e
+            self._link(e)
+        else:
+            self._entries.pop(e.user_id, None)
+
+    @staticmethod
+    async def _read(session_factory: Callable, user_ids: Optional[List[str]] = None) -> List[_Entry]:
+        """读取已上场用户的完整战绩（指定 user_ids 时只读取这些用户）"""
+        query = (
+            select(User.id, User.username, Stats.games_played, Stats.wins,
+                   Stats.dealer_level_ups, Stats.idle_level_ups)
+            .join(Stats, Stats.user_id == User.id)
+        )
+        if user_ids is None:
+            query = query.where(Stats.games_played > 0)
+        else:
+            query = query.where(User.id.in_(user_ids))
+        async with session_factory() as db:
+            result = await db.execute(query)
+            return [_Entry(row[0], row[1], *(v or 0 for v in row[2:])) for row in result.all()]
+
+    def _rebuild(self, entries: List[_Entry]):
+        self._entries.clear()
+        for keys in self._sorted.values():
+            keys.clear()
+        self._digest = 0
+        for e in entries:
+            self._replace(e)
+
+    async def load(self, session_factory: Callable):
+        """从数据库加载全部已上场用户（启动时调用一次）"""
+        self._session_factory = session_factory
+        # 读取完成后再替换，加载期间的查询仍使用旧的排名
+        self._rebuild(await self._read(session_factory))
+        self._changed()
+        logger.info("排行榜加载了 %d 名用户", len(self._entries))
+
+    async def reload(self) -> bool:
+        """重新从数据库加载（包含其他 worker 写入的战绩），内容有变化时返回 True"""
+        if self._session_factory is None:
+            return False
+        entries = await self._read(self._session_factory)
+        digest = self._digest
+        self._rebuild(entries)
+        if self._digest == digest:
+            return False
+        self._changed()
+        return True
+
+    def start(self, interval_seconds: float):
+        """启动定期重新加载的后台任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval_seconds))
+
+    async def stop(self):
+        """停止定期重新加载"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("重新加载排行榜失败")
+
+    async def apply(self, deltas: List[Dict[str, Any]]):
+        """
+        战绩写入队列提交成功后的回调：按增量更新
+
+        增量只包含登录用户（游客不计战绩），只有第一次上场的用户需要读取数据库。
+        """
+        missing = []
+        for d in deltas:
+            e = self._entries.get(d["user_id"])
+            if e is None:
+                missing.append(d["user_id"])
+                continue
+            self._unlink(e)
+            e.games_played += d.get("games_played", 0)
+            e.wins += d.get("wins", 0)
+            e.dealer_level_ups += d.get("dealer_level_ups", 0)
+            e.idle_level_ups += d.get("idle_level_ups", 0)
+            self._link(e)
+        if missing and self._session_factory is not None:
+            # 第一次上场的用户：读取提交后的完整战绩（已包含本批增量）
+            for e in await self._read(self._session_factory, missing):
+                self._replace(e)
+        self._changed()
+
+    def remove(self, user_ids: Iterable[str]):
+        """用户被删除时移出排行榜"""
+        removed = False
+        for user_id in user_ids:
+            e = self._entries.pop(user_id, None)
+            if e is not None:
+                self._unlink(e)
+                removed = True
+        if removed:
+            self._changed()
+
+    def etag(self, by: str) -> str:
+        return f'W/"lb-{by}-{self._digest:016x}"'
+
+    def page(self, by: str, offset: int = 0, limit: int = 20) -> bytes:
+        """返回一页排名（编码后的 JSON，同一版本内缓存）"""
+        if by not in RANKINGS:
+            raise ValueError(f"未知的排名方式: {by}")
+        cache_key = (by, offset, limit)
+        body = self._pages.get(cache_key)
+        if body is None:
+            keys = self._sorted[by]
+            items = [
+                self._entries[key[-1]].to_dict(rank)
+                for rank, key in enumerate(keys[offset:offset + limit], start=offset + 1)
+            ]
+            body = json.dumps({
+                "by": by,
+                "total": len(keys),
+                "offset": offset,
+                "limit": limit,
+                "version": self.version,
+                "items": items,
+            }, ensure_ascii=False).encode()
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[cache_key] = body
+        return body
+
+    def rank_of(self, user_id: str, by: str) -> Optional[int]:
+        """用户的名次（未上榜返回None）"""
+        e = self._entries.get(user_id)
+        key = self._keys(e).get(by) if e is not None else None
+        if key is None:
+            return None
+        return bisect_left(self._sorted[by], key) + 1
+
+
+leaderboard = Leaderboard(min_games=settings.leaderboard_min_games)
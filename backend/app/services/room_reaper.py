@@ -0,0 +1,171 @@
+"""
+空闲房间回收
+
+房间（app.api.game.rooms，即 RoomRegistry）和 GameState（ConnectionManager.game_states）只在内存中，
+没有任何连接超过 TTL（settings.game_timeout_minutes）的房间会被回收：
+取消倒计时任务、移除 GameState 与房间，可选地先交给归档回调保存
+（CheckpointArchive 把 GameState 检查点写入 settings.room_archive_dir），
+并从房间存储（RoomStore）和命令日志中删除。
+
+每次扫描时刷新本进程有连接的房间在房间存储中的过期时间：对局中途不一定写入房间存储，
+不刷新的话进行超过 TTL 的对局会在 Redis 中过期，重启恢复和其他 worker 都找不到它。
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from app.core.metrics import gauge
+from app.game.checkpoint import dump_checkpoint
+
+logger = logging.getLogger(__name__)
+
+rooms_live = gauge("rooms_live", "内存中的房间数")
+rooms_idle = gauge("rooms_idle", "没有连接的房间数")
+rooms_archived = gauge("rooms_archived", "已回收并归档的房间数（进程启动以来）")
+
+# 归档回调：(room_id, room, game_state) -> None，可以是协程函数
+ArchiveHook = Callable[[str, Any, Any], Union[None, Awaitable[None]]]
+
+
+class CheckpointArchive:
+    """归档回调：把 GameState 的紧凑检查点写入 directory/<room_id>.ckpt（可由 load_checkpoint 读取）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, room_id: str) -> str:
+        return os.path.join(self.directory, f"{room_id}.ckpt")
+
+    async def __call__(self, room_id: str, room: Any, game_state: Any):
+        data = dump_checkpoint(game_state)
+        await asyncio.to_thread(self._write, room_id, data)
+
+    def _write(self, room_id: str, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(room_id)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+class RoomReaper:
+    """
+    定期扫描房间，回收空闲超过 TTL 的房间
+
+    空闲时间从扫描时第一次发现房间没有连接开始计算，有连接后清零，
+    因此回收时间的误差不超过一个扫描间隔。
+    """
+
+    def __init__(self, manager, rooms: Dict[str, Any], ttl_seconds: float,
+                 interval_seconds: float = 60, archive: Optional[ArchiveHook] = None,
+                 store=None, command_log=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.manager = manager
+        self.rooms = rooms
+        self.ttl_seconds = ttl_seconds
+        self.interval_seconds = interval_seconds
+        self.archive = archive
+        self.store = store
+        self.command_log = command_log
+        self.clock = clock
+        # room_id -> 开始空闲的时间
+        self.idle_since: Dict[str, float] = {}
+        self.archived_count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台扫描任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台扫描任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("回收空闲房间失败")
+
+    async def reap(self) -> int:
+        """扫描一次，返回本次回收的房间数"""
+        now = self.clock()
+        connections = self.manager.connections
+        expired = []
+        active = []
+        idle = 0
+        # GameState 存在但房间已不存在的也一并回收
+        room_ids = set(self.rooms) | set(self.manager.game_states)
+        for room_id in room_ids:
+            if room_id in connections:
+                self.idle_since.pop(room_id, None)
+                if self._owns(room_id):
+                    active.append(room_id)
+                continue
+            idle += 1
+            since = self.idle_since.setdefault(room_id, now)
+            if now - since >= self.ttl_seconds:
+                expired.append(room_id)
+
+        if self.store is not None and active:
+            try:
+                await self.store.touch(sorted(active))
+            except Exception:
+                logger.exception("刷新房间存储过期时间失败")
+
+        for room_id in expired:
+            await self.evict(room_id)
+
+        rooms_live.set(len(self.rooms))
+        rooms_idle.set(idle - len(expired))
+        rooms_archived.set(self.archived_count)
+        return len(expired)
+
+    def _owns(self, room_id: str) -> bool:
+        """房间是否归本进程所有（在本进程上有对局的也算；不区分所有权的映射视为全部归本进程）"""
+        owns = getattr(self.rooms, "owns", None)
+        return owns is None or owns(room_id) or room_id in self.manager.game_states
+
+    async def evict(self, room_id: str):
+        """
+        回收单个房间
+
+        只有归本进程所有的房间才从房间存储和命令日志中删除；从存储读来的其他进程的房间
+        在本进程同样没有连接，这里只丢弃缓存的副本，不能删掉其他进程仍在进行的房间。
+        """
+        self.idle_since.pop(room_id, None)
+        owned = self._owns(room_id)
+        game_state = await self.manager.release_room(room_id)
+        room = self.rooms.pop(room_id, None)
+        if not owned:
+            logger.debug("丢弃其他进程房间 %s 的缓存", room_id)
+            return
+        # 没有 GameState 的房间没有对局可归档
+        if self.archive is not None and room is not None and game_state is not None:
+            try:
+                result = self.archive(room_id, room, game_state)
+                if inspect.isawaitable(result):
+                    await result
+                self.archived_count += 1
+            except Exception:
+                logger.exception("归档房间 %s 失败", room_id)
+        if self.store is not None:
+            try:
+                await self.store.delete_room(room_id)
+            except Exception:
+                logger.exception("从房间存储删除 %s 失败", room_id)
+        if self.command_log is not None:
+            self.command_log.drop(room_id)
+        logger.info("回收空闲房间 %s", room_id)
@@ -0,0 +1,232 @@
+"""
+房间注册表
+
+RoomRegistry 持有本进程的所有房间（GameRoom），对外仍是 room_id -> GameRoom 的映射，
+原来直接读写 rooms 字典的代码不用修改；同时维护三个索引：
+- 玩家令牌 -> (房间ID, 玩家ID)：重连时直接定位玩家
+- 玩家ID（登录用户即用户ID）-> 房间ID集合：查询用户所在的房间
+- 房间状态 -> 房间ID集合
+
+房间的增删、入座和状态变化都经过注册表，因此也是接入大厅摘要、房间存储（以及以后的分片）的唯一位置：
+- 房间存入/移除时同步更新大厅摘要
+- load() 对不归本进程所有的房间每次都从房间存储重新读取（见下）
+- 房间数达到上限时拒绝创建（RoomCapacityExceeded）
+- assign_seat() 在一次同步调用中完成查重、检查座位和入座，中间没有 await，不会被其他请求插入
+
+在其他地方修改了 room.players 或 room.status 后需要调用 refresh(room) 重建该房间的索引。
+
+房间归属：本进程创建的、由检查点/命令日志恢复的、以及在本进程上开始对局（claim()）的房间
+归本进程所有，内存中的对象就是最新状态。其他房间（多个 worker 共享房间存储时由其他进程创建的）
+只是存储中副本的缓存，load() 每次都重新读取，避免用过期的副本响应请求或在 save() 时覆盖更新的状态。
+"""
+import uuid
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.models.game import GameRoom, GameStatus, Player, PlayerPosition
+from app.services.room_store import RoomStore, room_store
+from app.services.room_summary import RoomSummaries, room_summaries
+
+SEAT_ORDER = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
+
+
+class RoomCapacityExceeded(Exception):
+    """房间总数已达上限"""
+
+
+class SeatError(Exception):
+    """入座失败（原因在 str(e) 中）"""
+
+
+class RoomFull(SeatError):
+    """房间已满"""
+
+
+class NameTaken(SeatError):
+    """玩家名已被占用"""
+
+
+class RoomRegistry(MutableMapping):
+    """本进程房间的持有者与索引"""
+
+    def __init__(self, store: Optional[RoomStore] = None, summaries: Optional[RoomSummaries] = None,
+                 max_rooms: int = 0, seats_per_room: int = 4):
+        self.store = store
+        self.summaries = summaries
+        # 0 表示不限制
+        self.max_rooms = max_rooms
+        self.seats = SEAT_ORDER[:seats_per_room]
+        self._rooms: Dict[str, GameRoom] = {}
+        self._by_token: Dict[str, Tuple[str, str]] = {}
+        self._by_player: Dict[str, Set[str]] = {}
+        self._by_status: Dict[GameStatus, Set[str]] = {}
+        # room_id -> 建立索引时的 (令牌列表, 玩家ID列表, 状态)，用于移除旧索引
+        self._indexed: Dict[str, Tuple[List[str], List[str], GameStatus]] = {}
+        # 归本进程所有的房间
+        self._owned: Set[str] = set()
+
+    # ---------- 映射接口 ----------
+
+    def __getitem__(self, room_id: str) -> GameRoom:
+        return self._rooms[room_id]
+
+    def __setitem__(self, room_id: str, room: GameRoom):
+        self._rooms[room_id] = room
+        self._owned.add(room_id)
+        self.refresh(room)
+
+    def __delitem__(self, room_id: str):
+        del self._rooms[room_id]
+        self._owned.discard(room_id)
+        self._unindex(room_id)
+        if self.summaries is not None:
+            self.summaries.remove(room_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rooms)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __contains__(self, room_id) -> bool:
+        return room_id in self._rooms
+
+    # ---------- 索引 ----------
+
+    def refresh(self, room: GameRoom, phase: Optional[str] = None):
+        """房间的玩家或状态变化后重建索引并更新大厅摘要"""
+        if self._rooms.get(room.id) is not room:
+            return
+        self._unindex(room.id)
+        tokens = [p.token for p in room.players if p.token]
+        player_ids = [p.id for p in room.players]
+        for p in room.players:
+            if p.token:
+                self._by_token[p.token] = (room.id, p.id)
+            self._by_player.setdefault(p.id, set()).add(room.id)
+        self._by_status.setdefault(room.status, set()).add(room.id)
+        self._indexed[room.id] = (tokens, player_ids, room.status)
+        if self.summaries is not None:
+            self.summaries.update(room, phase)
+
+    def _unindex(self, room_id: str):
+        indexed = self._indexed.pop(room_id, None)
+        if indexed is None:
+            return
+        tokens, player_ids, status = indexed
+        for token in tokens:
+            if self._by_token.get(token, (None,))[0] == room_id:
+                del self._by_token[token]
+        for player_id in player_ids:
+            room_ids = self._by_player.get(player_id)
+            if room_ids is not None:
+                room_ids.discard(room_id)
+                if not room_ids:
+                    del self._by_player[player_id]
+        room_ids = self._by_status.get(status)
+        if room_ids is not None:
+            room_ids.discard(room_id)
+
+    def find_by_token(self, token: str) -> Optional[Tuple[GameRoom, Player]]:
+        """根据玩家令牌找到房间和玩家"""
+        entry = self._by_token.get(token)
+        if entry is None:
+            return None
+        room = self._rooms[entry[0]]
+        player = next((p for p in room.players if p.id == entry[1]), None)
+        return (room, player) if player is not None else None
+
+    def rooms_of(self, player_id: str) -> List[str]:
+        """玩家（登录用户为用户ID）所在的房间ID"""
+        return sorted(self._by_player.get(player_id, ()))
+
+    def with_status(self, status: GameStatus) -> List[str]:
+        return sorted(self._by_status.get(status, ()))
+
+    def count_by_status(self) -> Dict[str, int]:
+        return {status.value: len(self._by_status.get(status, ())) for status in GameStatus}
+
+    # ---------- 房间生命周期 ----------
+
+    def create(self, room: GameRoom) -> GameRoom:
+        """登记新房间；房间数达到上限时抛出 RoomCapacityExceeded"""
+        if self.max_rooms and len(self._rooms) >= self.max_rooms:
+            raise RoomCapacityExceeded()
+        self._rooms[room.id] = room
+        self._owned.add(room.id)
+        self.refresh(room, "waiting")
+        return room
+
+    def owns(self, room_id: str) -> bool:
+        return room_id in self._owned
+
+    def claim(self, room_id: str):
+        """在本进程上开始对局（创建 GameState）后，本进程的副本成为最新状态"""
+        if room_id in self._rooms:
+            self._owned.add(room_id)
+
+    async def load(self, room_id: str) -> Optional[GameRoom]:
+        """
+        归本进程所有的房间直接返回内存中的对象；
+        其他房间（其他 worker 创建的或重启前的）每次从房间存储重新读取，存储中已删除时同时移除缓存
+        """
+        room = self._rooms.get(room_id)
+        if self.store is None or room_id in self._owned:
+            return room
+        fresh = await self.store.load_room(room_id)
+        if fresh is None:
+            if room is not None:
+                del self[room_id]
+            return None
+        self._rooms[room_id] = fresh
+        self.refresh(fresh)
+        return fresh
+
+    async def save(self, room: GameRoom):
+        if self.store is not None:
+            await self.store.save_room(room)
+
+    def assign_seat(self, room: GameRoom, player_name: str, user_id: Optional[str] = None) -> Tuple[Player, bool]:
+        """
+        为玩家分配座位（同步完成，检查与入座之间不会切换到其他请求）
+
+        Returns:
+            (玩家, 是否新入座)；已在房间中时返回原来的玩家
+        Raises:
+            NameTaken: 名称被其他玩家占用
+            RoomFull: 没有空座位
+        """
+        if user_id:
+            existing = next((p for p in room.players if p.id == user_id), None)
+        else:
+            existing = next((p for p in room.players if p.name == player_name), None)
+        if existing is not None:
+            return existing, False
+        if any(p.name == player_name for p in room.players):
+            raise NameTaken("该名称已被使用，请选择其他名称")
+        used = {p.position for p in room.players}
+        free = [pos for pos in self.seats if pos not in used]
+        if room.is_full or not free:
+            raise RoomFull("Room is full")
+
+        player = Player(
+            id=user_id if user_id else str(uuid.uuid4()),
+            name=player_name,
+            position=free[0],
+            is_ready=True,
+            token=str(uuid.uuid4()),
+            user_id=user_id or None
+        )
+        room.players.append(player)
+        if room.owner_id is None:
+            room.owner_id = player.id
+        self.refresh(room)
+        return player, True
+
+
+room_registry = RoomRegistry(
+    store=room_store,
+    summaries=room_summaries,
+    max_rooms=settings.max_rooms,
+    seats_per_room=settings.max_players_per_room
+)
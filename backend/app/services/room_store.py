@@ -0,0 +1,178 @@
+"""
+房间状态存储
+
+RoomStore 保存房间元数据（GameRoom，JSON）和 GameState 检查点（紧凑二进制），
+用于多 worker 共享房间以及进程重启后恢复。
+
+- InMemoryRoomStore：进程内字典，默认实现，行为与原来只用 rooms 字典一致
+- RedisRoomStore：基于 redis.asyncio，任何兼容 Redis 协议的服务（或 fakeredis）都可以使用
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+from app.core.config import settings
+from app.models.game import GameRoom
+
+# 手牌属于 GameState 检查点，不写入房间元数据
+_ROOM_META_EXCLUDE = {"players": {"__all__": {"cards"}}}
+
+
+class RoomStore(ABC):
+    """房间状态存储接口"""
+
+    @abstractmethod
+    async def save_room(self, room: GameRoom) -> None:
+        """保存房间元数据（覆盖）"""
+
+    @abstractmethod
+    async def load_room(self, room_id: str) -> Optional[GameRoom]:
+        """读取房间元数据，不存在时返回None"""
+
+    @abstractmethod
+    async def save_checkpoint(self, room_id: str, data: bytes) -> None:
+        """保存房间的GameState检查点"""
+
+    @abstractmethod
+    async def load_checkpoint(self, room_id: str) -> Optional[bytes]:
+        """读取房间的GameState检查点，不存在时返回None"""
+
+    @abstractmethod
+    async def delete_room(self, room_id: str) -> None:
+        """删除房间元数据和检查点"""
+
+    @abstractmethod
+    async def room_ids(self) -> List[str]:
+        """所有已保存的房间ID"""
+
+    async def touch(self, room_ids: Sequence[str]) -> None:
+        """刷新房间的过期时间（对局进行中房间元数据和检查点不一定有写入）"""
+
+    async def close(self) -> None:
+        """释放连接等资源"""
+
+
+class InMemoryRoomStore(RoomStore):
+    """进程内存储"""
+
+    def __init__(self):
+        self._rooms: Dict[str, str] = {}
+        self._checkpoints: Dict[str, bytes] = {}
+
+    async def save_room(self, room: GameRoom) -> None:
+        # 保存序列化结果而不是对象本身，避免调用方后续修改影响已保存的状态
+        self._rooms[room.id] = room.model_dump_json(exclude=_ROOM_META_EXCLUDE)
+
+    async def load_room(self, room_id: str) -> Optional[GameRoom]:
+        data = self._rooms.get(room_id)
+        return GameRoom.model_validate_json(data) if data is not None else None
+
+    async def save_checkpoint(self, room_id: str, data: bytes) -> None:
+        self._checkpoints[room_id] = bytes(data)
+
+    async def load_checkpoint(self, room_id: str) -> Optional[bytes]:
+        return self._checkpoints.get(room_id)
+
+    async def delete_room(self, room_id: str) -> None:
+        self._rooms.pop(room_id, None)
+        self._checkpoints.pop(room_id, None)
+
+    async def room_ids(self) -> List[str]:
+        return list(self._rooms)
+
+
+class RedisRoomStore(RoomStore):
+    """
+    Redis 存储
+
+    每个房间一个 hash：{prefix}room:{room_id}，字段 meta（JSON）和 checkpoint（二进制），
+    房间ID集合保存在 {prefix}rooms。设置 ttl_seconds 后每次写入都会刷新过期时间，
+    有连接的房间由空闲房间回收任务定期 touch，长时间无人连接的房间（例如所在进程已退出）由 Redis 自动清理。
+    """
+
+    def __init__(self, client, prefix: str = "qv:", ttl_seconds: Optional[int] = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisRoomStore":
+        from redis import asyncio as redis_asyncio
+        return cls(redis_asyncio.Redis.from_url(url), **kwargs)
+
+    def _key(self, room_id: str) -> str:
+        return f"{self.prefix}room:{room_id}"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.prefix}rooms"
+
+    async def _write(self, room_id: str, field: str, value) -> None:
+        key = self._key(room_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, field, value)
+            pipe.sadd(self._index_key, room_id)
+            if self.ttl_seconds:
+                pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def save_room(self, room: GameRoom) -> None:
+        await self._write(room.id, "meta", room.model_dump_json(exclude=_ROOM_META_EXCLUDE))
+
+    async def load_room(self, room_id: str) -> Optional[GameRoom]:
+        data = await self.client.hget(self._key(room_id), "meta")
+        return GameRoom.model_validate_json(data) if data is not None else None
+
+    async def save_checkpoint(self, room_id: str, data: bytes) -> None:
+        await self._write(room_id, "checkpoint", bytes(data))
+
+    async def load_checkpoint(self, room_id: str) -> Optional[bytes]:
+        return await self.client.hget(self._key(room_id), "checkpoint")
+
+    async def delete_room(self, room_id: str) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(room_id))
+            pipe.srem(self._index_key, room_id)
+            await pipe.execute()
+
+    async def touch(self, room_ids: Sequence[str]) -> None:
+        if not self.ttl_seconds or not room_ids:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                pipe.expire(self._key(room_id), self.ttl_seconds)
+            await pipe.execute()
+
+    async def room_ids(self) -> List[str]:
+        members = await self.client.smembers(self._index_key)
+        room_ids = sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+        if not self.ttl_seconds:
+            return room_ids
+        # 过期的房间 hash 已被 Redis 删除，顺便从索引中清理
+        alive = []
+        for room_id in room_ids:
+            if await self.client.exists(self._key(room_id)):
+                alive.append(room_id)
+            else:
+                await self.client.srem(self._index_key, room_id)
+        return alive
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_room_store(backend: str, redis_url: Optional[str] = None,
+                      ttl_seconds: Optional[int] = None) -> RoomStore:
+    """根据配置创建存储：backend 为 "memory" 或 "redis" """
+    if backend == "redis":
+        if not redis_url:
+            raise ValueError("room_store=redis 需要配置 redis_url")
+        return RedisRoomStore.from_url(redis_url, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        raise ValueError(f"未知的房间存储类型: {backend}")
+    return InMemoryRoomStore()
+
+
+room_store: RoomStore = create_room_store(
+    settings.room_store,
+    settings.redis_url,
+    ttl_seconds=settings.game_timeout_minutes * 60
+)
@@ -0,0 +1,146 @@
+"""
+大厅房间摘要
+
+GET /api/rooms 只需要房间的公开信息，不应该带上玩家手牌和令牌。
+RoomSummaries 为每个房间维护一份摘要（名称、座位数、状态、设置），
+在创建、加入、阶段变化和回收时增量更新；内容没有变化时不做任何事。
+摘要集合变化时版本号加一，同一版本下每一页编码后的 JSON 只生成一次；
+同时通知监听者（大厅 WebSocket 推送 room_added / room_updated / room_removed）。
+"""
+import json
+import logging
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.models.game import GameRoom
+
+logger = logging.getLogger(__name__)
+
+MAX_PLAYERS = 4
+MAX_PAGE_SIZE = 100
+# 每个版本最多缓存的页数
+MAX_CACHED_PAGES = 64
+# 不在大厅中列出的房间（调试用）
+HIDDEN_ROOMS = {"demo"}
+
+# 摘要变化事件：{"type": "room_added" | "room_updated", "version", "room"}
+# 或 {"type": "room_removed", "version", "room_id"}
+ChangeListener = Callable[[Dict[str, Any]], None]
+
+
+def summarize_room(room: GameRoom, phase: Optional[str] = None) -> Dict[str, Any]:
+    """房间的公开摘要（不含手牌、令牌和玩家ID）"""
+    return {
+        "id": room.id,
+        "name": room.name,
+        "status": room.status.value,
+        "phase": phase,
+        "player_count": len(room.players),
+        "max_players": MAX_PLAYERS,
+        "player_names": [p.name for p in room.players],
+        "is_full": room.is_full,
+        "play_time_limit": room.play_time_limit,
+        "level_up_mode": room.level_up_mode,
+        "ace_reset_enabled": room.ace_reset_enabled,
+        "created_at": room.created_at.isoformat(),
+    }
+
+
+def paginate(summaries: Iterable[Dict[str, Any]], status: Optional[str], offset: int, limit: int) -> Dict[str, Any]:
+    selected = [s for s in summaries if status is None or s["status"] == status]
+    return {
+        "total": len(selected),
+        "offset": offset,
+        "limit": limit,
+        "rooms": selected[offset:offset + limit],
+    }
+
+
+class RoomSummaries:
+    """按房间ID维护的摘要集合（只在事件循环中使用）"""
+
+    def __init__(self):
+        self.version = 0
+        # 版本号在进程重启后从头开始，ETag 中加入进程内唯一的前缀
+        self._epoch = uuid.uuid4().hex[:8]
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._pages: Dict[Tuple[Optional[str], int, int], bytes] = {}
+        self._listeners: List[ChangeListener] = []
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def get(self, room_id: str) -> Optional[Dict[str, Any]]:
+        return self._summaries.get(room_id)
+
+    def values(self) -> List[Dict[str, Any]]:
+        return list(self._summaries.values())
+
+    def add_listener(self, listener: ChangeListener):
+        """摘要变化后同步调用 listener(event)（在事件循环中，不应阻塞）"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ChangeListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def update(self, room: GameRoom, phase: Optional[str] = None) -> bool:
+        """
+        房间变化后更新摘要
+
+        Args:
+            phase: 游戏阶段；不传时沿用之前的阶段
+
+        Returns:
+            摘要是否有变化
+        """
+        if room.id in HIDDEN_ROOMS:
+            return False
+        old = self._summaries.get(room.id)
+        if phase is None and old is not None:
+            phase = old["phase"]
+        summary = summarize_room(room, phase)
+        if summary == old:
+            return False
+        self._summaries[room.id] = summary
+        self._changed({"type": "room_added" if old is None else "room_updated", "room": summary})
+        return True
+
+    def remove(self, room_id: str) -> bool:
+        if self._summaries.pop(room_id, None) is None:
+            return False
+        self._changed({"type": "room_removed", "room_id": room_id})
+        return True
+
+    def clear(self):
+        for room_id in list(self._summaries):
+            self.remove(room_id)
+
+    def _changed(self, event: Dict[str, Any]):
+        self.version += 1
+        self._pages.clear()
+        event["version"] = self.version
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("房间摘要监听者处理 %s 失败", event["type"])
+
+    def etag(self) -> str:
+        return f'W/"rooms-{self._epoch}-{self.version}"'
+
+    def page(self, status: Optional[str] = None, offset: int = 0, limit: int = 20) -> bytes:
+        """一页房间摘要（编码后的 JSON，同一版本内缓存）"""
+        key = (status, offset, limit)
+        body = self._pages.get(key)
+        if body is None:
+            body = json.dumps(
+                {"version": self.version, **paginate(self._summaries.values(), status, offset, limit)},
+                ensure_ascii=False
+            ).encode()
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = body
+        return body
+
+
+room_summaries = RoomSummaries()
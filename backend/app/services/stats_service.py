@@ -1,65 +1,313 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import update
-from typing import Dict, List, Any
+"""
+战绩写入
+
+每局结束时把各玩家的战绩增量和本局记录交给 StatsWriter，由后台任务定期批量写入：
+- 同一批内的多局按用户合并，用一条 UPDATE user_stats SET col = col + :delta 批量执行，不需要先读再写
+- 每局的结果批量插入 game_rounds / round_players（对局历史），与战绩在同一事务中提交
+写入失败时按指数退避重试，队列有上限，数据库长时间不可用时丢弃最旧的记录。
+每批提交成功后把按用户合并的增量交给已注册的监听者（例如排行榜），由它们增量更新内存数据。
+"""
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, insert, update
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+import asyncio
 import logging
+import time
+import uuid
 
-from app.models.user import User, Stats
-from app.db.database import async_session
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+from app.models.user import Stats
+from app.models.history import GameRound, RoundPlayer
+from app.db.database import writer_session
 
 logger = logging.getLogger(__name__)
 
-async def record_game_stats(round_summary: Dict[str, Any], players: List[Any]):
+stats_queue_depth = gauge("stats_writer_queue_depth", "等待写入的对局数")
+stats_flush_seconds = histogram("stats_writer_flush_seconds", "每批战绩写入耗时（含重试）")
+stats_rounds_total = counter("stats_writer_rounds_total", "已写入的对局数")
+stats_retries_total = counter("stats_writer_retries_total", "战绩写入重试次数")
+stats_dropped_total = counter("stats_writer_dropped_total", "因队列已满或重试失败而丢弃的对局数")
+
+# 可累加的战绩列
+STATS_COLUMNS = ("games_played", "wins", "dealer_level_ups", "idle_level_ups", "total_score")
+
+_stats_table = Stats.__table__
+_UPDATE_STATS = (
+    update(_stats_table)
+    .where(_stats_table.c.user_id == bindparam("b_user_id"))
+    .values({col: _stats_table.c[col] + bindparam(f"b_{col}") for col in STATS_COLUMNS})
+)
+
+
+_INSERT_ROUND = insert(GameRound.__table__)
+_INSERT_ROUND_PLAYER = insert(RoundPlayer.__table__)
+
+# game_rounds 中直接取自 round_summary 的整数列
+ROUND_SCORE_COLUMNS = (
+    "idle_score", "bottom_score", "bottom_bonus", "total_score", "dealer_level_up", "idle_level_up",
+    "old_north_south_level", "old_east_west_level", "new_north_south_level", "new_east_west_level",
+)
+
+
+def _is_registered(player: Any) -> bool:
+    # 入座时记录了账号ID的才是注册用户（游客的玩家ID同样是 UUID，不能按ID判断）
+    return bool(getattr(player, "user_id", None))
+
+
+def _is_dealer_side(player: Any, dealer_side: Optional[str]) -> bool:
+    if dealer_side == "north_south":
+        return player.position.value in ["north", "south"]
+    return player.position.value in ["east", "west"]
+
+
+def _utc(timestamp: Optional[float]) -> Optional[datetime]:
+    # 数据库中的时间列为不带时区的 UTC 时间
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None) if timestamp else None
+
+
+def compute_stats_deltas(round_summary: Dict[str, Any], players: List[Any]) -> List[Dict[str, Any]]:
     """
-    记录一局游戏的统计数据
+    计算一局中每个已注册玩家的战绩增量
+
+    Returns:
+        [{"user_id": ..., "games_played": 1, "wins": ..., ...}]
     """
-    async with async_session() as db:
-        try:
-            dealer_side = round_summary.get("dealer_side")
-            dealer_level_up = round_summary.get("dealer_level_up", 0)
-            idle_level_up = round_summary.get("idle_level_up", 0)
-            dealer_wins = round_summary.get("dealer_wins", False)
-            total_score = round_summary.get("total_score", 0)
-
-            # 遍历所有玩家，如果是已注册用户（ID 为 UUID 格式），则更新其统计数据
-            for player in players:
-                # 简单判断是否为注册用户：ID 长度通常较长且包含横杠
-                if not player.id or len(str(player.id)) < 20:
-                    continue
-                
-                # 确定玩家属于哪一方
-                is_dealer_side = False
-                if dealer_side == "north_south":
-                    is_dealer_side = player.position.value in ["north", "south"]
-                else:
-                    is_dealer_side = player.position.value in ["east", "west"]
-                
-                # 计算该玩家的升级数和胜负
-                level_ups = dealer_level_up if is_dealer_side else idle_level_up
-                win = 1 if (is_dealer_side and dealer_wins) or (not is_dealer_side and not dealer_wins) else 0
-                
-                # 更新数据库
-                # 1. 更新 Stats 表
-                stmt = select(Stats).where(Stats.user_id == player.id)
-                result = await db.execute(stmt)
-                stats = result.scalars().first()
-                
-                if stats:
-                    stats.games_played += 1
-                    stats.wins += win
-                    if is_dealer_side:
-                        stats.dealer_level_ups += level_ups
-                    else:
-                        stats.idle_level_ups += level_ups
-                    stats.total_score += total_score
-                
-                # 记录日志以便调试
-                logger.info(f"Updated stats for user {player.name} (ID: {player.id}): win={win}, level_ups={level_ups}")
-
-            await db.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Failed to record game stats: {e}")
-            await db.rollback()
+    dealer_side = round_summary.get("dealer_side")
+    dealer_level_up = round_summary.get("dealer_level_up", 0)
+    idle_level_up = round_summary.get("idle_level_up", 0)
+    dealer_wins = round_summary.get("dealer_wins", False)
+    total_score = round_summary.get("total_score", 0)
+
+    deltas = []
+    for player in players:
+        if not _is_registered(player):
+            continue
+
+        # 确定玩家属于哪一方
+        is_dealer_side = _is_dealer_side(player, dealer_side)
+
+        # 计算该玩家的升级数和胜负
+        level_ups = dealer_level_up if is_dealer_side else idle_level_up
+        win = 1 if (is_dealer_side and dealer_wins) or (not is_dealer_side and not dealer_wins) else 0
+        deltas.append({
+            "user_id": str(player.user_id),
+            "games_played": 1,
+            "wins": win,
+            "dealer_level_ups": level_ups if is_dealer_side else 0,
+            "idle_level_ups": 0 if is_dealer_side else level_ups,
+            "total_score": total_score,
+        })
+    return deltas
+
+
+def build_round_rows(round_summary: Dict[str, Any], players: List[Any],
+                     room_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    把一局的总结整理为 game_rounds 和 round_players 的行
+
+    Returns:
+        {"round": {...}, "players": [{...}, ...]}
+    """
+    round_id = str(uuid.uuid4())
+    ended_at = _utc(round_summary.get("ended_at") or time.time())
+    dealer_side = round_summary.get("dealer_side")
+    dealer_wins = bool(round_summary.get("dealer_wins", False))
+    total_score = round_summary.get("total_score", 0)
+
+    round_row = {
+        "id": round_id,
+        "room_id": room_id,
+        "started_at": _utc(round_summary.get("started_at")),
+        "ended_at": ended_at,
+        "duration_seconds": round_summary.get("duration_seconds"),
+        "dealer_side": dealer_side,
+        "dealer_position": round_summary.get("dealer_position"),
+        "dealer_wins": dealer_wins,
+        **{col: round_summary.get(col, 0) for col in ROUND_SCORE_COLUMNS},
+    }
+    player_rows = []
+    for player in players:
+        is_dealer_side = _is_dealer_side(player, dealer_side)
+        player_rows.append({
+            "round_id": round_id,
+            "position": player.position.value,
+            "user_id": str(player.user_id) if _is_registered(player) else None,
+            "player_name": getattr(player, "name", None),
+            "ended_at": ended_at,
+            "is_dealer_side": is_dealer_side,
+            "won": is_dealer_side == dealer_wins,
+            "level_up": round_summary.get("dealer_level_up" if is_dealer_side else "idle_level_up", 0),
+            "score": 0 if is_dealer_side else total_score,
+        })
+    return {"round": round_row, "players": player_rows}
+
+
+class StatsWriter:
+    """
+    战绩写入队列（后写）
+
+    submit 只把增量放入内存队列，不等待数据库；后台任务每 flush_interval 秒写一批。
+    close 之后可以在新的事件循环中再次 start（同一进程内再次启动应用），队列中剩余的对局继续写入。
+    """
+
+    def __init__(self, session_factory: Callable = writer_session, max_queue: int = 10000,
+                 flush_interval: float = 1.0, max_batch: int = 500,
+                 max_retries: int = 5, retry_backoff: float = 0.5):
+        self.session_factory = session_factory
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # 每个元素为一局：{"deltas": 战绩增量, "round": game_rounds 行, "players": round_players 行}
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # 提交成功后的回调：await listener([{"user_id": ..., "games_played": ..., ...}])
+        self._listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def submit(self, round_summary: Dict[str, Any], players: List[Any], room_id: Optional[str] = None) -> bool:
+        """
+        提交一局的战绩和对局记录（不等待写入）
+
+        Returns:
+            是否进入队列（队列已满时丢弃最旧的一局，仍返回True；没有注册玩家时返回False）
+        """
+        deltas = compute_stats_deltas(round_summary, players)
+        if not deltas:
             return False
+        entry = {"deltas": deltas, **build_round_rows(round_summary, players, room_id)}
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            stats_dropped_total.inc()
+            logger.error("战绩写入队列已满（%d），丢弃最旧的一局", self.max_queue)
+        self._queue.append(entry)
+        stats_queue_depth.set(len(self._queue))
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None or self._task.done():
+            # 同一进程内再次启动应用（例如测试）时可能换了事件循环，同步原语重新创建
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            if self._queue:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    def add_commit_listener(self, listener: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        """注册每批提交成功后的回调（参数为按用户合并后的增量）"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    async def _notify(self, rows: List[Dict[str, Any]]):
+        deltas = [{key[2:]: value for key, value in row.items()} for row in rows]
+        for listener in self._listeners:
+            try:
+                await listener(deltas)
+            except Exception:
+                logger.exception("战绩提交回调失败")
+
+    async def flush(self, timeout: Optional[float] = None) -> int:
+        """
+        立即写入队列中的所有对局
+
+        Returns:
+            超时后仍在队列中的对局数
+        """
+        try:
+            await asyncio.wait_for(self._flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d 局战绩未在 %.0f 秒内写入", len(self._queue), timeout)
+        return len(self._queue)
+
+    async def close(self, timeout: Optional[float] = 10):
+        """写完队列并停止后台任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(timeout)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 攒一段时间再写，合并这期间结束的所有对局
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("写入战绩失败")
+
+    async def _flush(self):
+        async with self._lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_batch:
+                    batch.append(self._queue.popleft())
+                stats_queue_depth.set(len(self._queue))
+                try:
+                    await self._write_batch(batch)
+                except asyncio.CancelledError:
+                    # 超时或停止时未写入的对局放回队列头部
+                    self._queue.extendleft(reversed(batch))
+                    stats_queue_depth.set(len(self._queue))
+                    raise
+
+    @staticmethod
+    def _merge(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按用户合并同一批中的多局增量"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for entry in batch:
+            for delta in entry["deltas"]:
+                row = merged.setdefault(delta["user_id"], {"b_user_id": delta["user_id"], **{f"b_{c}": 0 for c in STATS_COLUMNS}})
+                for col in STATS_COLUMNS:
+                    row[f"b_{col}"] += delta[col]
+        return list(merged.values())
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        rows = self._merge(batch)
+        rounds = [entry["round"] for entry in batch]
+        round_players = [p for entry in batch for p in entry["players"]]
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(_UPDATE_STATS, rows)
+                    await db.execute(_INSERT_ROUND, rounds)
+                    await db.execute(_INSERT_ROUND_PLAYER, round_players)
+                    await db.commit()
+                stats_flush_seconds.observe(time.perf_counter() - start)
+                stats_rounds_total.inc(len(batch))
+                logger.info("写入 %d 局战绩（%d 名用户）", len(batch), len(rows))
+                await self._notify(rows)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    break
+                stats_retries_total.inc()
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning("写入战绩失败（第 %d 次），%.1f 秒后重试: %s", attempt + 1, delay, e)
+                await asyncio.sleep(delay)
+        stats_flush_seconds.observe(time.perf_counter() - start)
+        stats_dropped_total.inc(len(batch))
+        logger.error("写入战绩重试 %d 次仍失败，丢弃 %d 局", self.max_retries, len(batch))
+        return False
+
 
+stats_writer = StatsWriter(
+    max_queue=settings.stats_queue_size,
+    flush_interval=settings.stats_flush_interval_seconds
+)
@@ -0,0 +1,149 @@
+"""
+不活跃用户清理（后台任务）
+
+管理员发起后在后台按用户ID分批（keyset，每批 batch_size 个）删除，每批一个短事务：
+删除战绩、解除对局历史与用户的关联、删除用户。批次之间根据写入耗时让出写连接：
+- 清理最多占用写连接 duty_cycle 比例的时间（每批耗时越长，之后暂停越久）
+- 战绩写入队列有积压时先暂停（最多 max_backlog_wait 秒），让对局战绩优先写入
+进度通过 status() 查询；同一时间只运行一个清理任务。
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import delete, select, update
+from app.core.metrics import counter, histogram
+from app.core.security import token_cache
+from app.db.database import writer_session
+from app.models.user import User, Stats
+from app.models.history import RoundPlayer
+from app.services.leaderboard import leaderboard
+from app.services.stats_service import stats_writer
+
+logger = logging.getLogger(__name__)
+
+cleanup_deleted_total = counter("user_cleanup_deleted_total", "清理任务删除的用户数")
+cleanup_batch_seconds = histogram("user_cleanup_batch_seconds", "清理任务每批事务耗时")
+
+
+class CleanupAlreadyRunning(Exception):
+    """已有清理任务在运行"""
+
+
+class UserCleanupJob:
+    """分批删除不活跃用户的后台任务"""
+
+    def __init__(self, session_factory: Callable = writer_session, batch_size: int = 200,
+                 duty_cycle: float = 0.2, min_pause: float = 0.01, backlog_pause: float = 0.5,
+                 max_backlog_wait: float = 5.0):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.min_pause = min_pause
+        self.backlog_pause = backlog_pause
+        self.max_backlog_wait = max_backlog_wait
+        self._task: Optional[asyncio.Task] = None
+        self._state: Dict[str, Any] = {"status": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self._state)
+
+    def start(self, days: int) -> Dict[str, Any]:
+        """开始清理 days 天未登录的非管理员用户"""
+        if self.running:
+            raise CleanupAlreadyRunning()
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        self._state = {
+            "status": "running",
+            "days": days,
+            "cutoff": cutoff.isoformat(),
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "deleted": 0,
+            "batches": 0,
+            "throttled_seconds": 0.0,
+            "error": None,
+        }
+        self._task = asyncio.create_task(self._run(cutoff))
+        return self.status()
+
+    async def stop(self):
+        """取消正在运行的清理（已提交的批次保留）"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self, cutoff: datetime):
+        last_id = ""
+        try:
+            while True:
+                async with self.session_factory() as db:
+                    result = await db.execute(
+                        select(User.id)
+                        .where(User.last_active < cutoff, User.is_admin == False, User.id > last_id)
+                        .order_by(User.id)
+                        .limit(self.batch_size)
+                    )
+                    candidates = [row[0] for row in result.all()]
+                if not candidates:
+                    break
+                last_id = candidates[-1]
+
+                start = time.perf_counter()
+                deleted = await self._delete_batch(candidates, cutoff)
+                elapsed = time.perf_counter() - start
+                cleanup_batch_seconds.observe(elapsed)
+                cleanup_deleted_total.inc(len(deleted))
+                leaderboard.remove(deleted)
+                token_cache.invalidate_users(deleted)
+                self._state["deleted"] += len(deleted)
+                self._state["batches"] += 1
+
+                await self._throttle(elapsed)
+            self._state["status"] = "done"
+            logger.info("清理不活跃用户完成：删除 %d 个", self._state["deleted"])
+        except asyncio.CancelledError:
+            self._state["status"] = "cancelled"
+            raise
+        except Exception as e:
+            self._state["status"] = "failed"
+            self._state["error"] = str(e)
+            logger.exception("清理不活跃用户失败")
+        finally:
+            self._state["finished_at"] = datetime.utcnow().isoformat()
+
+    async def _delete_batch(self, candidates: List[str], cutoff: datetime) -> List[str]:
+        """一个短事务删除一批用户，返回实际删除的ID（期间重新登录的用户跳过）"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(User.id).where(User.id.in_(candidates), User.last_active < cutoff, User.is_admin == False)
+            )
+            user_ids = [row[0] for row in result.all()]
+            if user_ids:
+                await db.execute(delete(Stats).where(Stats.user_id.in_(user_ids)))
+                # 保留对局历史，只解除与用户的关联
+                await db.execute(update(RoundPlayer).where(RoundPlayer.user_id.in_(user_ids)).values(user_id=None))
+                await db.execute(delete(User).where(User.id.in_(user_ids)))
+            await db.commit()
+        return user_ids
+
+    async def _throttle(self, elapsed: float):
+        pause = max(self.min_pause, elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+        # 战绩写入有积压时让它先写
+        waited = 0.0
+        while stats_writer.queue_depth > 0 and waited < self.max_backlog_wait:
+            await asyncio.sleep(self.backlog_pause)
+            waited += self.backlog_pause
+        await asyncio.sleep(pause)
+        self._state["throttled_seconds"] = round(self._state["throttled_seconds"] + waited + pause, 3)
+
+
+user_cleanup = UserCleanupJob()
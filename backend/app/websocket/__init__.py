@@ -3,8 +3,10 @@ WebSocket routes
 """
 from fastapi import APIRouter
 from .game_websocket import router as game_websocket_router
+from .lobby import router as lobby_router
 
 router = APIRouter()
 
 # Include WebSocket routers
-router.include_router(game_websocket_router, prefix="/game", tags=["websocket"])
\ No newline at end of file
+router.include_router(game_websocket_router, prefix="/game", tags=["websocket"])
+router.include_router(lobby_router, tags=["websocket"])
\ No newline at end of file
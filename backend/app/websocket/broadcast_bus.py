@@ -0,0 +1,171 @@
+"""
+跨进程房间事件广播总线
+
+每个进程（节点）先把房间事件发送给本地连接，再通过总线发布给其他节点，
+其他节点收到后发送给各自的本地连接（旁观者、其他 worker 上的玩家）。
+只有按房间广播和按玩家定向的事件会发布，指定 websocket 的事件只在本地有效。
+
+- InProcessBroadcastBus：同一进程内的节点互相投递（单进程部署、测试）
+- RedisBroadcastBus：Redis pub/sub，发布先进入队列，由后台任务合并为一条消息发送，
+  订阅端由单个任务按顺序投递，保证每个连接看到的事件顺序与发布顺序一致
+"""
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (消息, 目标类型, 目标)，与 RoomOutbox.entries 相同
+Entry = Tuple[Any, str, Any]
+DeliverHandler = Callable[[str, List[Entry]], Awaitable[None]]
+
+
+class BroadcastBus(ABC):
+    """广播总线接口"""
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex
+        self._handler: Optional[DeliverHandler] = None
+
+    def set_handler(self, handler: DeliverHandler) -> None:
+        """设置收到其他节点事件时的本地投递函数"""
+        self._handler = handler
+
+    @abstractmethod
+    async def publish(self, room_id: str, entries: Sequence[Entry]) -> None:
+        """把一组事件发布给其他节点（调用时即完成序列化，之后修改消息不影响已发布内容）"""
+
+    async def start(self) -> None:
+        """启动后台任务"""
+
+    async def close(self) -> None:
+        """停止后台任务"""
+
+
+class InProcessBroadcastBus(BroadcastBus):
+    """
+    进程内总线：peers 为共享列表，同一列表中的总线互为节点
+
+    不传 peers 时没有其他节点，发布为空操作（单进程部署的默认情况）。
+    """
+
+    def __init__(self, peers: Optional[List["InProcessBroadcastBus"]] = None):
+        super().__init__()
+        self.peers = peers if peers is not None else []
+        self.peers.append(self)
+
+    async def publish(self, room_id: str, entries: Sequence[Entry]) -> None:
+        for peer in self.peers:
+            if peer is not self and peer._handler is not None:
+                # 与跨进程一样，对方拿到的是副本
+                copied = json.loads(json.dumps([list(e) for e in entries], ensure_ascii=False))
+                await peer._handler(room_id, [tuple(e) for e in copied])
+
+
+def _encode_entry(entry: Entry) -> str:
+    message, kind, target = entry
+    raw = message if isinstance(message, str) else json.dumps(message, ensure_ascii=False)
+    return f"[{raw},{json.dumps(kind)},{json.dumps(target, ensure_ascii=False)}]"
+
+
+class RedisBroadcastBus(BroadcastBus):
+    """基于 Redis pub/sub 的总线，所有节点共用一个频道"""
+
+    def __init__(self, client, channel: str = "qv:room-events", max_batch: int = 256):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._pubsub = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBroadcastBus":
+        from redis import asyncio as redis_asyncio
+        return cls(redis_asyncio.Redis.from_url(url), **kwargs)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def publish(self, room_id: str, entries: Sequence[Entry]) -> None:
+        if not entries:
+            return
+        item = f'{{"r":{json.dumps(room_id)},"e":[{",".join(_encode_entry(e) for e in entries)}]}}'
+        self._queue.put_nowait(item)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._tasks = [
+            asyncio.create_task(self._publish_loop()),
+            asyncio.create_task(self._subscribe_loop()),
+        ]
+
+    async def close(self) -> None:
+        # 先把队列中剩余的事件发出去
+        while not self._queue.empty() and self._tasks:
+            await asyncio.sleep(0.01)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self.client.aclose()
+
+    async def _publish_loop(self):
+        while True:
+            items = [await self._queue.get()]
+            # 合并队列中已有的事件，一条 PUBLISH 发送
+            while len(items) < self.max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            payload = f'{{"o":{json.dumps(self.node_id)},"items":[{",".join(items)}]}}'
+            try:
+                await self.client.publish(self.channel, payload)
+            except Exception:
+                logger.exception("发布房间事件失败（%d 组）", len(items))
+
+    async def _subscribe_loop(self):
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                data = json.loads(message["data"])
+            except (TypeError, ValueError):
+                logger.warning("收到无法解析的房间事件")
+                continue
+            if data.get("o") == self.node_id or self._handler is None:
+                continue
+            for item in data.get("items", []):
+                try:
+                    await self._handler(item["r"], [tuple(e) for e in item["e"]])
+                except Exception:
+                    logger.exception("投递房间 %s 的事件失败", item.get("r"))
+
+
+def create_broadcast_bus(backend: str, redis_url: Optional[str] = None) -> BroadcastBus:
+    """根据配置创建总线：backend 为 "memory" 或 "redis" """
+    if backend == "redis":
+        if not redis_url:
+            raise ValueError("broadcast_bus=redis 需要配置 redis_url")
+        return RedisBroadcastBus.from_url(redis_url)
+    if backend != "memory":
+        raise ValueError(f"未知的广播总线类型: {backend}")
+    return InProcessBroadcastBus()
+
+
+broadcast_bus: BroadcastBus = create_broadcast_bus(settings.broadcast_bus, settings.redis_url)
@@ -0,0 +1,100 @@
+"""
+WebSocket 连接注册表
+
+按 websocket 标识、(房间, 玩家) 和房间三种方式建立索引，查找、添加、移除均为 O(1)。
+同一玩家可以有多个连接（多标签页、旁观），同一个 websocket 只会登记一次。
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from starlette.websockets import WebSocket
+
+
+class ConnectionInfo:
+    """连接信息，包含WebSocket、player_id和协商的传输协议"""
+    def __init__(self, websocket: WebSocket, player_id: str, protocol: Optional[str] = None):
+        self.websocket = websocket
+        self.player_id = player_id
+        self.protocol = protocol
+
+
+class ConnectionRegistry:
+    """
+    连接索引
+
+    Starlette 的 WebSocket 是 Mapping 子类，不可哈希，因此以 id(websocket) 作为键。
+    每个索引的值都是按加入顺序排列的字典（当作有序集合使用），保证广播顺序稳定。
+    """
+
+    def __init__(self):
+        # id(websocket) -> (room_id, ConnectionInfo)
+        self._by_socket: Dict[int, Tuple[str, ConnectionInfo]] = {}
+        # room_id -> {id(websocket): ConnectionInfo}
+        self._by_room: Dict[str, Dict[int, ConnectionInfo]] = {}
+        # (room_id, player_id) -> {id(websocket): ConnectionInfo}
+        self._by_player: Dict[Tuple[str, str], Dict[int, ConnectionInfo]] = {}
+
+    def add(self, room_id: str, conn: ConnectionInfo) -> bool:
+        """登记连接；同一个 websocket 已登记时返回 False"""
+        key = id(conn.websocket)
+        if key in self._by_socket:
+            return False
+        self._by_socket[key] = (room_id, conn)
+        self._by_room.setdefault(room_id, {})[key] = conn
+        self._by_player.setdefault((room_id, conn.player_id), {})[key] = conn
+        return True
+
+    def remove(self, websocket: WebSocket) -> Optional[ConnectionInfo]:
+        """移除连接并返回其信息；未登记时返回 None（可重复调用）"""
+        key = id(websocket)
+        entry = self._by_socket.pop(key, None)
+        if entry is None:
+            return None
+        room_id, conn = entry
+        room_conns = self._by_room.get(room_id)
+        if room_conns is not None:
+            room_conns.pop(key, None)
+            if not room_conns:
+                del self._by_room[room_id]
+        player_key = (room_id, conn.player_id)
+        player_conns = self._by_player.get(player_key)
+        if player_conns is not None:
+            player_conns.pop(key, None)
+            if not player_conns:
+                del self._by_player[player_key]
+        return conn
+
+    def get(self, websocket: WebSocket, room_id: Optional[str] = None) -> Optional[ConnectionInfo]:
+        """根据websocket获取连接信息；指定 room_id 时只在该房间内查找"""
+        entry = self._by_socket.get(id(websocket))
+        if entry is None or (room_id is not None and entry[0] != room_id):
+            return None
+        return entry[1]
+
+    def room_of(self, websocket: WebSocket) -> Optional[str]:
+        entry = self._by_socket.get(id(websocket))
+        return entry[0] if entry else None
+
+    def in_room(self, room_id: str) -> List[ConnectionInfo]:
+        """房间内所有连接（快照，遍历期间可以安全地移除连接）"""
+        return list(self._by_room.get(room_id, {}).values())
+
+    def of_player(self, room_id: str, player_id: str) -> List[ConnectionInfo]:
+        """某玩家在房间内的所有连接"""
+        return list(self._by_player.get((room_id, player_id), {}).values())
+
+    def has_player(self, room_id: str, player_id: str) -> bool:
+        return (room_id, player_id) in self._by_player
+
+    def room_size(self, room_id: str) -> int:
+        return len(self._by_room.get(room_id, ()))
+
+    def rooms(self) -> List[str]:
+        return list(self._by_room)
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._by_room
+
+    def __len__(self) -> int:
+        return len(self._by_socket)
+
+    def __iter__(self) -> Iterator[ConnectionInfo]:
+        return iter([conn for _, conn in self._by_socket.values()])
@@ -0,0 +1,143 @@
+"""
+WebSocket 消息分发器
+
+按消息类型注册处理协程，分发前用 pydantic 模型校验消息体，
+并按消息类型记录处理次数、错误次数和处理耗时分布。
+reject 返回拒绝原因时（例如停机排空期间），会修改游戏状态的消息不再交给处理函数。
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+from pydantic import BaseModel, ValidationError
+from starlette.websockets import WebSocket
+from app.core.loop_monitor import loop_monitor
+from app.core.profiler import profiler
+from app.core.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_MESSAGE_TYPE = "unknown"
+
+messages_total = counter(
+    "ws_messages_total", "按类型统计的WebSocket消息数", ["type"]
+)
+message_errors_total = counter(
+    "ws_message_errors_total", "按类型和原因统计的WebSocket消息处理失败数", ["type", "reason"]
+)
+handler_latency_seconds = histogram(
+    "ws_handler_latency_seconds", "WebSocket消息处理耗时（秒）", ["type"]
+)
+
+
+@dataclass
+class MessageContext:
+    """一条消息的处理上下文"""
+    websocket: WebSocket
+    room_id: str
+    player_id: Optional[str]
+    room: Any = None
+
+
+Handler = Callable[[MessageContext, Any], Awaitable[None]]
+ErrorReply = Callable[[MessageContext, str], Awaitable[None]]
+# 返回拒绝原因（发给客户端），None 表示正常处理
+RejectCheck = Callable[[], Optional[str]]
+
+
+@dataclass
+class _Registration:
+    handler: Handler
+    schema: Optional[Type[BaseModel]]
+    mutates: bool = True
+
+
+class MessageDispatcher:
+    """
+    表驱动的消息分发器
+
+    用法：
+        dispatcher = MessageDispatcher(send_error)
+
+        @dispatcher.handler("play_card", PlayCardMessage)
+        async def handle_play_card(ctx: MessageContext, msg: PlayCardMessage):
+            ...
+    """
+
+    def __init__(self, send_error: ErrorReply, reject: Optional[RejectCheck] = None):
+        self._handlers: Dict[str, _Registration] = {}
+        self._send_error = send_error
+        self._reject = reject
+
+    def handler(self, msg_type: str, schema: Optional[Type[BaseModel]] = None, mutates: bool = True):
+        """
+        注册消息处理协程；schema 为空时处理函数收到原始字典
+        mutates=False 表示不修改游戏状态（例如 ping），reject 生效时仍然处理
+        """
+        def decorator(func: Handler) -> Handler:
+            if msg_type in self._handlers:
+                raise ValueError(f"消息类型 {msg_type} 已注册")
+            self._handlers[msg_type] = _Registration(func, schema, mutates)
+            return func
+        return decorator
+
+    @property
+    def message_types(self):
+        return list(self._handlers)
+
+    async def dispatch(self, ctx: MessageContext, message: Dict[str, Any]) -> None:
+        """校验并分发一条消息，记录计数与耗时"""
+        msg_type = message.get("type")
+        registration = self._handlers.get(msg_type) if isinstance(msg_type, str) else None
+        if registration is None:
+            messages_total.labels(UNKNOWN_MESSAGE_TYPE).inc()
+            message_errors_total.labels(UNKNOWN_MESSAGE_TYPE, "unknown_type").inc()
+            await self._send_error(ctx, f"Unknown message type: {msg_type}")
+            return
+
+        messages_total.labels(msg_type).inc()
+        if registration.mutates and self._reject is not None:
+            reason = self._reject()
+            if reason is not None:
+                message_errors_total.labels(msg_type, "rejected").inc()
+                await self._send_error(ctx, reason)
+                return
+        payload: Any = message
+        if registration.schema is not None:
+            try:
+                payload = registration.schema.model_validate(message)
+            except ValidationError as e:
+                message_errors_total.labels(msg_type, "invalid").inc()
+                await self._send_error(ctx, f"消息格式错误: {e.errors()[0].get('msg', '')}")
+                return
+
+        start = time.perf_counter()
+        try:
+            with loop_monitor.track(msg_type, ctx.room_id), profiler.scope(ctx.room_id):
+                await registration.handler(ctx, payload)
+        except Exception:
+            message_errors_total.labels(msg_type, "exception").inc()
+            logger.exception("处理消息 %s 失败 (房间: %s)", msg_type, ctx.room_id)
+            await self._send_error(ctx, "服务器处理消息失败")
+        finally:
+            handler_latency_seconds.labels(msg_type).observe(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """按消息类型汇总：次数、错误数、平均/分位耗时（毫秒）"""
+        result: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, float] = {}
+        for (msg_type, _reason), child in message_errors_total.children().items():
+            errors[msg_type] = errors.get(msg_type, 0) + child.value
+        latencies = handler_latency_seconds.children()
+        for (msg_type,), child in messages_total.children().items():
+            entry: Dict[str, Any] = {"count": int(child.value), "errors": int(errors.get(msg_type, 0))}
+            hist = latencies.get((msg_type,))
+            if hist is not None and hist.count:
+                entry["total_ms"] = round(hist.sum * 1000, 3)
+                entry["mean_ms"] = round(hist.sum / hist.count * 1000, 3)
+                for q in (0.5, 0.95, 0.99):
+                    upper = hist.quantile(q)
+                    # 超出最大分桶时无法估算，返回None
+                    entry[f"p{int(q * 100)}_ms"] = round(upper * 1000, 3) if upper != float("inf") else None
+            result[msg_type] = entry
+        return result
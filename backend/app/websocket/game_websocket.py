@@ -2,25 +2,61 @@
 Game WebSocket handlers
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Dict, List, Optional
-import json
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Tuple, Union
+from contextlib import asynccontextmanager
 import uuid
 import asyncio
+import logging
+import time
 from app.game.game_state import GameState
 from app.game.card_sorter import CardSorter
-from app.api.game import rooms
+from app.game.card_codes import card_string_to_code, code_to_card
+from app.game.checkpoint import dump_checkpoint, load_checkpoint
+from app.core.loop_monitor import loop_monitor
+from app.core.profiler import profiler
+from app.core.metrics import gauge_callback, histogram
+from app.core.sharding import shard_map
+from app.api.game import rooms, get_room
 from app.models.game import Card, Rank, Suit, GameRoom, Player, PlayerPosition
-from app.services.stats_service import record_game_stats
+from app.services.stats_service import stats_writer
+from app.services.command_log import command_log, rebuild_game_state
+from app.services.room_store import room_store
+from app.services.drain import drain_state, SERVICE_RESTART_CLOSE_CODE, RECONNECT_DELAY_MS
+from app.websocket.broadcast_bus import BroadcastBus, InProcessBroadcastBus, broadcast_bus
+from app.websocket.connection_registry import ConnectionInfo, ConnectionRegistry
+from app.websocket.dispatcher import MessageDispatcher, MessageContext
+from app.websocket.protocol import (
+    negotiate_protocol, encode_message, decode_message, encode_event, assemble_batch
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+# 倒计时每个房间每秒都会经过，单独的日志便于按模块调整级别（默认不写出）
+countdown_logger = logging.getLogger(__name__ + ".countdown")
 
+broadcast_fanout_seconds = histogram("ws_broadcast_fanout_seconds", "一组房间事件编码并发送给本地所有连接的耗时")
+countdown_lag_seconds = histogram("countdown_lag_seconds", "倒计时每秒唤醒比预定时间晚的时长（事件循环繁忙程度）")
+auto_play_seconds = histogram("auto_play_seconds", "倒计时结束后自动出牌（含广播）的耗时")
 
-def parse_card_strings(card_strings: List[str]) -> List[Card]:
-    """将前端传来的字符串列表转换为Card对象列表"""
+
+def _checkpoint_room(room_id: str, gs: GameState):
+    """每局开始（洗牌之后）写入检查点，之前的命令日志随之丢弃"""
+    if command_log.enabled:
+        command_log.checkpoint(room_id, dump_checkpoint(gs))
+
+
+def parse_card_strings(card_strings: List[Union[str, int]]) -> List[Card]:
+    """将前端传来的字符串（或紧凑卡牌编码）列表转换为Card对象列表"""
     parsed_cards: List[Card] = []
     suit_map = {"♠": Suit.SPADES, "♥": Suit.HEARTS, "♣": Suit.CLUBS, "♦": Suit.DIAMONDS}
     for s in card_strings:
         try:
+            # 快速路径：查表（卡牌编码或标准卡牌字符串）
+            code = s if isinstance(s, int) else card_string_to_code(s)
+            if code is not None:
+                parsed_cards.append(code_to_card(code))
+                continue
             if "JOKER-A" in s or "JOKER/大王" in s:
                 parsed_cards.append(Card(rank=Rank.BIG_JOKER, is_joker=True))
             elif "JOKER-B" in s or "JOKER/小王" in s:
@@ -35,27 +71,53 @@ def parse_card_strings(card_strings: List[str]) -> List[Card]:
             continue
     return parsed_cards
 
-# Store active connections
-class ConnectionInfo:
-    """连接信息，包含WebSocket和player_id"""
-    def __init__(self, websocket: WebSocket, player_id: str):
-        self.websocket = websocket
-        self.player_id = player_id
+class RoomOutbox:
+    """
+    房间发件箱：一次游戏操作（一条客户端消息或一次自动出牌）期间产生的事件先暂存，
+    操作结束后按接收者合并为一帧发送，避免 card_played/trick_complete/score_updated/round_end
+    逐条广播时多次遍历房间连接。
+    
+    注意：消息在 flush 时才序列化，入队后不应再修改消息字典。
+    """
+    # 目标类型：room（广播，target为排除的player_id）、player（target为player_id）、socket（target为WebSocket）
+    TARGET_ROOM = "room"
+    TARGET_PLAYER = "player"
+    TARGET_SOCKET = "socket"
+    
+    def __init__(self):
+        self.depth = 0
+        self.entries: List[Tuple[Union[str, Dict[str, Any]], str, Any]] = []
+    
+    def add(self, message: Union[str, Dict[str, Any]], target_kind: str, target: Any = None):
+        self.entries.append((message, target_kind, target))
+    
+    @staticmethod
+    def is_recipient(conn: ConnectionInfo, target_kind: str, target: Any) -> bool:
+        if target_kind == RoomOutbox.TARGET_ROOM:
+            return not (target and conn.player_id == target)
+        if target_kind == RoomOutbox.TARGET_PLAYER:
+            return conn.player_id == target
+        return conn.websocket is target
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[ConnectionInfo]] = {}
+    def __init__(self, bus: Optional[BroadcastBus] = None):
+        # 活跃连接（按websocket、房间、玩家索引）
+        self.connections = ConnectionRegistry()
         # 存储每个房间的GameState实例
         self.game_states: Dict[str, GameState] = {}
         # 存储每个房间的倒计时任务
         self.countdown_tasks: Dict[str, asyncio.Task] = {}
+        # 存储每个房间的自动发牌任务
+        self.deal_tasks: Dict[str, asyncio.Task] = {}
+        # 正在进行中的操作的发件箱（按房间）
+        self.outboxes: Dict[str, RoomOutbox] = {}
+        # 广播总线：本地发送后发布给其他进程，其他进程的事件投递给本地连接
+        self.bus = bus if bus is not None else InProcessBroadcastBus()
+        self.bus.set_handler(self._deliver_remote)
     
     def get_connection_info(self, room_id: str, websocket: WebSocket) -> Optional[ConnectionInfo]:
         """根据websocket获取连接信息"""
-        for conn in self.active_connections.get(room_id, []):
-            if conn.websocket == websocket:
-                return conn
-        return None
+        return self.connections.get(websocket, room_id)
 
     def get_player_id_by_connection(self, room_id: str, websocket: WebSocket) -> Optional[str]:
         conn = self.get_connection_info(room_id, websocket)
@@ -70,8 +132,10 @@ class ConnectionManager:
             room_id: 房间ID
             player_id: 玩家ID（必须已在房间中）
         """
-        # 必须先 accept，否则无法 close
-        await websocket.accept()
+        # 必须先 accept，否则无法 close；同时回传协商的子协议
+        protocol = negotiate_protocol(websocket)
+        websocket.state.protocol = protocol
+        await websocket.accept(subprotocol=protocol)
         
         # 处理缺少 player_id 的兼容情况（仅允许 demo 房间）
         if not player_id:
@@ -104,24 +168,22 @@ class ConnectionManager:
                 )
                 room.players.append(player)
                 room.owner_id = player.id
+                rooms.refresh(room)
                 player_id = player.id
         else:
-            if room_id not in rooms:
+            room = await get_room(room_id)
+            if room is None:
                 await websocket.close(code=1008, reason="Room not found")
                 return
-            room = rooms[room_id]
             # 验证玩家是否在房间中
             player = next((p for p in room.players if p.id == player_id), None)
             if not player:
                 await websocket.close(code=1008, reason="Player not in room")
                 return
         
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = []
-        
-        # 存储连接信息（包含player_id）
-        conn_info = ConnectionInfo(websocket, player_id)
-        self.active_connections[room_id].append(conn_info)
+        # 存储连接信息（包含player_id）；同一玩家可以有多个连接
+        self.connections.add(room_id, ConnectionInfo(websocket, player_id, protocol))
+        websocket.state.room_id = room_id
         
         # 如果房间存在但GameState不存在，创建它
         if room_id in rooms and room_id not in self.game_states:
@@ -131,7 +193,14 @@ class ConnectionManager:
                 level_up_mode=room.level_up_mode,
                 ace_reset_enabled=room.ace_reset_enabled
             )
+            # 对局在本进程进行，之后不再从房间存储重新读取
+            rooms.claim(room_id)
         
+        async with self.batch(room_id):
+            await self._announce_connect(room_id, player_id)
+    
+    async def _announce_connect(self, room_id: str, player_id: str):
+        """连接成功后发送快照给当前玩家，并通知房间内所有玩家"""
         # 连接成功后发送快照给当前玩家
         await self.send_snapshot(room_id, player_id)
         
@@ -158,28 +227,16 @@ class ConnectionManager:
                         "ready_players": list(gs.players_ready_to_start) if hasattr(gs, "players_ready_to_start") else []
                     } if gs.game_phase == "waiting" else None
                 }
-                await self.broadcast_to_room(json.dumps(players_update), room_id)
+                await self.broadcast_to_room(players_update, room_id)
     
     async def disconnect(self, websocket: WebSocket, room_id: str):
         """断开连接"""
-        disconnected_player_id = None
-        if room_id in self.active_connections:
-            # 找到要断开的玩家ID
-            for conn in self.active_connections[room_id]:
-                if conn.websocket == websocket:
-                    disconnected_player_id = conn.player_id
-                    break
-            
-            # 移除连接
-            self.active_connections[room_id] = [
-                conn for conn in self.active_connections[room_id]
-                if conn.websocket != websocket
-            ]
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
+        conn = self.connections.remove(websocket)
+        disconnected_player_id = conn.player_id if conn else None
         
-        # 通知房间中其他玩家有玩家离开（发送更新后的玩家列表）
-        if room_id in rooms and disconnected_player_id:
+        # 玩家的最后一个连接断开时，通知房间中其他玩家（发送更新后的玩家列表）
+        if (room_id in rooms and disconnected_player_id
+                and not self.connections.has_player(room_id, disconnected_player_id)):
             room = rooms[room_id]
             gs = self.get_game_state(room_id)
             if gs:
@@ -201,17 +258,128 @@ class ConnectionManager:
                         "ready_players": list(gs.players_ready_to_start) if hasattr(gs, "players_ready_to_start") else []
                     } if gs.game_phase == "waiting" else None
                 }
-                await self.broadcast_to_room(json.dumps(players_update), room_id)
+                await self.broadcast_to_room(players_update, room_id)
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: Union[str, Dict[str, Any]], websocket: WebSocket):
         """发送个人消息"""
-        await websocket.send_text(message)
+        outbox = self.outboxes.get(getattr(websocket.state, "room_id", None))
+        if outbox is not None:
+            outbox.add(message, RoomOutbox.TARGET_SOCKET, websocket)
+            return
+        await self._send_raw(websocket, encode_message(message, getattr(websocket.state, "protocol", None)))
+    
+    @asynccontextmanager
+    async def batch(self, room_id: str):
+        """
+        开启房间的批量发送：范围内的广播/定向消息进入发件箱，退出最外层范围时统一发送
+        
+        用法：
+            async with manager.batch(room_id):
+                await manager.broadcast_to_room(...)
+                await manager.send_snapshot(room_id)
+        """
+        outbox = self.outboxes.get(room_id)
+        if outbox is None:
+            outbox = RoomOutbox()
+            self.outboxes[room_id] = outbox
+        outbox.depth += 1
+        try:
+            yield outbox
+        finally:
+            outbox.depth -= 1
+            if outbox.depth == 0:
+                if self.outboxes.get(room_id) is outbox:
+                    del self.outboxes[room_id]
+                await self._flush_outbox(room_id, outbox)
+    
+    async def _flush_outbox(self, room_id: str, outbox: RoomOutbox):
+        """把发件箱中的事件按接收者合并发送：每个连接只发送一帧，并发布给其他进程"""
+        entries = outbox.entries
+        if not entries:
+            return
+        await self._deliver_local(room_id, entries)
+        remote = [e for e in entries if e[1] != RoomOutbox.TARGET_SOCKET]
+        if remote:
+            await self.bus.publish(room_id, remote)
+    
+    async def _deliver_remote(self, room_id: str, entries: List[Tuple[Any, str, Any]]):
+        """投递其他进程发布的房间事件（只有本进程有该房间的连接时才需要处理）"""
+        if room_id in self.connections:
+            await self._deliver_local(room_id, entries)
+    
+    async def _deliver_local(self, room_id: str, entries: List[Tuple[Any, str, Any]]):
+        """把一组事件发送给本进程的连接：每个连接只发送一帧"""
+        start = time.perf_counter()
+        # 每个事件按协议只编码一次：单条时使用完整帧，多条时使用批量帧片段
+        frames: List[Dict[Optional[str], Union[str, bytes]]] = [{} for _ in entries]
+        parts: List[Dict[Optional[str], Union[str, bytes]]] = [{} for _ in entries]
+        for conn in self.connections.in_room(room_id):
+            indices = [
+                i for i, (_, kind, target) in enumerate(entries)
+                if RoomOutbox.is_recipient(conn, kind, target)
+            ]
+            if not indices:
+                continue
+            protocol = conn.protocol
+            if len(indices) == 1:
+                i = indices[0]
+                frame = frames[i].get(protocol)
+                if frame is None:
+                    frame = frames[i][protocol] = encode_message(entries[i][0], protocol)
+            else:
+                batch_parts = []
+                for i in indices:
+                    part = parts[i].get(protocol)
+                    if part is None:
+                        part = parts[i][protocol] = encode_event(entries[i][0], protocol)
+                    batch_parts.append(part)
+                frame = assemble_batch(batch_parts, protocol)
+            try:
+                await self._send_raw(conn.websocket, frame)
+            except Exception:
+                # 连接已断开，移除
+                self.connections.remove(conn.websocket)
+        broadcast_fanout_seconds.observe(time.perf_counter() - start)
+    
+    async def receive_message(self, websocket: WebSocket) -> Dict[str, Any]:
+        """接收一条客户端消息（支持JSON文本帧和紧凑二进制帧）"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("text")
+        if data is None:
+            data = message.get("bytes") or b""
+        return decode_message(data)
+    
+    @staticmethod
+    async def _send_raw(websocket: WebSocket, frame: Union[str, bytes]):
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+    
+    async def _send(self, conn: ConnectionInfo, message: Union[str, Dict[str, Any]],
+                    frames: Optional[Dict[Optional[str], Union[str, bytes]]] = None):
+        """
+        按连接协商的协议发送消息
+        
+        Args:
+            frames: 同一条消息按协议缓存的编码结果（广播时每种协议只编码一次）
+        """
+        if frames is None:
+            frame = encode_message(message, conn.protocol)
+        else:
+            frame = frames.get(conn.protocol)
+            if frame is None:
+                frame = encode_message(message, conn.protocol)
+                frames[conn.protocol] = frame
+        await self._send_raw(conn.websocket, frame)
     
     async def start_countdown(self, room_id: str):
         """
         开始房间的倒计时（如果 max_play_time 为 0，则不启动倒计时）
         """
-        print(f"[倒计时] 开始倒计时 - 房间: {room_id}")
+        countdown_logger.debug("开始倒计时", extra={"room_id": room_id})
         # 停止现有的倒计时任务
         await self.stop_countdown(room_id)
         
@@ -220,18 +388,17 @@ class ConnectionManager:
             game_state = self.game_states[room_id]
             # 如果 max_play_time 为 0，则不启动倒计时
             if game_state.max_play_time == 0:
-                print(f"[倒计时] 房间 {room_id} 设置为不限制时长，不启动倒计时")
+                countdown_logger.debug("不限制时长，不启动倒计时", extra={"room_id": room_id})
                 game_state.start_countdown()  # 调用后会设置 countdown_active = False
                 return
             game_state.start_countdown()  # 调用GameState的start_countdown方法激活倒计时
-            print(f"[倒计时] 房间 {room_id} 的倒计时已激活 - 当前时间: {game_state.current_countdown}秒")
+            countdown_logger.debug("倒计时已激活 %s秒", game_state.current_countdown, extra={"room_id": room_id})
         else:
             return
         
         # 创建新的倒计时任务
         task = asyncio.create_task(self._countdown_loop(room_id))
         self.countdown_tasks[room_id] = task
-        print(f"[倒计时] 为房间 {room_id} 创建新的倒计时任务")
     
     async def stop_countdown(self, room_id: str):
         """
@@ -243,64 +410,85 @@ class ConnectionManager:
             try:
                 await task
             except asyncio.CancelledError:
-                print(f"[倒计时] 房间 {room_id} 的倒计时任务已取消")
+                pass
             del self.countdown_tasks[room_id]
-            print(f"[倒计时] 成功停止房间 {room_id} 的倒计时任务")
-        else:
-            print(f"[倒计时] 房间 {room_id} 没有正在运行的倒计时任务")
+            countdown_logger.debug("停止倒计时", extra={"room_id": room_id})
+    
+    async def pause_countdowns(self) -> int:
+        """
+        暂停所有房间的倒计时（保留剩余时间，见 resume_countdown）
+        
+        Returns:
+            暂停的房间数
+        """
+        room_ids = list(self.countdown_tasks)
+        for room_id in room_ids:
+            await self.stop_countdown(room_id)
+        return len(room_ids)
+    
+    def resume_countdown(self, room_id: str):
+        """从剩余时间继续倒计时（不重置为 max_play_time）"""
+        game_state = self.game_states.get(room_id)
+        if (game_state is None or not game_state.countdown_active
+                or game_state.max_play_time == 0 or room_id in self.countdown_tasks):
+            return
+        self.countdown_tasks[room_id] = asyncio.create_task(self._countdown_loop(room_id))
     
     async def _countdown_loop(self, room_id: str):
         """
         倒计时循环任务
         """
         try:
-            print(f"[倒计时] 启动倒计时循环 - 房间: {room_id}")
+            countdown_logger.debug("启动倒计时循环", extra={"room_id": room_id})
+            loop = asyncio.get_running_loop()
             while True:
+                due = loop.time() + 1
                 await asyncio.sleep(1)
+                countdown_lag_seconds.observe(max(0.0, loop.time() - due))
                 
                 # 获取游戏状态
                 if room_id not in self.game_states:
-                    print(f"[倒计时] 房间 {room_id} 不存在，退出倒计时循环")
+                    countdown_logger.debug("房间不存在，退出倒计时循环", extra={"room_id": room_id})
                     break
                 
                 game_state = self.game_states[room_id]
                 
                 # 如果 max_play_time 为 0，则不限制时长，退出倒计时循环
                 if game_state.max_play_time == 0:
-                    print(f"[倒计时] 房间 {room_id} 设置为不限制时长，退出倒计时循环")
+                    countdown_logger.debug("不限制时长，退出倒计时循环", extra={"room_id": room_id})
                     break
                 
                 # 只在游戏阶段（playing）和有当前玩家时进行倒计时
                 if game_state.game_phase != "playing" or not game_state.current_player:
-                    print(f"[倒计时] 房间 {room_id} 不满足倒计时条件 - 阶段: {game_state.game_phase}, 当前玩家: {game_state.current_player}")
+                    countdown_logger.debug("不满足倒计时条件 - 阶段: %s, 当前玩家: %s",
+                                           game_state.game_phase, game_state.current_player,
+                                           extra={"room_id": room_id, "sampled": True})
                     continue
                 
-                # 获取当前玩家信息
-                current_player = game_state.get_player_by_position(game_state.current_player)
-                player_info = f"ID: {current_player.id}, 名称: {current_player.name}, 位置: {game_state.current_player.value}" if current_player else "未知玩家"
-                
-                # 记录倒计时前的状态
-                print(f"[倒计时] 房间 {room_id} - 当前玩家: {player_info}, 倒计时前: {game_state.current_countdown}秒, 激活状态: {game_state.countdown_active}")
-                
                 # 减少倒计时
                 time_up = game_state.decrease_countdown()
-                
-                # 记录倒计时后的状态
-                print(f"[倒计时] 房间 {room_id} - 当前玩家: {player_info}, 倒计时后: {game_state.current_countdown}秒, 时间到: {time_up}")
+                countdown_logger.debug("倒计时 %s秒 - 当前玩家: %s, 时间到: %s",
+                                       game_state.current_countdown, game_state.current_player.value, time_up,
+                                       extra={"room_id": room_id, "sampled": True})
                 
                 # 发送倒计时更新
-                print(f"[倒计时] 房间 {room_id} - 广播倒计时更新: {game_state.current_countdown}秒")
                 await self._broadcast_countdown_update(room_id, game_state.current_countdown)
                 
                 # 如果时间到，触发自动出牌
                 if time_up:
-                    print(f"[倒计时] 房间 {room_id} - 倒计时结束，执行自动出牌")
-                    await self._auto_play(room_id)
+                    countdown_logger.debug("倒计时结束，执行自动出牌 - 当前玩家: %s",
+                                           game_state.current_player.value, extra={"room_id": room_id})
+                    start = time.perf_counter()
+                    try:
+                        with loop_monitor.track("auto_play", room_id), profiler.scope(room_id):
+                            await self._auto_play(room_id)
+                    finally:
+                        auto_play_seconds.observe(time.perf_counter() - start)
                     break
         except asyncio.CancelledError:
             pass
-        except Exception as e:
-            print(f"倒计时循环错误 ({room_id}): {e}")
+        except Exception:
+            countdown_logger.exception("倒计时循环错误", extra={"room_id": room_id})
     
     async def _broadcast_countdown_update(self, room_id: str, remaining_time: int):
         """
@@ -318,141 +506,168 @@ class ConnectionManager:
             "remaining_time": remaining_time,
             "countdown_active": countdown_active
         }
-        print(f"[倒计时] 准备广播倒计时更新 - 房间: {room_id}, 剩余时间: {remaining_time}秒, 激活状态: {countdown_active}, 消息内容: {message}")
-        
         # 使用现有的broadcast_to_room方法发送消息
-        await self.broadcast_to_room(json.dumps(message), room_id)
-        print(f"[倒计时] 成功广播倒计时更新 - 房间: {room_id}, 剩余时间: {remaining_time}秒")
+        await self.broadcast_to_room(message, room_id)
     
     async def _auto_play(self, room_id: str):
         """
         当倒计时结束时自动出牌
         """
-        if room_id not in self.game_states:
-            return
+        async with self.batch(room_id):
+            if room_id not in self.game_states:
+                return
         
-        game_state = self.game_states[room_id]
+            game_state = self.game_states[room_id]
         
-        # 调用GameState的auto_play方法
-        result = game_state.auto_play()
+            # 调用GameState的auto_play方法
+            auto_player = game_state.get_player_by_position(game_state.current_player)
+            result = game_state.auto_play()
         
-        # 如果自动出牌成功，处理出牌结果
-        if result.get("success", False):
-            # 获取当前玩家
-            player = game_state.get_player_by_id(game_state.current_player_id)
-            if not player:
-                return
+            # 如果自动出牌成功，处理出牌结果
+            if result.get("success", False):
+                # 自动出牌的选牌是随机的，日志中记录实际打出的牌
+                if auto_player:
+                    command_log.append(room_id, "play_card", auto_player.id, result.get("played_cards"))
+                # 获取当前玩家
+                player = game_state.get_player_by_id(game_state.current_player_id)
+                if not player:
+                    return
             
-            # 检查是否完成一轮（必须在play_card之后检查，因为play_card会更新状态）
-            # 注意：play_card中如果一轮完成，会保存last_trick但不清空current_trick_with_player（延迟清空）
-            # 所以这里检查：如果current_trick_with_player长度为4，说明刚完成一轮
-            trick_was_complete = len(game_state.current_trick_with_player) == 4
+                # 检查是否完成一轮（必须在play_card之后检查，因为play_card会更新状态）
+                # 注意：play_card中如果一轮完成，会保存last_trick但不清空current_trick_with_player（延迟清空）
+                # 所以这里检查：如果current_trick_with_player长度为4，说明刚完成一轮
+                trick_was_complete = len(game_state.current_trick_with_player) == 4
             
-            # 构建卡牌字符串列表（用于前端显示）
-            # play_card已经更新了current_trick_with_player，其中的cards已经按手牌顺序排序
-            # 直接从最后一条记录获取即可
-            cards_str = []
-            if hasattr(game_state, "current_trick_with_player") and game_state.current_trick_with_player:
-                last_entry = game_state.current_trick_with_player[-1]
-                cards_str = last_entry.get("cards", [])
+                # 构建卡牌字符串列表（用于前端显示）
+                # play_card已经更新了current_trick_with_player，其中的cards已经按手牌顺序排序
+                # 直接从最后一条记录获取即可
+                cards_str = []
+                if hasattr(game_state, "current_trick_with_player") and game_state.current_trick_with_player:
+                    last_entry = game_state.current_trick_with_player[-1]
+                    cards_str = last_entry.get("cards", [])
             
-            # 获取当前轮次最大玩家名称
-            current_trick_max_player_name = None
-            if hasattr(game_state, "current_trick_max_player_id") and game_state.current_trick_max_player_id:
-                max_player = game_state.get_player_by_id(game_state.current_trick_max_player_id)
-                if max_player:
-                    current_trick_max_player_name = max_player.name
+                # 获取当前轮次最大玩家名称
+                current_trick_max_player_name = None
+                if hasattr(game_state, "current_trick_max_player_id") and game_state.current_trick_max_player_id:
+                    max_player = game_state.get_player_by_id(game_state.current_trick_max_player_id)
+                    if max_player:
+                        current_trick_max_player_name = max_player.name
             
-            # 构建出牌事件（包含play_type用于前端显示提示）
-            play_event = {
-                "type": "card_played",
-                "player_id": game_state.current_player_id,
-                "player_position": player.position.value,
-                "cards": cards_str,
-                "current_trick": game_state.current_trick_with_player if hasattr(game_state, "current_trick_with_player") else [],
-                "trick_complete": trick_was_complete,
-                "current_player": game_state.current_player.value if game_state.current_player else None,
-                "current_trick_max_player": current_trick_max_player_name,
-                "play_type": result.get("play_type")  # 添加play_type字段
-            }
+                # 构建出牌事件（包含play_type用于前端显示提示）
+                play_event = {
+                    "type": "card_played",
+                    "player_id": game_state.current_player_id,
+                    "player_position": player.position.value,
+                    "cards": cards_str,
+                    "current_trick": game_state.current_trick_with_player if hasattr(game_state, "current_trick_with_player") else [],
+                    "trick_complete": trick_was_complete,
+                    "current_player": game_state.current_player.value if game_state.current_player else None,
+                    "current_trick_max_player": current_trick_max_player_name,
+                    "play_type": result.get("play_type")  # 添加play_type字段
+                }
             
-            # 广播出牌事件给所有玩家
-            await self.broadcast_to_room(json.dumps(play_event), room_id)
+                # 广播出牌事件给所有玩家
+                await self.broadcast_to_room(play_event, room_id)
             
-            # 如果一轮结束，发送获胜者信息和上一轮出牌
-            if trick_was_complete and hasattr(game_state, "last_trick"):
-                # 使用last_trick作为current_trick，因为last_trick是上一轮完成时的数据
-                trick_complete_event = {
-                    "type": "trick_complete",
-                    "last_trick": game_state.last_trick,
-                    "current_trick": game_state.last_trick.copy(),  # 使用last_trick作为current_trick（用于延迟显示）
-                    "tricks_won": game_state.tricks_won,
-                    "idle_score": game_state.idle_score,  # 添加分数信息
-                    "current_player": game_state.current_player.value if game_state.current_player else None
-                }
-                await self.broadcast_to_room(json.dumps(trick_complete_event), room_id)
+                # 如果一轮结束，发送获胜者信息和上一轮出牌
+                if trick_was_complete and hasattr(game_state, "last_trick"):
+                    # 使用last_trick作为current_trick，因为last_trick是上一轮完成时的数据
+                    trick_complete_event = {
+                        "type": "trick_complete",
+                        "last_trick": game_state.last_trick,
+                        "current_trick": game_state.last_trick.copy(),  # 使用last_trick作为current_trick（用于延迟显示）
+                        "tricks_won": game_state.tricks_won,
+                        "idle_score": game_state.idle_score,  # 添加分数信息
+                        "current_player": game_state.current_player.value if game_state.current_player else None
+                    }
+                    await self.broadcast_to_room(trick_complete_event, room_id)
                 
-                # 发送分数更新事件
-                score_event = {
-                    "type": "score_updated",
-                    "idle_score": game_state.idle_score
-                }
-                await self.broadcast_to_room(json.dumps(score_event), room_id)
+                    # 发送分数更新事件
+                    score_event = {
+                        "type": "score_updated",
+                        "idle_score": game_state.idle_score
+                    }
+                    await self.broadcast_to_room(score_event, room_id)
                 
-                # 发送完事件后，清空current_trick_with_player（为下一轮准备）
-                game_state.current_trick_with_player = []
+                    # 发送完事件后，清空current_trick_with_player（为下一轮准备）
+                    game_state.current_trick_with_player = []
             
-            # 发送状态快照
-            await self.send_snapshot(room_id)
+                # 发送状态快照
+                await self.send_snapshot(room_id)
             
-            # 检查游戏是否结束
-            if game_state.game_phase == "scoring" and game_state.round_summary:
-                # 记录战绩（仅记录一次）
-                if not game_state.stats_recorded:
-                    asyncio.create_task(record_game_stats(game_state.round_summary, game_state.room.players))
-                    game_state.stats_recorded = True
+                # 检查游戏是否结束
+                if game_state.game_phase == "scoring" and game_state.round_summary:
+                    # 记录战绩（仅记录一次）
+                    if not game_state.stats_recorded:
+                        stats_writer.submit(game_state.round_summary, game_state.room.players, room_id)
+                        game_state.stats_recorded = True
                 
-                round_end_event = {
-                    "type": "round_end",
-                    "round_summary": game_state.round_summary,
-                    "ready_count": len(game_state.players_ready_for_next_round),
-                    "total_players": len(game_state.room.players),
-                    "ready_players": list(game_state.players_ready_for_next_round)
-                }
-                await self.broadcast_to_room(json.dumps(round_end_event), room_id)
-            else:
-                # 重置倒计时，为下一个玩家开始倒计时
-                await self.start_countdown(room_id)
+                    round_end_event = {
+                        "type": "round_end",
+                        "round_summary": game_state.round_summary,
+                        "ready_count": len(game_state.players_ready_for_next_round),
+                        "total_players": len(game_state.room.players),
+                        "ready_players": list(game_state.players_ready_for_next_round)
+                    }
+                    await self.broadcast_to_room(round_end_event, room_id)
+                else:
+                    # 重置倒计时，为下一个玩家开始倒计时
+                    await self.start_countdown(room_id)
     
-    async def send_to_player(self, message: str, room_id: str, player_id: str):
+    async def send_to_player(self, message: Union[str, Dict[str, Any]], room_id: str, player_id: str):
         """发送消息给特定玩家"""
-        if room_id in self.active_connections:
-            for conn in self.active_connections[room_id]:
-                if conn.player_id == player_id:
-                    try:
-                        await conn.websocket.send_text(message)
-                    except:
-                        # 连接已断开，移除
-                        self.active_connections[room_id].remove(conn)
-                    break
+        outbox = self.outboxes.get(room_id)
+        if outbox is not None:
+            outbox.add(message, RoomOutbox.TARGET_PLAYER, player_id)
+            return
+        await self.bus.publish(room_id, [(message, RoomOutbox.TARGET_PLAYER, player_id)])
+        frames: Dict[Optional[str], Union[str, bytes]] = {}
+        for conn in self.connections.of_player(room_id, player_id):
+            try:
+                await self._send(conn, message, frames)
+            except:
+                # 连接已断开，移除
+                self.connections.remove(conn.websocket)
     
-    async def broadcast_to_room(self, message: str, room_id: str, exclude_player_id: Optional[str] = None):
+    async def broadcast_to_room(self, message: Union[str, Dict[str, Any]], room_id: str, exclude_player_id: Optional[str] = None):
         """广播消息到房间所有玩家（可排除特定玩家）"""
-        if room_id in self.active_connections:
-            for conn in self.active_connections[room_id]:
-                if exclude_player_id and conn.player_id == exclude_player_id:
-                    continue
-                try:
-                    await conn.websocket.send_text(message)
-                except:
-                    # Remove broken connections
-                    if room_id in self.active_connections:
-                        self.active_connections[room_id].remove(conn)
+        outbox = self.outboxes.get(room_id)
+        if outbox is not None:
+            outbox.add(message, RoomOutbox.TARGET_ROOM, exclude_player_id)
+            return
+        await self.bus.publish(room_id, [(message, RoomOutbox.TARGET_ROOM, exclude_player_id)])
+        frames: Dict[Optional[str], Union[str, bytes]] = {}
+        for conn in self.connections.in_room(room_id):
+            if exclude_player_id and conn.player_id == exclude_player_id:
+                continue
+            try:
+                await self._send(conn, message, frames)
+            except:
+                # Remove broken connections
+                self.connections.remove(conn.websocket)
     
     def get_game_state(self, room_id: str) -> Optional[GameState]:
         """获取房间的GameState实例"""
         return self.game_states.get(room_id)
     
+    async def release_room(self, room_id: str) -> Optional[GameState]:
+        """
+        释放房间占用的资源：取消倒计时和自动发牌任务，移除GameState和发件箱
+        
+        Returns:
+            被移除的GameState（没有时为None）
+        """
+        for tasks in (self.countdown_tasks, self.deal_tasks):
+            task = tasks.pop(room_id, None)
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.outboxes.pop(room_id, None)
+        return self.game_states.pop(room_id, None)
+    
     async def send_snapshot(self, room_id: str, player_id: Optional[str] = None):
         """
         发送状态快照
@@ -464,6 +679,8 @@ class ConnectionManager:
         gs = self.get_game_state(room_id)
         if not gs:
             return
+        # 每次状态变化都会发送快照，顺带更新房间状态索引和大厅摘要中的阶段
+        rooms.refresh(gs.room, gs.game_phase)
         
         # 获取该玩家的手牌（如果提供了player_id）
         my_hand = []
@@ -576,113 +793,736 @@ class ConnectionManager:
         
         if player_id:
             # 只发送给特定玩家
-            await self.send_to_player(json.dumps(snapshot), room_id, player_id)
+            await self.send_to_player(snapshot, room_id, player_id)
         else:
-            # 广播给所有人（但每个玩家收到的手牌不同）
-            # 需要为每个玩家单独发送
-            if room_id in self.active_connections:
-                for conn in self.active_connections[room_id]:
-                    # 为每个玩家生成个性化的快照
-                    player = gs.get_player_by_id(conn.player_id)
-                    if player:
-                        sorter = CardSorter(
-                            current_level=gs.card_system.current_level,
-                            trump_suit=gs.trump_suit
-                        )
-                        sorted_cards = sorter.sort_cards(player.cards)
-                        personal_hand = [str(card) for card in sorted_cards]
-                        personal_snapshot = snapshot.copy()
-                        personal_snapshot["players_cards_count"] = {
-                            pos.position.value: len(pos.cards) for pos in gs.room.players
-                        }
-                        personal_snapshot["my_hand"] = personal_hand
-                        if dealer and conn.player_id == dealer.id:
-                            if gs.bottom_cards:
-                                personal_snapshot["bottom_cards"] = [str(card) for card in gs.bottom_cards]
-                            # 添加新加入的底牌信息（仅在庄家获得底牌后且尚未扣底时）
-                            if gs.dealer_has_bottom and gs.bottom_pending:
-                                if hasattr(gs, 'original_bottom_cards') and gs.original_bottom_cards:
-                                    personal_snapshot["newly_added_bottom_cards"] = [str(card) for card in gs.original_bottom_cards]
-                        else:
-                            personal_snapshot.pop("bottom_cards", None)
-                        try:
-                            await conn.websocket.send_text(json.dumps(personal_snapshot))
-                        except:
-                            self.active_connections[room_id].remove(conn)
+            # 广播给所有人（但每个玩家收到的手牌不同）：为房间内每个玩家生成个性化快照并按玩家定向发送，
+            # 同一玩家的多个连接共用一份；经广播总线发布后，其他进程上该玩家的连接也能收到
+            sorter = CardSorter(
+                current_level=gs.card_system.current_level,
+                trump_suit=gs.trump_suit
+            )
+            async with self.batch(room_id):
+                for player in gs.room.players:
+                    personal_snapshot = snapshot.copy()
+                    personal_snapshot["my_hand"] = [str(card) for card in sorter.sort_cards(player.cards)]
+                    if dealer and player.id == dealer.id:
+                        if gs.bottom_cards:
+                            personal_snapshot["bottom_cards"] = [str(card) for card in gs.bottom_cards]
+                        # 添加新加入的底牌信息（仅在庄家获得底牌后且尚未扣底时）
+                        if gs.dealer_has_bottom and gs.bottom_pending:
+                            if hasattr(gs, 'original_bottom_cards') and gs.original_bottom_cards:
+                                personal_snapshot["newly_added_bottom_cards"] = [str(card) for card in gs.original_bottom_cards]
+                    else:
+                        personal_snapshot.pop("bottom_cards", None)
+                    await self.send_to_player(personal_snapshot, room_id, player.id)
     
     async def handle_deal_tick(self, room_id: str):
         """处理发牌tick"""
-        gs = self.get_game_state(room_id)
-        if not gs:
-            error_msg = {
-                "type": "error",
-                "message": "GameState not found for room"
-            }
-            await self.broadcast_to_room(json.dumps(error_msg), room_id)
-            return
+        async with self.batch(room_id):
+            gs = self.get_game_state(room_id)
+            if not gs:
+                error_msg = {
+                    "type": "error",
+                    "message": "GameState not found for room"
+                }
+                await self.broadcast_to_room(error_msg, room_id)
+                return
         
-        result = gs.deal_tick()
-        if result.get("success"):
-            # 获取该玩家的手牌（已经在deal_tick中使用insert_sorted排序好了）
-            player_pos = result.get("player")
-            player = None
-            for p in gs.room.players:
-                if p.position.value == player_pos:
-                    player = p
-                    break
+            result = gs.deal_tick()
+            if result.get("success"):
+                command_log.append(room_id, "deal_tick")
+                # 获取该玩家的手牌（已经在deal_tick中使用insert_sorted排序好了）
+                player_pos = result.get("player")
+                player = None
+                for p in gs.room.players:
+                    if p.position.value == player_pos:
+                        player = p
+                        break
             
-            # 直接使用player.cards（已经通过insert_sorted保持排序）
-            sorted_cards = []
-            if player:
-                # player.cards已经通过insert_sorted保持排序，直接转换为字符串列表
-                sorted_cards = [str(card) for card in player.cards]
+                # 直接使用player.cards（已经通过insert_sorted保持排序）
+                sorted_cards = []
+                if player:
+                    # player.cards已经通过insert_sorted保持排序，直接转换为字符串列表
+                    sorted_cards = [str(card) for card in player.cards]
             
-            # 发送deal_tick事件，只发送给收到牌的玩家（包含排序后的完整手牌）
-            # 其他玩家只收到基本信息（不包含手牌）
-            if player:
-                # 发送给收到牌的玩家（包含完整手牌）
-                event_with_hand = {
+                # 发送deal_tick事件，只发送给收到牌的玩家（包含排序后的完整手牌）
+                # 其他玩家只收到基本信息（不包含手牌）
+                if player:
+                    # 发送给收到牌的玩家（包含完整手牌）
+                    event_with_hand = {
+                        "type": "deal_tick",
+                        "player": result.get("player"),
+                        "card": result.get("card"),
+                        "dealt_count": result.get("dealt_count"),
+                        "sorted_hand": sorted_cards,  # 该玩家的排序后完整手牌
+                        "players_cards_count": result.get("players_cards_count"),
+                    }
+                    await self.send_to_player(event_with_hand, room_id, player.id)
+            
+                # 发送给其他玩家（不包含手牌）
+                event_public = {
                     "type": "deal_tick",
                     "player": result.get("player"),
-                    "card": result.get("card"),
+                    "card": None,  # 不显示具体牌
                     "dealt_count": result.get("dealt_count"),
-                    "sorted_hand": sorted_cards,  # 该玩家的排序后完整手牌
+                    "sorted_hand": None,  # 不显示手牌
                     "players_cards_count": result.get("players_cards_count"),
                 }
-                await self.send_to_player(json.dumps(event_with_hand), room_id, player.id)
+                if player:
+                    await self.broadcast_to_room(event_public, room_id, exclude_player_id=player.id)
+                else:
+                    await self.broadcast_to_room(event_public, room_id)
             
-            # 发送给其他玩家（不包含手牌）
-            event_public = {
-                "type": "deal_tick",
-                "player": result.get("player"),
-                "card": None,  # 不显示具体牌
-                "dealt_count": result.get("dealt_count"),
-                "sorted_hand": None,  # 不显示手牌
-                "players_cards_count": result.get("players_cards_count"),
-            }
-            if player:
-                await self.broadcast_to_room(json.dumps(event_public), room_id, exclude_player_id=player.id)
+                # 如果发牌完成，发送阶段变化和快照
+                if result.get("done"):
+                    phase_event = {
+                        "type": "phase_changed",
+                        "phase": "bidding"
+                    }
+                    await self.broadcast_to_room(phase_event, room_id)
+                    # 为每个玩家发送个性化的快照
+                    await self.send_snapshot(room_id)
             else:
-                await self.broadcast_to_room(json.dumps(event_public), room_id)
-            
-            # 如果发牌完成，发送阶段变化和快照
-            if result.get("done"):
+                # 发送错误消息
+                error_msg = {
+                    "type": "error",
+                    "message": result.get("message", "Deal tick failed")
+                }
+                await self.broadcast_to_room(error_msg, room_id)
+
+manager = ConnectionManager(broadcast_bus)
+
+
+def _rooms_by_phase() -> Dict[str, int]:
+    """按游戏阶段统计本进程的房间（还没有 GameState 的房间计为 waiting）"""
+    counts: Dict[str, int] = {}
+    for room_id in rooms:
+        gs = manager.game_states.get(room_id)
+        phase = gs.game_phase if gs is not None else "waiting"
+        counts[phase] = counts.get(phase, 0) + 1
+    return counts
+
+
+gauge_callback("rooms_by_phase", "按游戏阶段统计的房间数", _rooms_by_phase, ["phase"])
+gauge_callback("ws_connections", "游戏房间的WebSocket连接数", lambda: len(manager.connections))
+gauge_callback("ws_countdown_tasks", "运行中的倒计时任务数", lambda: len(manager.countdown_tasks))
+gauge_callback("broadcast_bus_queue_depth", "等待发布到其他节点的房间事件数",
+               lambda: getattr(manager.bus, "queue_depth", 0))
+
+
+# ---------- 消息体校验模型 ----------
+
+CardToken = Union[str, int]  # 卡牌字符串或紧凑卡牌编码
+
+
+class CardsMessage(BaseModel):
+    """携带卡牌列表的消息（亮主、扣底）"""
+    cards: Optional[List[CardToken]] = None
+
+
+class SelectCardsMessage(BaseModel):
+    """选择卡牌（支持单张或列表）"""
+    cards: Optional[Union[List[CardToken], CardToken]] = None
+
+
+class PlayCardMessage(BaseModel):
+    """出牌（兼容 cards 列表和单张 card 字段）"""
+    cards: Optional[Union[List[CardToken], CardToken]] = None
+    card: Optional[Union[List[CardToken], CardToken]] = None
+
+
+async def _send_error(ctx: MessageContext, message: str):
+    await manager.send_personal_message({"type": "error", "message": message}, ctx.websocket)
+
+
+def _reject_while_draining() -> Optional[str]:
+    """排空开始后不再修改游戏状态：已暂停的倒计时/发牌不会被重新启动，检查点之后的状态也不会再变化"""
+    return "服务器正在重启，请稍后重试" if drain_state.draining else None
+
+
+dispatcher = MessageDispatcher(_send_error, reject=_reject_while_draining)
+
+
+async def _auto_deal_task(room_id: str, announce_bidding: bool = False):
+    """自动发牌：每0.1秒发一张牌，直到发完"""
+    gs = manager.get_game_state(room_id)
+    if gs:
+        while gs.dealt_count < 100 and gs.game_phase == "dealing":
+            await manager.handle_deal_tick(room_id)
+            await asyncio.sleep(0.1)  # 每0.1秒发一张牌
+        
+        # 发牌完成后，发送snapshot和phase_changed事件
+        if announce_bidding and gs.game_phase == "bidding":
+            async with manager.batch(room_id):
+                await manager.send_snapshot(room_id)
                 phase_event = {
                     "type": "phase_changed",
                     "phase": "bidding"
                 }
-                await self.broadcast_to_room(json.dumps(phase_event), room_id)
-                # 为每个玩家发送个性化的快照
-                await self.send_snapshot(room_id)
+                await manager.broadcast_to_room(phase_event, room_id)
+
+
+def _start_auto_deal(room_id: str, announce_bidding: bool = False):
+    """在后台自动发牌（停机排空时会被取消）"""
+    task = asyncio.create_task(_auto_deal_task(room_id, announce_bidding))
+    manager.deal_tasks[room_id] = task
+    task.add_done_callback(
+        lambda t: manager.deal_tasks.pop(room_id, None) if manager.deal_tasks.get(room_id) is t else None
+    )
+
+
+async def _resume_room(room_id: str, gs: GameState):
+    """恢复的房间放回内存，并继续发牌或倒计时"""
+    rooms[room_id] = gs.room
+    rooms.refresh(gs.room, gs.game_phase)
+    manager.game_states[room_id] = gs
+    if gs.game_phase == "dealing":
+        _start_auto_deal(room_id, announce_bidding=True)
+    elif gs.game_phase == "playing":
+        if gs.countdown_active:
+            manager.resume_countdown(room_id)
         else:
-            # 发送错误消息
-            error_msg = {
-                "type": "error",
-                "message": result.get("message", "Deal tick failed")
+            await manager.start_countdown(room_id)
+
+
+async def recover_rooms() -> int:
+    """
+    进程启动时恢复进行中的房间
+    
+    - 命令日志：检查点 + 重放之后的命令（崩溃恢复）
+    - 房间存储中的检查点：上一个进程排空时写入（交接），恢复后清除
+    
+    Returns:
+        恢复的房间数
+    """
+    recovered = 0
+    for room_id in command_log.room_ids():
+        if room_id in manager.game_states or not shard_map.is_local(room_id):
+            continue
+        try:
+            gs = rebuild_game_state(command_log.read(room_id))
+        except Exception:
+            logger.exception("由命令日志恢复房间 %s 失败", room_id)
+            continue
+        if gs is not None:
+            await _resume_room(room_id, gs)
+            recovered += 1
+
+    for room_id in await room_store.room_ids():
+        if room_id in manager.game_states or not shard_map.is_local(room_id):
+            continue
+        data = await room_store.load_checkpoint(room_id)
+        if not data:
+            continue
+        try:
+            gs = load_checkpoint(data)
+        except Exception:
+            logger.exception("由检查点恢复房间 %s 失败", room_id)
+            continue
+        await _resume_room(room_id, gs)
+        # 检查点只用于一次交接，之后的状态以本进程为准
+        await room_store.save_checkpoint(room_id, b"")
+        recovered += 1
+    if recovered:
+        logger.info("恢复了 %d 个进行中的房间", recovered)
+    return recovered
+
+
+async def drain_rooms(reconnect_delay_ms: int = RECONNECT_DELAY_MS, stats_timeout: float = 10) -> int:
+    """
+    停机前排空（见 app.services.drain），重复调用时为空操作
+    
+    Returns:
+        写入检查点的房间数
+    """
+    if drain_state.drained:
+        return 0
+    drain_state.begin()
+
+    # 停止自动发牌，暂停倒计时（剩余时间保存在检查点中）
+    for room_id in list(manager.deal_tasks):
+        task = manager.deal_tasks.pop(room_id)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await manager.pause_countdowns()
+
+    await stats_writer.flush(stats_timeout)
+
+    checkpointed = 0
+    for room_id, gs in list(manager.game_states.items()):
+        try:
+            data = dump_checkpoint(gs)
+            command_log.checkpoint(room_id, data)
+            await room_store.save_room(gs.room)
+            await room_store.save_checkpoint(room_id, data)
+            checkpointed += 1
+        except Exception:
+            logger.exception("为房间 %s 写检查点失败", room_id)
+    await command_log.flush()
+
+    # 只通知本进程的连接（不经过广播总线），然后关闭
+    hint = {"type": "server_restarting", "retry_after_ms": reconnect_delay_ms}
+    sockets = [conn.websocket for room_id in manager.connections.rooms() for conn in manager.connections.in_room(room_id)]
+    for websocket in sockets:
+        try:
+            await manager.send_personal_message(hint, websocket)
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason=str(reconnect_delay_ms))
+        except Exception:
+            pass
+    drain_state.drained = True
+    logger.info("排空完成：%d 个房间写入检查点，关闭 %d 个连接", checkpointed, len(sockets))
+    return checkpointed
+
+
+# ---------- 消息处理 ----------
+
+@dispatcher.handler("ping", mutates=False)
+async def handle_ping(ctx: MessageContext, message: Dict[str, Any]):
+    await manager.send_personal_message({"type": "pong"}, ctx.websocket)
+
+
+@dispatcher.handler("ready_to_start_game")
+async def handle_ready_to_start_game(ctx: MessageContext, message: Dict[str, Any]):
+    """玩家准备开始游戏"""
+    room_id = ctx.room_id
+    gs = manager.get_game_state(room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "无法准备开始游戏")
+        return
+    result = gs.ready_to_start_game(ctx.player_id)
+    if not result.get("success"):
+        await _send_error(ctx, result.get("message", "准备失败"))
+        return
+    # 广播ready状态更新
+    ready_event = {
+        "type": "ready_to_start_updated",
+        "player_id": ctx.player_id,
+        "ready_count": result.get("ready_count", 0),
+        "total_players": result.get("total_players", 0),
+        "all_ready": result.get("all_ready", False),
+        "ready_players": result.get("ready_players", [])
+    }
+    await manager.broadcast_to_room(ready_event, room_id)
+    
+    # 如果所有玩家都ready，游戏已自动开始，发送snapshot和phase_changed
+    if result.get("game_started"):
+        _checkpoint_room(room_id, gs)
+        await manager.send_snapshot(room_id)
+        phase_event = {
+            "type": "phase_changed",
+            "phase": "dealing"
+        }
+        await manager.broadcast_to_room(phase_event, room_id)
+        
+        # 自动开始发牌（类似之前的auto_deal功能）
+        _start_auto_deal(room_id, announce_bidding=True)
+
+
+@dispatcher.handler("cancel_ready_to_start_game")
+async def handle_cancel_ready_to_start_game(ctx: MessageContext, message: Dict[str, Any]):
+    """玩家取消准备开始游戏"""
+    gs = manager.get_game_state(ctx.room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "无法取消准备")
+        return
+    result = gs.cancel_ready_to_start_game(ctx.player_id)
+    if not result.get("success"):
+        await _send_error(ctx, result.get("message", "取消准备失败"))
+        return
+    # 广播取消准备状态更新
+    ready_event = {
+        "type": "ready_to_start_updated",
+        "player_id": ctx.player_id,
+        "ready_count": result.get("ready_count", 0),
+        "total_players": result.get("total_players", 0),
+        "all_ready": False,
+        "ready_players": result.get("ready_players", [])
+    }
+    await manager.broadcast_to_room(ready_event, ctx.room_id)
+
+
+@dispatcher.handler("deal_tick")
+async def handle_deal_tick(ctx: MessageContext, message: Dict[str, Any]):
+    """发一张牌（仅房主）"""
+    room = ctx.room
+    if not room or not ctx.player_id or (room.owner_id and ctx.player_id != room.owner_id):
+        await _send_error(ctx, "只有房主可以发牌")
+        return
+    await manager.handle_deal_tick(ctx.room_id)
+
+
+def _bidding_cards_payload(gs: GameState) -> Dict[str, List[str]]:
+    """定主区域显示的牌（bidding_display_cards 已经包含凑对时的 prev_card）"""
+    return {
+        p_id: [str(card) for card in cards]
+        for p_id, cards in getattr(gs, "bidding_display_cards", {}).items()
+    } if hasattr(gs, "bidding_display_cards") else {}
+
+
+@dispatcher.handler("make_bid", CardsMessage)
+async def handle_make_bid(ctx: MessageContext, msg: CardsMessage):
+    """亮主/反主"""
+    gs = manager.get_game_state(ctx.room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "不可亮主")
+        return
+    parsed_cards = parse_card_strings(msg.cards or [])
+    result = gs.make_bid(ctx.player_id, parsed_cards)
+    if result.get("success"):
+        command_log.append(ctx.room_id, "make_bid", ctx.player_id, parsed_cards)
+    
+    bid_payload = {
+        "type": "bidding_updated",
+        "result": result,
+        "bidding": gs.get_bidding_status(),
+        "bidding_cards": _bidding_cards_payload(gs),
+        "turn_player_id": gs.bidding_turn_player_id
+    }
+    await manager.broadcast_to_room(bid_payload, ctx.room_id)
+    # 若已经决定了主牌，发snapshot
+    await manager.send_snapshot(ctx.room_id)
+
+
+@dispatcher.handler("pass_bid")
+async def handle_pass_bid(ctx: MessageContext, message: Dict[str, Any]):
+    """不亮主"""
+    room_id = ctx.room_id
+    gs = manager.get_game_state(room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "不可亮主")
+        return
+    result = gs.pass_bid(ctx.player_id)
+    if not result.get("success"):
+        await _send_error(ctx, result.get("message", "不可亮主"))
+        return
+    command_log.append(room_id, "pass_bid", ctx.player_id)
+    payload = {
+        "type": "bidding_updated",
+        "result": result,
+        "bidding": gs.get_bidding_status(),
+        "bidding_cards": _bidding_cards_payload(gs),
+        "turn_player_id": gs.bidding_turn_player_id
+    }
+    await manager.broadcast_to_room(payload, room_id)
+    if result.get("finished"):
+        await manager.broadcast_to_room({"type": "phase_changed", "phase": gs.game_phase}, room_id)
+    await manager.send_snapshot(room_id)
+
+
+@dispatcher.handler("submit_bottom", CardsMessage)
+async def handle_submit_bottom(ctx: MessageContext, msg: CardsMessage):
+    """庄家扣底"""
+    room_id = ctx.room_id
+    gs = manager.get_game_state(room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "无法扣底")
+        return
+    dealer = gs.get_dealer()
+    if not dealer or dealer.id != ctx.player_id:
+        await _send_error(ctx, "仅庄家可以扣底")
+        return
+    if not gs.bottom_pending:
+        await _send_error(ctx, "当前不需要扣底")
+        return
+    parsed_cards = parse_card_strings(msg.cards or [])
+    success = gs.dealer_discard_bottom(parsed_cards)
+    if not success:
+        await _send_error(ctx, "扣底失败，请检查所选牌")
+        return
+    command_log.append(room_id, "submit_bottom", ctx.player_id, parsed_cards)
+    payload = {
+        "type": "bottom_updated",
+        "bottom_cards_count": len(gs.bottom_cards),
+        "dealer_has_bottom": gs.dealer_has_bottom,
+        "bottom_pending": gs.bottom_pending,
+        "dealer_player_id": dealer.id,
+        "phase": gs.game_phase
+    }
+    await manager.broadcast_to_room(payload, room_id)
+    if gs.game_phase == "playing":
+        await manager.broadcast_to_room({"type": "phase_changed", "phase": "playing"}, room_id)
+        # 游戏进入playing阶段时启动倒计时
+        await manager.start_countdown(room_id)
+    await manager.send_snapshot(room_id)
+
+
+@dispatcher.handler("finish_bidding")
+async def handle_finish_bidding(ctx: MessageContext, message: Dict[str, Any]):
+    """结束亮主"""
+    room_id = ctx.room_id
+    gs = manager.get_game_state(room_id)
+    if not gs:
+        await _send_error(ctx, "不可结束亮主")
+        return
+    ok = gs.finish_bidding()
+    if ok:
+        command_log.append(room_id, "finish_bidding")
+        await manager.broadcast_to_room({"type": "phase_changed", "phase": gs.game_phase}, room_id)
+        # 如果进入playing阶段，启动倒计时
+        if gs.game_phase == "playing":
+            await manager.start_countdown(room_id)
+    await manager.send_snapshot(room_id)
+
+
+@dispatcher.handler("select_cards", SelectCardsMessage)
+async def handle_select_cards(ctx: MessageContext, msg: SelectCardsMessage):
+    """玩家选择卡牌（用于自动出牌功能）"""
+    gs = manager.get_game_state(ctx.room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "无法处理选中卡牌")
+        return
+    player = gs.get_player_by_id(ctx.player_id)
+    if not player:
+        await _send_error(ctx, "玩家不存在")
+        return
+    # 解析选中的卡牌
+    cards_str = msg.cards or []
+    if not isinstance(cards_str, list):
+        cards_str = [cards_str]
+    
+    # 更新GameState中的选中卡牌
+    gs.selected_cards = parse_card_strings(cards_str)
+    
+    # 可以选择发送确认消息给前端
+    await manager.send_personal_message({"type": "cards_selected", "success": True}, ctx.websocket)
+
+
+def _expected_play_position(gs: GameState) -> Optional[PlayerPosition]:
+    """检查出牌顺序：优先使用current_player（实时更新）"""
+    if gs.current_player:
+        # 优先使用GameState的current_player（实时更新）
+        return gs.current_player
+    if len(gs.current_trick_with_player) == 0:
+        # 第一轮，应该由庄家领出
+        return gs.dealer_position
+    if gs.card_playing_system and hasattr(gs.card_playing_system, "expected_leader") and gs.card_playing_system.expected_leader:
+        # 如果没有current_player，使用expected_leader（作为后备）
+        return gs.card_playing_system.expected_leader
+    # 后续轮次，按逆时针顺序
+    last_player_pos = gs.current_trick_with_player[-1]["player_position"]
+    positions = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
+    last_pos = next((p for p in positions if p.value == last_player_pos), None)
+    if last_pos:
+        last_idx = positions.index(last_pos)
+        return positions[(last_idx + 1) % 4]
+    return None
+
+
+@dispatcher.handler("play_card", PlayCardMessage)
+async def handle_play_card(ctx: MessageContext, msg: PlayCardMessage):
+    """玩家出牌（支持多张牌）"""
+    room_id = ctx.room_id
+    player_id_current = ctx.player_id
+    gs = manager.get_game_state(room_id)
+    if not gs or not player_id_current:
+        await _send_error(ctx, "无法出牌")
+        return
+    # 检查是否轮到当前玩家出牌
+    player = gs.get_player_by_id(player_id_current)
+    if not player:
+        await _send_error(ctx, "玩家不存在")
+        return
+    
+    expected_position = _expected_play_position(gs)
+    if expected_position and player.position != expected_position:
+        await _send_error(ctx, f"未轮到您出牌，应由{expected_position.value}出牌")
+        return
+    
+    # 解析卡牌（支持多张）
+    cards_str = msg.cards or msg.card  # 兼容单张和多张
+    if not cards_str:
+        await _send_error(ctx, "请选择要出的牌")
+        return
+    # 转换为列表格式
+    if not isinstance(cards_str, list):
+        cards_str = [cards_str]
+    
+    # 将字符串转换为Card对象
+    parsed_cards = parse_card_strings(cards_str)
+    if not parsed_cards:
+        await _send_error(ctx, "无效的卡牌")
+        return
+    
+    result = gs.play_card(player_id_current, parsed_cards)
+    if result.get("success"):
+        command_log.append(room_id, "play_card", player_id_current, parsed_cards)
+        # 玩家手动出牌成功，停止当前倒计时
+        await manager.stop_countdown(room_id)
+        # 检查是否完成一轮（必须在play_card之后检查，因为play_card会更新状态）
+        # 注意：play_card中如果一轮完成，会保存last_trick但不清空current_trick_with_player（延迟清空）
+        # 所以这里检查：如果current_trick_with_player长度为4，说明刚完成一轮
+        trick_was_complete = len(gs.current_trick_with_player) == 4
+        
+        # 广播出牌事件（确保current_player已经更新）
+        # 获取当前轮次最大玩家名称
+        current_trick_max_player_name = None
+        if hasattr(gs, "current_trick_max_player_id") and gs.current_trick_max_player_id:
+            max_player = gs.get_player_by_id(gs.current_trick_max_player_id)
+            if max_player:
+                current_trick_max_player_name = max_player.name
+        
+        play_event = {
+            "type": "card_played",
+            "player_id": player_id_current,
+            "player_position": player.position.value,
+            "cards": cards_str,  # 改为cards列表
+            "current_trick": gs.current_trick_with_player if hasattr(gs, "current_trick_with_player") else [],
+            "trick_complete": trick_was_complete,
+            "current_player": gs.current_player.value if gs.current_player else None,
+            "current_trick_max_player": current_trick_max_player_name
+        }
+        await manager.broadcast_to_room(play_event, room_id)
+        
+        # 如果一轮结束，发送获胜者信息和上一轮出牌
+        if trick_was_complete and hasattr(gs, "last_trick"):
+            # 在清空之前保存当前轮次的牌（用于前端延迟显示）
+            # 此时current_trick_with_player还包含上一轮的数据（在play_card中未清空）
+            # 使用last_trick作为current_trick，因为last_trick是上一轮完成时的数据
+            trick_complete_event = {
+                "type": "trick_complete",
+                "last_trick": gs.last_trick,
+                "current_trick": gs.last_trick.copy(),  # 使用last_trick作为current_trick（用于延迟显示）
+                "tricks_won": gs.tricks_won,
+                "idle_score": gs.idle_score,  # 添加分数信息
+                "current_player": gs.current_player.value if gs.current_player else None
             }
-            await self.broadcast_to_room(json.dumps(error_msg), room_id)
+            await manager.broadcast_to_room(trick_complete_event, room_id)
+            # 发送分数更新事件
+            score_event = {
+                "type": "score_updated",
+                "idle_score": gs.idle_score
+            }
+            await manager.broadcast_to_room(score_event, room_id)
+            # 发送完事件后，清空current_trick_with_player（为下一轮准备）
+            gs.current_trick_with_player = []
+        
+        await manager.send_snapshot(room_id)
+        
+        # 无论是否一轮结束，为下一个玩家启动倒计时
+        await manager.start_countdown(room_id)
+        
+        # 检查游戏是否结束（所有玩家手牌为空）
+        # 注意：_handle_game_end会在play_card中调用，所以这里检查phase是否为scoring
+        if gs.game_phase == "scoring" and gs.round_summary:
+            # 记录战绩（仅记录一次）
+            if not gs.stats_recorded:
+                stats_writer.submit(gs.round_summary, gs.room.players, room_id)
+                gs.stats_recorded = True
+            
+            # 游戏结束，发送round_end事件
+            round_end_event = {
+                "type": "round_end",
+                "round_summary": gs.round_summary,
+                "ready_count": len(gs.players_ready_for_next_round),
+                "total_players": len(gs.room.players),
+                "ready_players": list(gs.players_ready_for_next_round)
+            }
+            await manager.broadcast_to_room(round_end_event, room_id)
+        return
+    
+    # 出牌失败，检查是否是甩牌失败（有forced_cards）
+    error_msg = result.get("message", "出牌失败")
+    forced_cards = result.get("forced_cards")
+    forced_cards_str = None
+    if forced_cards:
+        forced_cards_str = [str(card) for card in forced_cards]
+    
+    # 如果是甩牌失败（有forced_cards），先广播出牌事件让所有玩家看到甩出的牌
+    if forced_cards_str:
+        # 临时添加到current_trick_with_player用于显示（但不从手牌中移除）
+        temp_trick_entry = {
+            "player_id": player_id_current,
+            "player_position": player.position.value,
+            "cards": cards_str,
+            "slingshot_failed": True  # 标记为甩牌失败
+        }
+        # 创建临时的current_trick用于显示
+        temp_current_trick = gs.current_trick_with_player.copy()
+        temp_current_trick.append(temp_trick_entry)
+        
+        # 广播出牌事件（让所有玩家看到甩出的牌）
+        play_event = {
+            "type": "card_played",
+            "player_id": player_id_current,
+            "player_position": player.position.value,
+            "cards": cards_str,
+            "current_trick": temp_current_trick,
+            "trick_complete": False,
+            "slingshot_failed": True,  # 标记为甩牌失败
+            "current_player": gs.current_player.value if gs.current_player else None
+        }
+        await manager.broadcast_to_room(play_event, room_id)
+        
+        # 广播甩牌失败提示（让所有玩家都能看到）
+        slingshot_failed_notification = {
+            "type": "slingshot_failed_notification",
+            "message": "首家甩牌失败，强制出小",
+            "player_position": player.position.value,
+            "player_name": player.name if hasattr(player, 'name') else None
+        }
+        await manager.broadcast_to_room(slingshot_failed_notification, room_id)
+    
+    # 发送错误信息（包含forced_cards）
+    await manager.send_personal_message({"type": "error", "message": error_msg, "forced_cards": forced_cards_str, "slingshot_failed": bool(forced_cards_str)}, ctx.websocket)
+
+
+@dispatcher.handler("auto_deal")
+async def handle_auto_deal(ctx: MessageContext, message: Dict[str, Any]):
+    """自动发牌（用于演示，仅房主）"""
+    room = ctx.room
+    if not room or not ctx.player_id or (room.owner_id and ctx.player_id != room.owner_id):
+        await _send_error(ctx, "只有房主可以自动发牌")
+        return
+    # 创建后台任务，不阻塞主循环
+    _start_auto_deal(ctx.room_id)
+
+
+@dispatcher.handler("auto_play")
+async def handle_auto_play(ctx: MessageContext, message: Dict[str, Any]):
+    """
+    前端请求自动出牌（倒计时结束时触发）
+    
+    实际的自动出牌逻辑由后端倒计时系统自动触发，这里只是为了避免显示"Unknown message type"错误
+    """
+
+
+@dispatcher.handler("ready_for_next_round")
+async def handle_ready_for_next_round(ctx: MessageContext, message: Dict[str, Any]):
+    """玩家准备进入下一轮"""
+    room_id = ctx.room_id
+    gs = manager.get_game_state(room_id)
+    if not gs or not ctx.player_id:
+        await _send_error(ctx, "无法准备下一轮")
+        return
+    result = gs.ready_for_next_round(ctx.player_id)
+    if not result.get("success"):
+        await _send_error(ctx, result.get("message", "准备失败"))
+        return
+    command_log.append(room_id, "ready_for_next_round", ctx.player_id)
+    # 广播ready状态更新
+    ready_event = {
+        "type": "ready_for_next_round_updated",
+        "player_id": ctx.player_id,
+        "ready_count": result.get("ready_count", 0),
+        "total_players": result.get("total_players", 0),
+        "all_ready": result.get("all_ready", False),
+        "ready_players": result.get("ready_players", [])  # 包含所有已准备玩家的ID列表
+    }
+    await manager.broadcast_to_room(ready_event, room_id)
+    
+    # 如果所有玩家都ready，自动开始下一轮
+    if result.get("all_ready") and gs.start_next_round():
+        _checkpoint_room(room_id, gs)
+        # 下一轮已开始，进入发牌阶段
+        await manager.broadcast_to_room({"type": "phase_changed", "phase": "dealing"}, room_id)
+        await manager.send_snapshot(room_id)
+        
+        # 自动开始发牌（类似ready_to_start_game的逻辑）
+        _start_auto_deal(room_id)
 
-manager = ConnectionManager()
 
 @router.websocket("/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str = Query(None)):
@@ -722,450 +1562,41 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str
                 is_ready=True
             )
             room.players.append(player)
+            rooms.refresh(room)
             player_id = player.id
     
+    # 停机排空期间不接受新连接，让客户端稍后重连到新进程
+    if drain_state.draining:
+        await websocket.accept()
+        await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason=str(RECONNECT_DELAY_MS))
+        return
+    
     await manager.connect(websocket, room_id, player_id)
     # 如果由于校验失败未被接受，则直接结束协程，避免未accept时读取导致异常
     if manager.get_connection_info(room_id, websocket) is None:
         return
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            try:
+                message = await manager.receive_message(websocket)
+            except ValueError:
+                # JSON 解析失败或二进制帧格式错误（ProtocolError 是 ValueError 子类）
+                await manager.send_personal_message({"type": "error", "message": "消息格式错误"}, websocket)
+                continue
+            if not isinstance(message, dict):
+                await manager.send_personal_message({"type": "error", "message": "消息格式错误"}, websocket)
+                continue
             
-            # Handle different message types
-            msg_type = message.get("type")
             conn_info = manager.get_connection_info(room_id, websocket)
-            player_id_current = conn_info.player_id if conn_info else None
-            room = rooms.get(room_id)
-            
-            if msg_type == "ping":
-                await manager.send_personal_message(
-                    json.dumps({"type": "pong"}), 
-                    websocket
-                )
-            elif msg_type == "ready_to_start_game":
-                # 玩家准备开始游戏
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法准备开始游戏"}), websocket)
-                else:
-                    result = gs.ready_to_start_game(player_id_current)
-                    if result.get("success"):
-                        # 广播ready状态更新
-                        ready_event = {
-                            "type": "ready_to_start_updated",
-                            "player_id": player_id_current,
-                            "ready_count": result.get("ready_count", 0),
-                            "total_players": result.get("total_players", 0),
-                            "all_ready": result.get("all_ready", False),
-                            "ready_players": result.get("ready_players", [])
-                        }
-                        await manager.broadcast_to_room(json.dumps(ready_event), room_id)
-                        
-                        # 如果所有玩家都ready，游戏已自动开始，发送snapshot和phase_changed
-                        if result.get("game_started"):
-                            await manager.send_snapshot(room_id)
-                            phase_event = {
-                                "type": "phase_changed",
-                                "phase": "dealing"
-                            }
-                            await manager.broadcast_to_room(json.dumps(phase_event), room_id)
-                            
-                            # 自动开始发牌（类似之前的auto_deal功能）
-                            async def auto_deal_task():
-                                gs = manager.get_game_state(room_id)
-                                if gs:
-                                    while gs.dealt_count < 100 and gs.game_phase == "dealing":
-                                        await manager.handle_deal_tick(room_id)
-                                        await asyncio.sleep(0.1)  # 每0.1秒发一张牌
-                                    
-                                    # 发牌完成后，发送snapshot和phase_changed事件
-                                    if gs.game_phase == "bidding":
-                                        await manager.send_snapshot(room_id)
-                                        phase_event = {
-                                            "type": "phase_changed",
-                                            "phase": "bidding"
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(phase_event), room_id)
-                            
-                            asyncio.create_task(auto_deal_task())
-                    else:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": result.get("message", "准备失败")}), websocket)
-            elif msg_type == "cancel_ready_to_start_game":
-                # 玩家取消准备开始游戏
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法取消准备"}), websocket)
-                else:
-                    result = gs.cancel_ready_to_start_game(player_id_current)
-                    if result.get("success"):
-                        # 广播取消准备状态更新
-                        ready_event = {
-                            "type": "ready_to_start_updated",
-                            "player_id": player_id_current,
-                            "ready_count": result.get("ready_count", 0),
-                            "total_players": result.get("total_players", 0),
-                            "all_ready": False,
-                            "ready_players": result.get("ready_players", [])
-                        }
-                        await manager.broadcast_to_room(json.dumps(ready_event), room_id)
-                    else:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": result.get("message", "取消准备失败")}), websocket)
-            elif msg_type == "deal_tick":
-                # 发一张牌
-                if not room or not player_id_current or (room.owner_id and player_id_current != room.owner_id):
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "只有房主可以发牌"}), websocket)
-                else:
-                    await manager.handle_deal_tick(room_id)
-            elif msg_type == "make_bid":
-                # 亮主/反主
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "不可亮主"}), websocket)
-                else:
-                    cards_str = message.get("cards") or []
-                    parsed_cards = parse_card_strings(cards_str)
-                    result = gs.make_bid(player_id_current, parsed_cards)
-                    
-                    # 使用 bidding_display_cards 来显示前端定主区域的牌
-                    # bidding_display_cards 已经包含了完整的对子（包括凑对时的 prev_card）
-                    display_bidding_cards = {
-                        p_id: [str(card) for card in cards]
-                        for p_id, cards in getattr(gs, "bidding_display_cards", {}).items()
-                    } if hasattr(gs, "bidding_display_cards") else {}
-                    
-                    bid_payload = {
-                        "type": "bidding_updated",
-                        "result": result,
-                        "bidding": gs.get_bidding_status(),
-                        "bidding_cards": display_bidding_cards,
-                        "turn_player_id": gs.bidding_turn_player_id
-                    }
-                    await manager.broadcast_to_room(json.dumps(bid_payload), room_id)
-                    # 若已经决定了主牌，发snapshot
-                    await manager.send_snapshot(room_id)
-            elif msg_type == "pass_bid":
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "不可亮主"}), websocket)
-                else:
-                    result = gs.pass_bid(player_id_current)
-                    if result.get("success"):
-                        payload = {
-                            "type": "bidding_updated",
-                            "result": result,
-                            "bidding": gs.get_bidding_status(),
-                            "bidding_cards": {
-                                p_id: [str(card) for card in cards]
-                                for p_id, cards in getattr(gs, "bidding_display_cards", {}).items()
-                            } if hasattr(gs, "bidding_display_cards") else {},
-                            "turn_player_id": gs.bidding_turn_player_id
-                        }
-                        await manager.broadcast_to_room(json.dumps(payload), room_id)
-                        if result.get("finished"):
-                            await manager.broadcast_to_room(json.dumps({"type": "phase_changed", "phase": gs.game_phase}), room_id)
-                        await manager.send_snapshot(room_id)
-                    else:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": result.get("message", "不可亮主")}), websocket)
-            elif msg_type == "submit_bottom":
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法扣底"}), websocket)
-                else:
-                    dealer = gs.get_dealer()
-                    if not dealer or dealer.id != player_id_current:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": "仅庄家可以扣底"}), websocket)
-                    elif not gs.bottom_pending:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": "当前不需要扣底"}), websocket)
-                    else:
-                        cards_str = message.get("cards") or []
-                        parsed_cards = parse_card_strings(cards_str)
-                        success = gs.dealer_discard_bottom(parsed_cards)
-                        if success:
-                            payload = {
-                                "type": "bottom_updated",
-                                "bottom_cards_count": len(gs.bottom_cards),
-                                "dealer_has_bottom": gs.dealer_has_bottom,
-                                "bottom_pending": gs.bottom_pending,
-                                "dealer_player_id": dealer.id,
-                                "phase": gs.game_phase
-                            }
-                            await manager.broadcast_to_room(json.dumps(payload), room_id)
-                            if gs.game_phase == "playing":
-                                await manager.broadcast_to_room(json.dumps({"type": "phase_changed", "phase": "playing"}), room_id)
-                                # 游戏进入playing阶段时启动倒计时
-                                await manager.start_countdown(room_id)
-                            await manager.send_snapshot(room_id)
-                        else:
-                            await manager.send_personal_message(json.dumps({"type": "error", "message": "扣底失败，请检查所选牌"}), websocket)
-            elif msg_type == "finish_bidding":
-                gs = manager.get_game_state(room_id)
-                if not gs:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "不可结束亮主"}), websocket)
-                else:
-                    ok = gs.finish_bidding()
-                    if ok:
-                        await manager.broadcast_to_room(json.dumps({"type": "phase_changed", "phase": gs.game_phase}), room_id)
-                        # 如果进入playing阶段，启动倒计时
-                        if gs.game_phase == "playing":
-                            await manager.start_countdown(room_id)
-                    await manager.send_snapshot(room_id)
-            elif msg_type == "select_cards":
-                # 玩家选择卡牌（用于自动出牌功能）
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法处理选中卡牌"}), websocket)
-                else:
-                    # 检查是否轮到当前玩家出牌
-                    player = gs.get_player_by_id(player_id_current)
-                    if not player:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": "玩家不存在"}), websocket)
-                    else:
-                        # 解析选中的卡牌
-                        cards_str = message.get("cards") or []
-                        if not isinstance(cards_str, list):
-                            cards_str = [cards_str]
-                        
-                        # 将字符串转换为Card对象
-                        parsed_cards = parse_card_strings(cards_str)
-                        
-                        # 更新GameState中的选中卡牌
-                        gs.selected_cards = parsed_cards
-                        
-                        # 可以选择发送确认消息给前端
-                        await manager.send_personal_message(json.dumps({"type": "cards_selected", "success": True}), websocket)
-            elif msg_type == "play_card":
-                # 玩家出牌（支持多张牌）
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法出牌"}), websocket)
-                else:
-                    # 检查是否轮到当前玩家出牌
-                    player = gs.get_player_by_id(player_id_current)
-                    if not player:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": "玩家不存在"}), websocket)
-                    else:
-                        # 检查出牌顺序：优先使用current_player（实时更新）
-                        expected_position = None
-                        if gs.current_player:
-                            # 优先使用GameState的current_player（实时更新）
-                            expected_position = gs.current_player
-                        elif len(gs.current_trick_with_player) == 0:
-                            # 第一轮，应该由庄家领出
-                            expected_position = gs.dealer_position
-                        elif gs.card_playing_system and hasattr(gs.card_playing_system, "expected_leader") and gs.card_playing_system.expected_leader:
-                            # 如果没有current_player，使用expected_leader（作为后备）
-                            expected_position = gs.card_playing_system.expected_leader
-                        else:
-                            # 后续轮次，按逆时针顺序
-                            last_player_pos = gs.current_trick_with_player[-1]["player_position"]
-                            positions = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
-                            last_pos = next((p for p in positions if p.value == last_player_pos), None)
-                            if last_pos:
-                                last_idx = positions.index(last_pos)
-                                next_idx = (last_idx + 1) % 4
-                                expected_position = positions[next_idx]
-                        
-                        if expected_position and player.position != expected_position:
-                            await manager.send_personal_message(json.dumps({"type": "error", "message": f"未轮到您出牌，应由{expected_position.value}出牌"}), websocket)
-                            continue
-                        
-                        # 解析卡牌（支持多张）
-                        cards_str = message.get("cards") or message.get("card")  # 兼容单张和多张
-                        if not cards_str:
-                            await manager.send_personal_message(json.dumps({"type": "error", "message": "请选择要出的牌"}), websocket)
-                        else:
-                            # 转换为列表格式
-                            if isinstance(cards_str, str):
-                                cards_str = [cards_str]
-                            
-                            # 将字符串转换为Card对象
-                            parsed_cards = parse_card_strings(cards_str)
-                            if not parsed_cards:
-                                await manager.send_personal_message(json.dumps({"type": "error", "message": "无效的卡牌"}), websocket)
-                            else:
-                                result = gs.play_card(player_id_current, parsed_cards)
-                                if result.get("success"):
-                                    # 玩家手动出牌成功，停止当前倒计时
-                                    await manager.stop_countdown(room_id)
-                                    # 检查是否完成一轮（必须在play_card之后检查，因为play_card会更新状态）
-                                    # 注意：play_card中如果一轮完成，会保存last_trick但不清空current_trick_with_player（延迟清空）
-                                    # 所以这里检查：如果current_trick_with_player长度为4，说明刚完成一轮
-                                    trick_was_complete = len(gs.current_trick_with_player) == 4
-                                    
-                                    # 广播出牌事件（确保current_player已经更新）
-                                    # 获取当前轮次最大玩家名称
-                                    current_trick_max_player_name = None
-                                    if hasattr(gs, "current_trick_max_player_id") and gs.current_trick_max_player_id:
-                                        max_player = gs.get_player_by_id(gs.current_trick_max_player_id)
-                                        if max_player:
-                                            current_trick_max_player_name = max_player.name
-                                    
-                                    play_event = {
-                                        "type": "card_played",
-                                        "player_id": player_id_current,
-                                        "player_position": player.position.value,
-                                        "cards": cards_str,  # 改为cards列表
-                                        "current_trick": gs.current_trick_with_player if hasattr(gs, "current_trick_with_player") else [],
-                                        "trick_complete": trick_was_complete,
-                                        "current_player": gs.current_player.value if gs.current_player else None,
-                                        "current_trick_max_player": current_trick_max_player_name
-                                    }
-                                    await manager.broadcast_to_room(json.dumps(play_event), room_id)
-                                    
-                                    # 如果一轮结束，发送获胜者信息和上一轮出牌
-                                    if trick_was_complete and hasattr(gs, "last_trick"):
-                                        # 在清空之前保存当前轮次的牌（用于前端延迟显示）
-                                        # 此时current_trick_with_player还包含上一轮的数据（在play_card中未清空）
-                                        # 使用last_trick作为current_trick，因为last_trick是上一轮完成时的数据
-                                        trick_complete_event = {
-                                            "type": "trick_complete",
-                                            "last_trick": gs.last_trick,
-                                            "current_trick": gs.last_trick.copy(),  # 使用last_trick作为current_trick（用于延迟显示）
-                                            "tricks_won": gs.tricks_won,
-                                            "idle_score": gs.idle_score,  # 添加分数信息
-                                            "current_player": gs.current_player.value if gs.current_player else None
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(trick_complete_event), room_id)
-                                        # 发送分数更新事件
-                                        score_event = {
-                                            "type": "score_updated",
-                                            "idle_score": gs.idle_score
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(score_event), room_id)
-                                        # 发送完事件后，清空current_trick_with_player（为下一轮准备）
-                                        gs.current_trick_with_player = []
-                                    
-                                    await manager.send_snapshot(room_id)
-                                    
-                                    # 无论是否一轮结束，为下一个玩家启动倒计时
-                                    await manager.start_countdown(room_id)
-                                    
-                                    # 检查游戏是否结束（所有玩家手牌为空）
-                                    # 注意：_handle_game_end会在play_card中调用，所以这里检查phase是否为scoring
-                                    if gs.game_phase == "scoring" and gs.round_summary:
-                                        # 记录战绩（仅记录一次）
-                                        if not gs.stats_recorded:
-                                            asyncio.create_task(record_game_stats(gs.round_summary, gs.room.players))
-                                            gs.stats_recorded = True
-                                        
-                                        # 游戏结束，发送round_end事件
-                                        round_end_event = {
-                                            "type": "round_end",
-                                            "round_summary": gs.round_summary,
-                                            "ready_count": len(gs.players_ready_for_next_round),
-                                            "total_players": len(gs.room.players),
-                                            "ready_players": list(gs.players_ready_for_next_round)
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(round_end_event), room_id)
-                                else:
-                                    # 出牌失败，检查是否是甩牌失败（有forced_cards）
-                                    error_msg = result.get("message", "出牌失败")
-                                    forced_cards = result.get("forced_cards")
-                                    forced_cards_str = None
-                                    if forced_cards:
-                                        forced_cards_str = [str(card) for card in forced_cards]
-                                    
-                                    # 如果是甩牌失败（有forced_cards），先广播出牌事件让所有玩家看到甩出的牌
-                                    if forced_cards_str:
-                                        # 临时添加到current_trick_with_player用于显示（但不从手牌中移除）
-                                        temp_trick_entry = {
-                                            "player_id": player_id_current,
-                                            "player_position": player.position.value,
-                                            "cards": cards_str,
-                                            "slingshot_failed": True  # 标记为甩牌失败
-                                        }
-                                        # 创建临时的current_trick用于显示
-                                        temp_current_trick = gs.current_trick_with_player.copy()
-                                        temp_current_trick.append(temp_trick_entry)
-                                        
-                                        # 广播出牌事件（让所有玩家看到甩出的牌）
-                                        play_event = {
-                                            "type": "card_played",
-                                            "player_id": player_id_current,
-                                            "player_position": player.position.value,
-                                            "cards": cards_str,
-                                            "current_trick": temp_current_trick,
-                                            "trick_complete": False,
-                                            "slingshot_failed": True,  # 标记为甩牌失败
-                                            "current_player": gs.current_player.value if gs.current_player else None
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(play_event), room_id)
-                                        
-                                        # 广播甩牌失败提示（让所有玩家都能看到）
-                                        slingshot_failed_notification = {
-                                            "type": "slingshot_failed_notification",
-                                            "message": "首家甩牌失败，强制出小",
-                                            "player_position": player.position.value,
-                                            "player_name": player.name if hasattr(player, 'name') else None
-                                        }
-                                        await manager.broadcast_to_room(json.dumps(slingshot_failed_notification), room_id)
-                                    
-                                    # 发送错误信息（包含forced_cards）
-                                    await manager.send_personal_message(json.dumps({"type": "error", "message": error_msg, "forced_cards": forced_cards_str, "slingshot_failed": bool(forced_cards_str)}), websocket)
-            elif msg_type == "auto_deal":
-                # 自动发牌（用于演示）
-                if not room or not player_id_current or (room.owner_id and player_id_current != room.owner_id):
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "只有房主可以自动发牌"}), websocket)
-                else:
-                    # 创建后台任务，不阻塞主循环
-                    async def auto_deal_task():
-                        gs = manager.get_game_state(room_id)
-                        if gs:
-                            while gs.dealt_count < 100 and gs.game_phase == "dealing":
-                                await manager.handle_deal_tick(room_id)
-                                await asyncio.sleep(0.1)
-                    asyncio.create_task(auto_deal_task())
-            elif msg_type == "auto_play":
-                # 前端请求自动出牌（倒计时结束时触发）
-                # 注意：实际的自动出牌逻辑由后端倒计时系统自动触发
-                # 这里只是为了避免显示"Unknown message type"错误
-                # 前端发送此消息主要是为了触发倒计时结束的处理
-                # 但后端已经通过倒计时系统自动处理了，所以这里不需要额外操作
-                pass
-            elif msg_type == "ready_for_next_round":
-                # 玩家准备进入下一轮
-                gs = manager.get_game_state(room_id)
-                if not gs or not player_id_current:
-                    await manager.send_personal_message(json.dumps({"type": "error", "message": "无法准备下一轮"}), websocket)
-                else:
-                    result = gs.ready_for_next_round(player_id_current)
-                    if result.get("success"):
-                        # 广播ready状态更新
-                        ready_event = {
-                            "type": "ready_for_next_round_updated",
-                            "player_id": player_id_current,
-                            "ready_count": result.get("ready_count", 0),
-                            "total_players": result.get("total_players", 0),
-                            "all_ready": result.get("all_ready", False),
-                            "ready_players": result.get("ready_players", [])  # 包含所有已准备玩家的ID列表
-                        }
-                        await manager.broadcast_to_room(json.dumps(ready_event), room_id)
-                        
-                        # 如果所有玩家都ready，自动开始下一轮
-                        if result.get("all_ready"):
-                            if gs.start_next_round():
-                                # 下一轮已开始，进入发牌阶段
-                                await manager.broadcast_to_room(json.dumps({"type": "phase_changed", "phase": "dealing"}), room_id)
-                                await manager.send_snapshot(room_id)
-                                
-                                # 自动开始发牌（类似ready_to_start_game的逻辑）
-                                async def auto_deal_task():
-                                    gs = manager.get_game_state(room_id)
-                                    if gs:
-                                        while gs.dealt_count < 100 and gs.game_phase == "dealing":
-                                            await manager.handle_deal_tick(room_id)
-                                            await asyncio.sleep(0.1)  # 每0.1秒发一张牌
-                                asyncio.create_task(auto_deal_task())
-                    else:
-                        await manager.send_personal_message(json.dumps({"type": "error", "message": result.get("message", "准备失败")}), websocket)
-            else:
-                # 其他消息类型可以后续扩展
-                await manager.send_personal_message(
-                    json.dumps({"type": "error", "message": f"Unknown message type: {msg_type}"}),
-                    websocket
-                )
+            ctx = MessageContext(
+                websocket=websocket,
+                room_id=room_id,
+                player_id=conn_info.player_id if conn_info else None,
+                room=rooms.get(room_id)
+            )
+            # 本条消息产生的所有事件合并为每个接收者一帧发送
+            async with manager.batch(room_id):
+                await dispatcher.dispatch(ctx, message)
             
     except WebSocketDisconnect:
         await manager.disconnect(websocket, room_id)
@@ -0,0 +1,149 @@
+"""
+大厅 WebSocket 推送
+
+大厅页面连接 /ws/lobby 后先收到完整的房间摘要列表（lobby_snapshot），
+之后房间创建、有人加入、状态/阶段变化、房间回收时收到增量事件
+（room_added / room_updated / room_removed），不再定时轮询 /api/rooms。
+
+每个事件只编码一次，放入各连接的发送队列，由每个连接自己的发送任务写出，
+慢连接不会拖慢房间操作。队列满时丢弃积压的事件，改为重发一次完整列表；
+客户端按 version 忽略不比已有列表新的事件。
+
+注意：房间摘要只包含本进程的房间，分片部署时每个分片的大厅只推送本分片的房间。
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.core.config import settings
+from app.core.metrics import counter, gauge, gauge_callback
+from app.services.drain import drain_state, SERVICE_RESTART_CLOSE_CODE, RECONNECT_DELAY_MS
+from app.services.room_summary import RoomSummaries, room_summaries
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+lobby_subscribers = gauge("lobby_subscribers", "大厅推送的连接数")
+lobby_events_total = counter("lobby_events_total", "大厅推送的增量事件数（每个事件计一次，不按连接）")
+lobby_resyncs_total = counter("lobby_resyncs_total", "发送队列满后改为重发完整列表的次数")
+
+# 队列中的 None 表示发送当时的完整列表
+_SNAPSHOT = None
+
+
+class LobbySubscriber:
+    """一个大厅连接及其待发送队列"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    def push(self, frame: Optional[str]) -> bool:
+        """放入待发送的帧；队列已满时清空积压改为重发完整列表，返回 False"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_SNAPSHOT)
+            return False
+
+
+class LobbyFeed:
+    """把房间摘要的变化推送给所有大厅连接"""
+
+    def __init__(self, summaries: RoomSummaries, max_queue: int = 256):
+        self.summaries = summaries
+        self.max_queue = max_queue
+        self.subscribers: Dict[int, LobbySubscriber] = {}
+        # (版本, 编码后的完整列表)
+        self._snapshot: Optional[tuple] = None
+        summaries.add_listener(self._on_change)
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def snapshot_frame(self) -> str:
+        """当前完整列表（同一版本只编码一次）"""
+        version = self.summaries.version
+        if self._snapshot is None or self._snapshot[0] != version:
+            frame = json.dumps(
+                {"type": "lobby_snapshot", "version": version, "rooms": self.summaries.values()},
+                ensure_ascii=False
+            )
+            self._snapshot = (version, frame)
+        return self._snapshot[1]
+
+    def _on_change(self, event: Dict[str, Any]):
+        if not self.subscribers:
+            return
+        frame = json.dumps(event, ensure_ascii=False)
+        lobby_events_total.inc()
+        for sub in self.subscribers.values():
+            if not sub.push(frame):
+                lobby_resyncs_total.inc()
+
+    def subscribe(self, websocket: WebSocket) -> LobbySubscriber:
+        sub = LobbySubscriber(websocket, self.max_queue)
+        sub.push(_SNAPSHOT)
+        self.subscribers[id(websocket)] = sub
+        lobby_subscribers.set(len(self.subscribers))
+        return sub
+
+    def unsubscribe(self, websocket: WebSocket):
+        self.subscribers.pop(id(websocket), None)
+        lobby_subscribers.set(len(self.subscribers))
+
+    async def _send_loop(self, sub: LobbySubscriber):
+        while True:
+            frame = await sub.queue.get()
+            if frame is _SNAPSHOT:
+                frame = self.snapshot_frame()
+            await sub.websocket.send_text(frame)
+
+    async def serve(self, websocket: WebSocket):
+        """处理一个大厅连接直到断开"""
+        await websocket.accept()
+        sub = self.subscribe(websocket)
+        sender = asyncio.create_task(self._send_loop(sub))
+        try:
+            while True:
+                receive = asyncio.create_task(websocket.receive_text())
+                done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+                if sender in done:
+                    # 发送失败（连接已断开）
+                    receive.cancel()
+                    break
+                try:
+                    message = json.loads(receive.result())
+                except ValueError:
+                    continue
+                if isinstance(message, dict) and message.get("type") == "ping":
+                    sub.push(json.dumps({"type": "pong"}))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.unsubscribe(websocket)
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+lobby_feed = LobbyFeed(room_summaries, max_queue=settings.lobby_queue_size)
+gauge_callback("lobby_queue_depth", "大厅推送各连接待发送的事件总数",
+               lambda: sum(sub.queue.qsize() for sub in lobby_feed.subscribers.values()))
+
+
+@router.websocket("/lobby")
+async def lobby_websocket(websocket: WebSocket):
+    """大厅房间列表推送"""
+    # 停机排空期间不接受新连接，让客户端稍后重连到新进程
+    if drain_state.draining:
+        await websocket.accept()
+        await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason=str(RECONNECT_DELAY_MS))
+        return
+    await lobby_feed.serve(websocket)
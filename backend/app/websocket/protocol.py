@@ -0,0 +1,187 @@
+"""
+WebSocket 传输协议
+
+连接建立时通过 WebSocket 子协议（Sec-WebSocket-Protocol）协商：
+- "json"（默认）：文本帧，内容为 JSON
+- "qv1.binary"：二进制帧，结构为 [版本号][事件类型编号][消息体]
+  消息体为去掉 "type" 字段后的字典，使用 CompactCodec 编码（卡牌1字节、常用字段名1字节）
+
+客户端发往服务端的消息两种格式都接受，便于客户端逐步迁移。
+"""
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+from starlette.websockets import WebSocket
+from app.game.compact_codec import CompactCodec, CompactCodecError, TAG_MAP, TAG_LIST, write_varint
+
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "qv1.binary"
+SUPPORTED_PROTOCOLS = (PROTOCOL_BINARY, PROTOCOL_JSON)
+
+FRAME_VERSION = 1
+UNKNOWN_EVENT = 0xFF
+
+# 事件类型枚举（仅可在末尾追加，前端 protocol.ts 需保持一致）
+EVENT_TYPES: List[str] = [
+    "state_snapshot",
+    "card_played",
+    "trick_complete",
+    "score_updated",
+    "round_end",
+    "countdown_updated",
+    "players_updated",
+    "deal_tick",
+    "phase_changed",
+    "bidding_updated",
+    "bottom_updated",
+    "ready_to_start_updated",
+    "ready_for_next_round_updated",
+    "slingshot_failed_notification",
+    "cards_selected",
+    "error",
+    "pong",
+    "ping",
+    "play_card",
+    "make_bid",
+    "pass_bid",
+    "submit_bottom",
+    "finish_bidding",
+    "select_cards",
+    "ready_to_start_game",
+    "cancel_ready_to_start_game",
+    "ready_for_next_round",
+    "auto_deal",
+    "auto_play",
+    "batch",
+]
+
+# 驻留字符串表（仅可在末尾追加，前端 protocol.ts 需保持一致）
+# 前48项编码为单字节，按出现频率排列
+INTERNED_STRINGS: List[str] = [
+    # 高频字段名
+    "player_id", "player_position", "cards", "current_trick", "current_player",
+    "trick_complete", "current_trick_max_player", "play_type", "remaining_time",
+    "countdown_active", "idle_score", "tricks_won", "last_trick", "phase",
+    "players", "id", "name", "position", "cards_count", "players_cards_count",
+    "my_hand", "countdown", "ready_count", "total_players", "ready_players",
+    "message", "player", "card", "dealt_count", "sorted_hand", "bidding",
+    "bidding_cards", "result", "success",
+    # 高频取值
+    "north", "south", "east", "west", "north_south", "east_west",
+    "waiting", "dealing", "bottom", "playing", "scoring",
+    "single", "pair",
+    # 序号48起为扩展区（两字节）
+    "room_id", "room_name", "owner_id", "current_level", "north_south_level",
+    "east_west_level", "dealer_position", "dealer_player_id", "trump_suit",
+    "bottom_cards_count", "dealer_has_bottom", "bottom_pending", "play_time_limit",
+    "ace_reset_enabled", "bottom_cards", "newly_added_bottom_cards",
+    "current_trick_max_player_id", "current_trick_max_player_name", "round_summary",
+    "ready_for_next_round", "ready_to_start", "all_ready", "turn_player_id",
+    "slingshot_failed", "forced_cards", "player_name", "tractor", "slingshot",
+    "finished", "done", "events",
+    "♠", "♥", "♦", "♣",
+]
+
+BATCH_EVENT = "batch"
+
+_codec = CompactCodec(INTERNED_STRINGS)
+_event_index: Dict[str, int] = {t: i for i, t in enumerate(EVENT_TYPES)}
+
+
+class ProtocolError(ValueError):
+    """帧格式错误"""
+
+
+def negotiate_protocol(websocket: WebSocket) -> Optional[str]:
+    """
+    根据客户端提供的子协议列表选择协议
+
+    Returns:
+        服务端选中的子协议（需在 accept 时回传）；客户端未提供子协议时返回None（使用JSON）
+    """
+    offered: Sequence[str] = websocket.scope.get("subprotocols") or []
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return None
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """将消息字典编码为二进制帧"""
+    event_type = message.get("type")
+    code = _event_index.get(event_type, UNKNOWN_EVENT) if isinstance(event_type, str) else UNKNOWN_EVENT
+    if code == UNKNOWN_EVENT:
+        body = message
+    else:
+        body = {k: v for k, v in message.items() if k != "type"}
+    out = bytearray((FRAME_VERSION, code))
+    _codec.encode_into(out, body)
+    return bytes(out)
+
+
+def decode_frame(data: bytes) -> Dict[str, Any]:
+    """将二进制帧解码为消息字典"""
+    if len(data) < 3:
+        raise ProtocolError("帧长度不足")
+    if data[0] != FRAME_VERSION:
+        raise ProtocolError(f"不支持的帧版本: {data[0]}")
+    try:
+        body = _codec.decode(data, 2)
+    except CompactCodecError as e:
+        raise ProtocolError(str(e)) from e
+    if not isinstance(body, dict):
+        raise ProtocolError("消息体必须是字典")
+    code = data[1]
+    if code != UNKNOWN_EVENT:
+        if code >= len(EVENT_TYPES):
+            raise ProtocolError(f"未知事件类型编号: {code}")
+        return {"type": EVENT_TYPES[code], **body}
+    return body
+
+
+def encode_message(message: Union[str, Dict[str, Any]], protocol: Optional[str]) -> Union[str, bytes]:
+    """按连接协议编码一条消息（str 视为已序列化的 JSON）"""
+    if protocol == PROTOCOL_BINARY:
+        if isinstance(message, str):
+            message = json.loads(message)
+        return encode_frame(message)
+    if isinstance(message, str):
+        return message
+    return json.dumps(message)
+
+
+def decode_message(data: Union[str, bytes]) -> Dict[str, Any]:
+    """解码客户端发来的消息（文本为JSON，二进制为紧凑帧）"""
+    if isinstance(data, (bytes, bytearray)):
+        return decode_frame(bytes(data))
+    return json.loads(data)
+
+
+def encode_event(message: Union[str, Dict[str, Any]], protocol: Optional[str]) -> Union[str, bytes]:
+    """编码批量帧中的单个事件（JSON 文本片段，或包含 type 字段的紧凑编码字典）"""
+    if protocol == PROTOCOL_BINARY:
+        if isinstance(message, str):
+            message = json.loads(message)
+        return _codec.encode(message)
+    if isinstance(message, str):
+        return message
+    return json.dumps(message)
+
+
+def assemble_batch(parts: List[Union[str, bytes]], protocol: Optional[str]) -> Union[str, bytes]:
+    """
+    将已编码的事件拼接为一个批量帧 {"type": "batch", "events": [...]}
+
+    Args:
+        parts: encode_event 的结果（每个事件只编码一次，可被多个接收者复用）
+    """
+    if protocol == PROTOCOL_BINARY:
+        out = bytearray((FRAME_VERSION, _event_index[BATCH_EVENT], TAG_MAP))
+        write_varint(out, 1)
+        _codec.encode_into(out, "events")
+        out.append(TAG_LIST)
+        write_varint(out, len(parts))
+        for part in parts:
+            out += part
+        return bytes(out)
+    return '{"type": "batch", "events": [' + ", ".join(parts) + "]}"
@@ -1,12 +1,27 @@
 """
 Main FastAPI application
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.log_config import setup_logging, stop_logging
+from app.core.metrics import exposition, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.core.loop_monitor import loop_monitor, loop_lag_seconds
+from app.core.sharding import ShardRoutingMiddleware, shard_map
 from app.api import router as api_router
 from app.websocket import router as websocket_router
-from app.db.database import init_db
+from app.websocket.game_websocket import dispatcher, manager, recover_rooms, drain_rooms
+from app.api.game import rooms
+from app.services.room_reaper import RoomReaper, CheckpointArchive
+from app.services.room_store import room_store
+from app.services.command_log import command_log
+from app.services.stats_service import stats_writer, stats_flush_seconds
+from app.services.drain import drain_state, install_drain_on_signal
+from app.websocket.broadcast_bus import broadcast_bus
+from app.services.leaderboard import leaderboard
+from app.core.security import password_hasher, require_admin
+from app.services.user_cleanup import user_cleanup
+from app.db.database import init_db, async_session
 
 # Create FastAPI app
 app = FastAPI(
@@ -15,10 +30,57 @@ app = FastAPI(
     description="八十分在线纸牌游戏后端API"
 )
 
+# 空闲房间回收
+room_reaper = RoomReaper(
+    manager,
+    rooms,
+    ttl_seconds=settings.game_timeout_minutes * 60,
+    interval_seconds=settings.room_reap_interval_seconds,
+    archive=CheckpointArchive(settings.room_archive_dir) if settings.room_archive_dir else None,
+    store=room_store,
+    command_log=command_log
+)
+
 @app.on_event("startup")
 async def startup_event():
+    # 日志经队列由后台线程写出
+    setup_logging()
+    # 事件循环延迟监控（阻塞超过阈值时记录调用栈）
+    loop_monitor.start()
     # 初始化数据库
     await init_db()
+    await broadcast_bus.start()
+    # 排行榜从数据库加载一次，之后随战绩写入增量更新（多 worker 时另外定期重新加载）
+    await leaderboard.load(async_session)
+    stats_writer.add_commit_listener(leaderboard.apply)
+    if settings.leaderboard_reload_seconds > 0:
+        leaderboard.start(settings.leaderboard_reload_seconds)
+    stats_writer.start()
+    # 由命令日志恢复上次进程退出时进行中的房间
+    command_log.start()
+    await recover_rooms()
+    room_reaper.start()
+    # 同一进程内再次启动应用（例如测试）时清除上次的排空状态
+    drain_state.reset()
+    # 收到停机信号时先排空房间（写检查点、通知客户端重连），再由 uvicorn 退出
+    install_drain_on_signal(drain_rooms)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await room_reaper.stop()
+    await user_cleanup.stop()
+    await leaderboard.stop()
+    await drain_rooms()
+    await command_log.close()
+    await stats_writer.close()
+    await broadcast_bus.close()
+    await room_store.close()
+    stop_logging()
+    password_hasher.shutdown()
+    await loop_monitor.stop()
+
+# 分片部署时把其他分片的房间请求重定向过去（在CORS之内，重定向响应也带CORS头）
+app.add_middleware(ShardRoutingMiddleware, shard_map=shard_map)
 
 # Add CORS middleware
 app.add_middleware(
@@ -47,6 +109,37 @@ async def health_check():
     """Health check endpoint - supports both GET and HEAD methods"""
     return {"status": "healthy"}
 
+# 以下运行状态接口包含调用栈、文件路径、房间ID等内部信息，只对管理员开放
+
+@app.get("/stats/writer", dependencies=[Depends(require_admin)])
+async def stats_writer_status():
+    """战绩写入队列深度和写入耗时"""
+    return {
+        "queue_depth": stats_writer.queue_depth,
+        "flush_p50": stats_flush_seconds.labels().quantile(0.5),
+        "flush_p99": stats_flush_seconds.labels().quantile(0.99),
+    }
+
+@app.get("/stats/handlers", dependencies=[Depends(require_admin)])
+async def handler_stats():
+    """按消息类型统计的WebSocket处理次数、错误数和耗时分位"""
+    return dispatcher.stats()
+
+@app.get("/stats/loop", dependencies=[Depends(require_admin)])
+async def loop_stats():
+    """事件循环调度延迟分位和最近的阻塞事件（含调用栈、消息类型、房间ID）"""
+    lag = loop_lag_seconds.labels()
+    return {
+        "lag_p50": lag.quantile(0.5),
+        "lag_p99": lag.quantile(0.99),
+        "blocked": loop_monitor.recent(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """所有进程内指标（Prometheus 文本格式）"""
+    return Response(exposition(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,94 @@
+"""
+登录突发负载测试：密码校验对游戏心跳延迟的影响
+
+在同一个事件循环中运行一个模拟游戏心跳（每 interval 秒一次，相当于倒计时/发牌的定时任务），
+同时突发 N 个登录请求（bcrypt 校验），统计心跳的实际延迟：
+- inline：在协程中直接调用 verify_password（原来的登录处理方式），每次校验都阻塞事件循环
+- pooled：通过 password_hasher 在专用线程池中校验，超过排队上限的请求直接返回 503
+
+用法（在 backend 目录下）：
+    python scripts/login_load_test.py --logins 16 --interval 0.01
+    python scripts/login_load_test.py --logins 200 --max-pending 32   # 观察过载时的快速拒绝
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from app.core.security import PasswordHasher, get_password_hash, verify_password
+
+PASSWORD = "secret-password"
+
+
+async def ticker(interval: float, stop: asyncio.Event, lags: list):
+    """模拟游戏心跳，记录每次比预期晚了多久"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - expected)
+
+
+async def run(mode: str, args, hashed: str):
+    hasher = PasswordHasher(max_workers=args.workers, max_pending=args.max_pending)
+    results = {"ok": 0, "rejected": 0}
+    login_latencies = []
+
+    async def login():
+        start = time.perf_counter()
+        try:
+            if mode == "inline":
+                ok = verify_password(PASSWORD, hashed)
+            else:
+                ok = await hasher.verify(PASSWORD, hashed)
+            assert ok
+            results["ok"] += 1
+            login_latencies.append(time.perf_counter() - start)
+        except HTTPException as e:
+            assert e.status_code == 503
+            results["rejected"] += 1
+
+    lags: list = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(args.interval, stop, lags))
+    await asyncio.sleep(args.interval * 20)
+    start = time.perf_counter()
+    if mode != "idle":
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+    else:
+        await asyncio.sleep(1)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    hasher.shutdown()
+
+    lags_ms = sorted(l * 1000 for l in lags)
+    p99 = lags_ms[max(int(len(lags_ms) * 0.99) - 1, 0)]
+    line = (f"[{mode:<6}] 心跳延迟 p50 {statistics.median(lags_ms):7.2f}ms  p99 {p99:8.2f}ms  "
+            f"最大 {lags_ms[-1]:8.2f}ms")
+    if mode != "idle":
+        login_p50 = statistics.median(login_latencies) * 1000 if login_latencies else float("nan")
+        line += (f" | 登录 成功 {results['ok']} 拒绝 {results['rejected']} "
+                 f"耗时 {elapsed:.2f}s  p50 {login_p50:.0f}ms")
+    print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="登录突发负载测试")
+    parser.add_argument("--logins", type=int, default=16, help="同时发起的登录数")
+    parser.add_argument("--interval", type=float, default=0.01, help="游戏心跳间隔（秒）")
+    parser.add_argument("--workers", type=int, default=2, help="哈希线程数")
+    parser.add_argument("--max-pending", type=int, default=64, help="排队上限")
+    args = parser.parse_args()
+
+    hashed = get_password_hash(PASSWORD)
+    for mode in ("idle", "inline", "pooled"):
+        await run(mode, args, hashed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+本地多进程分片启动脚本
+
+在一台机器上启动 N 个 uvicorn 进程（端口 base_port ~ base_port+N-1），
+每个进程设置 SHARD_ID 和 SHARD_URLS，房间按 room_id 一致性哈希分配到各进程。
+请求落到错误的进程时会被重定向（HTTP 307 / WebSocket 关闭码 4010）。
+
+大厅房间列表需要各分片共享房间存储，建议同时设置 ROOM_STORE=redis。
+
+用法（在 backend 目录下）：
+    python scripts/run_shards.py --shards 3 --base-port 8000
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30) -> bool:
+    """等待分片的 /health 可以访问"""
+    deadline = time.time() + timeout
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            urllib.request.urlopen(f"{url}/health", timeout=1)
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地分片集群")
+    parser.add_argument("--shards", type=int, default=2, help="分片（进程）数量")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8000)
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    urls = [f"http://{args.host}:{args.base_port + i}" for i in range(args.shards)]
+    procs = []
+    for shard_id, url in enumerate(urls):
+        env = dict(os.environ, SHARD_ID=str(shard_id), SHARD_URLS=json.dumps(urls))
+        cmd = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", args.host, "--port", str(args.base_port + shard_id),
+        ]
+        procs.append(subprocess.Popen(cmd, cwd=backend_dir, env=env))
+        print(f"分片 {shard_id}: {url} (pid {procs[-1].pid})")
+        # 逐个启动，避免多个进程同时初始化数据库表
+        if not wait_ready(url, procs[-1]):
+            print(f"分片 {shard_id} 启动失败")
+            break
+
+    def shutdown(*_):
+        for p in procs:
+            if p.poll() is None:
+                p.send_signal(signal.SIGINT)
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    if len(procs) < len(urls) or any(p.poll() is not None for p in procs):
+        shutdown()
+    # 任一分片退出则全部停止
+    while all(p.poll() is None for p in procs):
+        time.sleep(0.5)
+    print("有分片退出，停止所有分片")
+    shutdown()
+
+
+if __name__ == "__main__":
+    main()
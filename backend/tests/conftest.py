@@ -0,0 +1,99 @@
+"""
+pytest 公共配置
+
+使用 main.app 的测试（TestClient(app)）启动时会执行 init_db，数据库引擎在导入 app.db.database 时
+按 DATABASE_URL 创建。这里在任何测试模块导入之前把 DATABASE_URL 指向临时目录，
+测试不会在当前目录留下 game.db / game.db-wal / game.db-shm，也不会读写开发用的数据库。
+
+另外提供多个测试共用的假WebSocket（fake_websocket）和对局工厂（make_game）；
+以脚本方式运行的测试直接导入 FakeWebSocket / create_game。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="quatre-vingt-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'game.db')}"
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.game import GameRoom, Player, PlayerPosition
+from app.game.game_state import GameState
+from app.websocket.protocol import decode_frame
+
+SEATS = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
+
+
+class FakeWebSocket:
+    """
+    记录发送内容和关闭码的假WebSocket
+
+    与 Starlette WebSocket 一样不可哈希，并且任意两个连接都"相等"（Mapping 语义），
+    被测代码必须按对象标识区分连接。protocol 为二进制协议时 send_bytes 收到的帧解码后记录；
+    fail=True 模拟已经断开的连接，发送时抛出异常。
+    """
+    __hash__ = None
+
+    def __init__(self, room_id="room", protocol=None, fail=False):
+        self.state = SimpleNamespace(protocol=protocol, room_id=room_id)
+        self.sent = []
+        self.fail = fail
+        self.closed = None
+
+    def __eq__(self, other):
+        return isinstance(other, FakeWebSocket)
+
+    async def send_text(self, data):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(decode_frame(data))
+
+    async def close(self, code=1000, reason=None):
+        self.closed = (code, reason)
+
+
+def create_game(name="测试房间", registered=False, ready=True, **room_fields) -> GameState:
+    """
+    创建坐满四人的对局
+
+    Args:
+        name: 房间名
+        registered: 为 True 时南北两家是登录用户，东西两家是游客；否则四家都是游客
+        ready: 是否让四家都准备（全部准备后自动开始发牌）
+        room_fields: 传给 GameRoom 的其他字段，例如 play_time_limit
+    """
+    room = GameRoom(id=str(uuid.uuid4()), name=name, **room_fields)
+    for i, pos in enumerate(SEATS):
+        player_id = str(uuid.uuid4())
+        user_id = player_id if registered and i % 2 == 0 else None
+        room.players.append(Player(id=player_id, name=f"玩家{i}", position=pos,
+                                   token=str(uuid.uuid4()), user_id=user_id))
+    room.owner_id = room.players[0].id
+    gs = GameState(room)
+    if ready:
+        for p in room.players:
+            gs.ready_to_start_game(p.id)
+    return gs
+
+
+@pytest.fixture
+def fake_websocket():
+    """假WebSocket类，测试里按需构造：fake_websocket(room_id=..., protocol=..., fail=...)"""
+    return FakeWebSocket
+
+
+@pytest.fixture
+def make_game():
+    """对局工厂，参数见 create_game"""
+    return create_game
@@ -0,0 +1,132 @@
+"""
+测试跨进程房间事件广播总线
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.websocket.broadcast_bus import InProcessBroadcastBus, RedisBroadcastBus
+from app.websocket.connection_registry import ConnectionInfo
+from app.websocket.game_websocket import ConnectionManager
+from app.game.game_state import GameState
+from app.models.game import Card, GameRoom, Player, PlayerPosition, Rank, Suit
+
+
+def _types(frames):
+    types = []
+    for frame in frames:
+        events = frame["events"] if frame["type"] == "batch" else [frame]
+        types.extend(e["type"] for e in events)
+    return types
+
+
+def test_events_reach_connections_on_other_nodes(fake_websocket):
+    """A节点的房间事件投递到B节点的连接；定向socket的事件不跨节点"""
+    peers = []
+    node_a = ConnectionManager(InProcessBroadcastBus(peers))
+    node_b = ConnectionManager(InProcessBroadcastBus(peers))
+    player_a, spectator_b, player_b = fake_websocket(), fake_websocket(), fake_websocket()
+    node_a.connections.add("room", ConnectionInfo(player_a, "p1"))
+    node_b.connections.add("room", ConnectionInfo(spectator_b, "spectator"))
+    node_b.connections.add("room", ConnectionInfo(player_b, "p1"))
+
+    async def run():
+        async with node_a.batch("room"):
+            await node_a.broadcast_to_room({"type": "card_played", "cards": ["10♥"]}, "room")
+            await node_a.send_personal_message({"type": "pong"}, player_a)
+            await node_a.send_to_player({"type": "cards_selected"}, "room", "p1")
+            await node_a.broadcast_to_room({"type": "score_updated", "idle_score": 5}, "room", exclude_player_id="p1")
+        # 不在批量范围内的广播同样会发布
+        await node_a.broadcast_to_room({"type": "countdown_updated"}, "room")
+
+    asyncio.run(run())
+
+    assert _types(player_a.sent) == ["card_played", "pong", "cards_selected", "countdown_updated"]
+    # 同一次操作在其他节点上也合并为一帧
+    assert len(spectator_b.sent) == 2
+    assert _types(spectator_b.sent) == ["card_played", "score_updated", "countdown_updated"]
+    assert _types(player_b.sent) == ["card_played", "cards_selected", "countdown_updated"]
+    assert spectator_b.sent[0]["events"][0]["cards"] == ["10♥"]
+    print("进程内广播总线测试通过")
+
+
+def test_snapshots_reach_players_on_other_nodes(fake_websocket):
+    """每个玩家的快照按玩家定向发布，其他节点上的玩家收到自己的手牌"""
+    peers = []
+    node_a = ConnectionManager(InProcessBroadcastBus(peers))
+    node_b = ConnectionManager(InProcessBroadcastBus(peers))
+    room = GameRoom(id="room", name="room", players=[
+        Player(id="p1", name="甲", position=PlayerPosition.NORTH),
+        Player(id="p2", name="乙", position=PlayerPosition.WEST),
+    ])
+    node_a.game_states["room"] = GameState(room)
+    room.players[1].cards = [Card(rank=Rank.ACE, suit=Suit.SPADES)]
+    player_a, player_b = fake_websocket(), fake_websocket()
+    node_a.connections.add("room", ConnectionInfo(player_a, "p1"))
+    node_b.connections.add("room", ConnectionInfo(player_b, "p2"))
+
+    async def run():
+        await node_a.send_snapshot("room")
+        async with node_a.batch("room"):
+            await node_a.broadcast_to_room({"type": "card_played"}, "room")
+            await node_a.send_snapshot("room")
+
+    asyncio.run(run())
+
+    assert [f["type"] for f in player_a.sent] == ["state_snapshot", "batch"]
+    assert player_a.sent[0]["my_hand"] == []
+    assert _types(player_b.sent) == ["state_snapshot", "card_played", "state_snapshot"]
+    assert player_b.sent[0]["room_id"] == "room" and player_b.sent[0]["my_hand"] == [str(room.players[1].cards[0])]
+    print("跨节点快照测试通过")
+
+
+def test_redis_bus_batches_and_preserves_order():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        server = fakeredis.FakeServer()
+        bus_a = RedisBroadcastBus(fakeredis.FakeAsyncRedis(server=server))
+        bus_b = RedisBroadcastBus(fakeredis.FakeAsyncRedis(server=server))
+        received = []
+        own = []
+
+        async def handler_b(room_id, entries):
+            received.append((room_id, [e[0]["seq"] for e in entries], entries[0][1:]))
+
+        async def handler_a(room_id, entries):
+            own.append(room_id)
+
+        bus_a.set_handler(handler_a)
+        bus_b.set_handler(handler_b)
+        await bus_a.start()
+        await bus_b.start()
+
+        for seq in range(5):
+            await bus_a.publish("room", [({"type": "card_played", "seq": seq}, "room", None)])
+        await bus_a.publish("room", [({"type": "error", "seq": 5}, "player", "p1"), ('{"type": "pong", "seq": 6}', "player", "p1")])
+
+        for _ in range(100):
+            if len(received) == 6:
+                break
+            await asyncio.sleep(0.01)
+        await bus_a.close()
+        await bus_b.close()
+        return received, own
+
+    received, own = asyncio.run(run())
+    assert [seqs for _, seqs, _ in received] == [[0], [1], [2], [3], [4], [5, 6]]
+    assert received[0][2] == ("room", None)
+    assert received[-1][2] == ("player", "p1")
+    # 节点不会收到自己发布的事件
+    assert own == []
+    print("Redis广播总线测试通过")
+
+
+if __name__ == "__main__":
+    from conftest import FakeWebSocket
+
+    test_events_reach_connections_on_other_nodes(FakeWebSocket)
+    test_snapshots_reach_players_on_other_nodes(FakeWebSocket)
+    test_redis_bus_batches_and_preserves_order()
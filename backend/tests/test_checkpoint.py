@@ -0,0 +1,139 @@
+"""
+测试 GameState 检查点（紧凑二进制与调试用JSON）
+"""
+import sys
+import os
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.game.game_state import GameState
+from app.game.checkpoint import (
+    dump_checkpoint, load_checkpoint, checkpoint_to_json, checkpoint_from_json,
+    CheckpointError, CHECKPOINT_MAGIC,
+)
+
+
+def _assert_same(a: GameState, b: GameState):
+    assert checkpoint_to_json(a) == checkpoint_to_json(b)
+
+
+def test_roundtrip_while_dealing(make_game):
+    """发牌途中保存：发牌区、发牌顺序和已发的手牌都能恢复"""
+    gs = make_game("检查点测试", registered=True, play_time_limit=20)
+    for _ in range(37):
+        gs.deal_tick()
+    restored = load_checkpoint(dump_checkpoint(gs))
+    _assert_same(gs, restored)
+    assert restored.dealing_deck == gs.dealing_deck
+    # 恢复后继续发牌，两边结果一致
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+        restored.deal_tick()
+    _assert_same(gs, restored)
+    print("✓ 发牌途中检查点正确")
+
+
+def test_roundtrip_mid_trick(make_game):
+    """出牌途中保存：出牌系统的当前墩、领出牌和手牌引用都能恢复"""
+    gs = make_game("检查点测试", registered=True, play_time_limit=20)
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+    assert gs.finish_bidding()
+    for _ in range(6):
+        assert gs.auto_play()["success"]
+    assert gs.card_playing_system.current_trick
+
+    data = dump_checkpoint(gs)
+    assert data.startswith(CHECKPOINT_MAGIC)
+    print(f"  检查点大小: {len(data)} 字节")
+    assert len(data) < 1024
+
+    restored = load_checkpoint(data)
+    _assert_same(gs, restored)
+    cps = restored.card_playing_system
+    assert cps.led_cards == gs.card_playing_system.led_cards
+    assert cps.led_card_type == gs.card_playing_system.led_card_type
+    # 出牌系统看到的手牌就是玩家手牌本身
+    for p in restored.room.players:
+        assert cps.all_players_hands[p.position] is p.cards
+
+    # 恢复后两边继续自动出牌，状态保持一致（自动出牌会随机打乱候选牌，固定随机种子）
+    for i in range(40):
+        random.seed(i)
+        r1 = gs.auto_play()
+        random.seed(i)
+        r2 = restored.auto_play()
+        assert r1["success"] == r2["success"]
+        _assert_same(gs, restored)
+    print("✓ 出牌途中检查点正确")
+
+
+def test_json_debug_form(make_game):
+    """调试用JSON形式可以序列化并恢复"""
+    gs = make_game("检查点测试", registered=True, play_time_limit=20)
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+    gs.finish_bidding()
+    gs.auto_play()
+    debug = checkpoint_to_json(gs)
+    text = json.dumps(debug, ensure_ascii=False)
+    restored = checkpoint_from_json(json.loads(text))
+    _assert_same(gs, restored)
+    assert debug["players"][0]["cards"] == [str(c) for c in gs.room.players[0].cards]
+    print("✓ JSON调试形式正确")
+
+
+def test_times_independent_of_host_timezone(make_game):
+    """在一个时区的主机上保存、另一个时区的主机上恢复，时间不变；带时区的时间恢复后仍带时区"""
+    gs = make_game("检查点测试", registered=True, play_time_limit=20)
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    gs.room.created_at = created_at
+    original_tz = os.environ.get("TZ")
+    try:
+        os.environ["TZ"] = "Asia/Shanghai"
+        time.tzset()
+        data = dump_checkpoint(gs)
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        assert load_checkpoint(data).room.created_at == created_at
+
+        aware = datetime(2024, 5, 1, 12, 30, tzinfo=timezone(timedelta(hours=8)))
+        gs.room.created_at = aware
+        restored = load_checkpoint(dump_checkpoint(gs)).room.created_at
+        assert restored == aware and restored.utcoffset() == timedelta(hours=8)
+    finally:
+        if original_tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = original_tz
+        time.tzset()
+    print("✓ 检查点时间与主机时区无关")
+
+
+def test_rejects_bad_data(make_game):
+    """格式错误或版本不支持时抛出 CheckpointError"""
+    data = dump_checkpoint(make_game("检查点测试", registered=True, play_time_limit=20))
+    with pytest.raises(CheckpointError):
+        load_checkpoint(b"XXXX" + data[4:])
+    with pytest.raises(CheckpointError):
+        load_checkpoint(data[:4] + bytes([99]) + data[5:])
+    with pytest.raises(CheckpointError):
+        load_checkpoint(data[:20])
+    with pytest.raises(CheckpointError):
+        checkpoint_from_json({"version": 99})
+    print("✓ 错误数据被拒绝")
+
+
+if __name__ == "__main__":
+    from conftest import create_game
+
+    test_roundtrip_while_dealing(create_game)
+    test_roundtrip_mid_trick(create_game)
+    test_json_debug_form(create_game)
+    test_times_independent_of_host_timezone(create_game)
+    test_rejects_bad_data(create_game)
+    print("\n所有测试通过！")
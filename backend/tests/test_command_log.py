@@ -0,0 +1,204 @@
+"""
+测试房间命令日志（组提交写入、检查点截断、崩溃后重放恢复）
+"""
+import sys
+import os
+import asyncio
+import random
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.game.game_state import GameState
+from app.game.checkpoint import dump_checkpoint, checkpoint_to_json
+from app.services import command_log as command_log_module
+from app.services.command_log import CommandLog, rebuild_game_state, apply_command, command_log_errors_total
+
+
+async def _play_logged(log: CommandLog, gs: GameState, plays: int):
+    """模拟处理函数：开局写检查点，之后每条被接受的命令写入日志"""
+    room_id = gs.room.id
+    for p in gs.room.players:
+        gs.ready_to_start_game(p.id)
+    log.checkpoint(room_id, dump_checkpoint(gs))
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+        log.append(room_id, "deal_tick")
+    gs.finish_bidding()
+    log.append(room_id, "finish_bidding")
+    for i in range(plays):
+        # 自动出牌的选牌是随机的，日志中记录实际打出的牌
+        player = gs.get_player_by_position(gs.current_player)
+        random.seed(i)
+        result = gs.auto_play()
+        assert result["success"]
+        log.append(room_id, "play_card", player.id, result["played_cards"])
+        if len(gs.current_trick_with_player) == 4:
+            gs.current_trick_with_player = []
+
+
+def test_recover_from_checkpoint_and_replay(tmp_path, make_game):
+    """进程重启后由检查点和命令重建出完全相同的 GameState"""
+    async def run():
+        log = CommandLog(str(tmp_path))
+        log.start()
+        gs = make_game("日志测试", ready=False)
+        await _play_logged(log, gs, 23)
+        await log.close()
+
+        reopened = CommandLog(str(tmp_path))
+        assert reopened.room_ids() == [gs.room.id]
+        restored = rebuild_game_state(reopened.read(gs.room.id))
+        assert checkpoint_to_json(restored) == checkpoint_to_json(gs)
+    asyncio.run(run())
+    print("✓ 检查点+重放恢复正确")
+
+
+def test_checkpoint_truncates_log(tmp_path, make_game):
+    """写入检查点后之前的命令被丢弃"""
+    async def run():
+        log = CommandLog(str(tmp_path))
+        gs = make_game("日志测试", ready=False)
+        await _play_logged(log, gs, 4)
+        await log.flush()
+        assert len(log.read(gs.room.id)) == 1 + 100 + 1 + 4
+        log.checkpoint(gs.room.id, dump_checkpoint(gs))
+        await log.flush()
+        records = log.read(gs.room.id)
+        assert [kind for kind, _ in records] == ["k"]
+        assert checkpoint_to_json(rebuild_game_state(records)) == checkpoint_to_json(gs)
+        log.drop(gs.room.id)
+        await log.close()
+        assert log.room_ids() == []
+    asyncio.run(run())
+    print("✓ 检查点截断和删除正确")
+
+
+def test_group_commit(tmp_path, monkeypatch):
+    """同一批次内每个文件只 fsync 一次，append 不等待写盘"""
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(command_log_module.os, "fsync", lambda fd: (fsyncs.append(fd), real_fsync(fd)))
+
+    async def run():
+        log = CommandLog(str(tmp_path), flush_interval=0.05)
+        log.start()
+        for i in range(200):
+            log.append(f"room{i % 2}", "pass_bid", "p1")
+        # 还没有写盘
+        assert log.read("room0") == []
+        await asyncio.sleep(0.2)
+        assert len(log.read("room0")) == 100
+        assert len(log.read("room1")) == 100
+        assert len(fsyncs) == 2
+        await log.close()
+    asyncio.run(run())
+    print("✓ 组提交正确")
+
+
+def test_close_waits_for_inflight_write(tmp_path, monkeypatch):
+    """close 时后台任务正在写入线程中 fsync：等这一批写完再写剩余记录、关闭文件"""
+    writing = threading.Event()
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        # 只有第一批的 fsync 较慢
+        if not writing.is_set():
+            writing.set()
+            time.sleep(0.2)
+        real_fsync(fd)
+    monkeypatch.setattr(command_log_module.os, "fsync", slow_fsync)
+
+    async def run():
+        log = CommandLog(str(tmp_path), flush_interval=0)
+        log.start()
+        for _ in range(10):
+            log.append("room", "pass_bid", "p1")
+        while not writing.is_set():
+            await asyncio.sleep(0.005)
+        # 第一批还在写入线程中，又来了一条
+        log.append("room", "play_card", "p2")
+        errors_before = command_log_errors_total.labels().value
+        await log.close()
+        # 写入线程不会在 close 返回之后才结束
+        await asyncio.sleep(0.3)
+        assert command_log_errors_total.labels().value == errors_before and log.broken_rooms() == []
+        records = log.read("room")
+        assert len(records) == 11 and records[-1][1][0] == "play_card"
+    asyncio.run(run())
+    print("✓ 关闭时等待正在进行的写入")
+
+
+def test_write_failure_stops_log_until_checkpoint(tmp_path, monkeypatch, make_game):
+    """写入失败后该房间不再追加命令（不留下中间缺失的日志），下一次检查点后恢复"""
+    real_fsync = os.fsync
+    failing = {"on": False}
+
+    def fsync(fd):
+        if failing["on"]:
+            raise OSError(28, "No space left on device")
+        real_fsync(fd)
+    monkeypatch.setattr(command_log_module.os, "fsync", fsync)
+
+    async def run():
+        log = CommandLog(str(tmp_path))
+        gs = make_game("日志测试", ready=False)
+        room_id = gs.room.id
+        log.checkpoint(room_id, dump_checkpoint(gs))
+        log.append(room_id, "pass_bid", "p1")
+        await log.flush()
+
+        failing["on"] = True
+        log.append(room_id, "pass_bid", "p2")
+        await log.flush()
+        failing["on"] = False
+        assert log.broken_rooms() == [room_id]
+        # 失败之后的命令不会接在缺失的记录后面
+        log.append(room_id, "pass_bid", "p3")
+        await log.flush()
+        players = [data[1] for kind, data in log.read(room_id) if kind == "c"]
+        assert "p3" not in players and players[0] == "p1"
+
+        log.checkpoint(room_id, dump_checkpoint(gs))
+        log.append(room_id, "pass_bid", "p4")
+        await log.flush()
+        assert log.broken_rooms() == []
+        assert [kind for kind, _ in log.read(room_id)] == ["k", "c"]
+        await log.close()
+    asyncio.run(run())
+    print("✓ 写入失败后停止追加直到下一次检查点")
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    """崩溃时写了一半的最后一条记录被丢弃"""
+    async def run():
+        log = CommandLog(str(tmp_path))
+        log.append("room", "pass_bid", "p1")
+        log.append("room", "pass_bid", "p2")
+        await log.close()
+    asyncio.run(run())
+    path = os.path.join(str(tmp_path), "room.wal")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-3])
+    records = CommandLog(str(tmp_path)).read("room")
+    assert records == [("c", ["pass_bid", "p1", None])]
+    print("✓ 不完整的记录被丢弃")
+
+
+def test_disabled_log_is_noop(tmp_path):
+    log = CommandLog(None)
+    log.append("room", "pass_bid", "p1")
+    assert not log.enabled
+    assert log.room_ids() == []
+    asyncio.run(log.close())
+
+
+def test_unknown_command_rejected(make_game):
+    gs = make_game("日志测试", ready=False)
+    try:
+        apply_command(gs, "teleport", None, None)
+        assert False, "应该抛出异常"
+    except ValueError:
+        pass
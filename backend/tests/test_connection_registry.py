@@ -0,0 +1,60 @@
+"""
+测试WebSocket连接注册表的索引与多连接支持
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.websocket.connection_registry import ConnectionInfo, ConnectionRegistry
+from app.websocket.game_websocket import ConnectionManager
+
+
+def test_indexes_and_set_semantics(fake_websocket):
+    registry = ConnectionRegistry()
+    a1, a2, b = fake_websocket(), fake_websocket(), fake_websocket()
+    assert registry.add("room", ConnectionInfo(a1, "a"))
+    assert registry.add("room", ConnectionInfo(a2, "a"))
+    assert registry.add("room", ConnectionInfo(b, "b"))
+    # 同一个websocket不会重复登记
+    assert not registry.add("room", ConnectionInfo(a1, "a"))
+
+    assert len(registry) == 3
+    assert registry.room_size("room") == 3
+    assert registry.get(a2).websocket is a2
+    assert registry.get(a2, "other") is None
+    assert [c.websocket for c in registry.of_player("room", "a")] == [a1, a2]
+
+    assert registry.remove(a1).player_id == "a"
+    assert registry.remove(a1) is None
+    assert registry.has_player("room", "a")
+    registry.remove(a2)
+    assert not registry.has_player("room", "a")
+    registry.remove(b)
+    assert "room" not in registry and len(registry) == 0
+    print("连接注册表索引测试通过")
+
+
+def test_send_to_player_reaches_every_socket(fake_websocket):
+    """同一玩家的多个连接都能收到定向消息，发送失败的连接被移除"""
+    manager = ConnectionManager()
+    tab1, tab2, broken, other = fake_websocket(), fake_websocket(), fake_websocket(fail=True), fake_websocket()
+    for ws, pid in [(tab1, "a"), (tab2, "a"), (broken, "a"), (other, "b")]:
+        manager.connections.add("room", ConnectionInfo(ws, pid))
+
+    async def run():
+        await manager.send_to_player({"type": "pong"}, "room", "a")
+        await manager.broadcast_to_room({"type": "score_updated", "idle_score": 5}, "room", exclude_player_id="a")
+
+    asyncio.run(run())
+    assert tab1.sent == [{"type": "pong"}] and tab2.sent == [{"type": "pong"}]
+    assert other.sent == [{"type": "score_updated", "idle_score": 5}]
+    assert manager.get_connection_info("room", broken) is None
+    assert manager.connections.room_size("room") == 3
+
+
+if __name__ == "__main__":
+    from conftest import FakeWebSocket
+
+    test_indexes_and_set_semantics(FakeWebSocket)
+    test_send_to_player_reaches_every_socket(FakeWebSocket)
@@ -0,0 +1,66 @@
+"""
+测试数据库引擎配置（地址规范化、SQLite pragma、单连接写引擎）
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import text
+from app.db.database import normalize_database_url, create_engine_from_url, is_sqlite, DEFAULT_DATABASE_URL
+
+
+def test_normalize_database_url():
+    assert normalize_database_url(None) == DEFAULT_DATABASE_URL
+    assert normalize_database_url("sqlite:///./game.db") == "sqlite+aiosqlite:///./game.db"
+    assert normalize_database_url("postgres://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert normalize_database_url("postgresql://u:p@h:5432/db") == "postgresql+asyncpg://u:p@h:5432/db"
+    # 已指定异步驱动的地址保持不变
+    assert normalize_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    with pytest.raises(ValueError):
+        normalize_database_url("game.db")
+    assert is_sqlite("sqlite+aiosqlite:///x.db") and not is_sqlite("postgresql+asyncpg://h/db")
+    print("✓ 地址规范化正确")
+
+
+def test_sqlite_pragmas_and_writer(tmp_path):
+    url = normalize_database_url(f"sqlite:///{tmp_path / 'game.db'}")
+
+    async def run():
+        engine = create_engine_from_url(url)
+        writer = create_engine_from_url(url, writer=True)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+        assert writer.pool.size() == 1
+        # 写引擎与普通引擎可以同时使用（WAL 下读不阻塞写）
+        async with writer.begin() as conn:
+            await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            await conn.execute(text("INSERT INTO t VALUES (1)"))
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT x FROM t"))).scalar() == 1
+        await engine.dispose()
+        await writer.dispose()
+    asyncio.run(run())
+    print("✓ SQLite pragma 与写引擎正确")
+
+
+def test_memory_sqlite_skips_wal():
+    async def run():
+        engine = create_engine_from_url("sqlite+aiosqlite://")
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "memory"
+        await engine.dispose()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_normalize_database_url()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_sqlite_pragmas_and_writer(Path(tmp))
+    test_memory_sqlite_skips_wal()
+    print("\n所有测试通过！")
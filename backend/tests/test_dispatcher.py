@@ -0,0 +1,109 @@
+"""
+测试表驱动的WebSocket消息分发器
+"""
+import sys
+import os
+import asyncio
+from typing import List, Optional
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from app.websocket.dispatcher import MessageDispatcher, MessageContext
+
+
+class BidMessage(BaseModel):
+    cards: Optional[List[str]] = None
+
+
+def _make_dispatcher():
+    errors = []
+    handled = []
+
+    async def send_error(ctx, message):
+        errors.append(message)
+
+    dispatcher = MessageDispatcher(send_error)
+
+    @dispatcher.handler("test_ping")
+    async def handle_ping(ctx, message):
+        handled.append(("test_ping", message))
+
+    @dispatcher.handler("test_bid", BidMessage)
+    async def handle_bid(ctx, msg):
+        handled.append(("test_bid", msg.cards))
+
+    @dispatcher.handler("test_boom")
+    async def handle_boom(ctx, message):
+        raise RuntimeError("boom")
+
+    return dispatcher, handled, errors
+
+
+def test_dispatch_routes_and_validates():
+    """按类型分发，带schema的消息先校验"""
+    dispatcher, handled, errors = _make_dispatcher()
+    ctx = MessageContext(websocket=None, room_id="room", player_id="p1")
+
+    async def run():
+        await dispatcher.dispatch(ctx, {"type": "test_ping"})
+        await dispatcher.dispatch(ctx, {"type": "test_bid", "cards": ["10♥", "10♥"]})
+        await dispatcher.dispatch(ctx, {"type": "test_bid", "cards": "not-a-list"})
+        await dispatcher.dispatch(ctx, {"type": "no_such_type"})
+        await dispatcher.dispatch(ctx, {"type": "test_boom"})
+
+    asyncio.run(run())
+
+    assert handled == [("test_ping", {"type": "test_ping"}), ("test_bid", ["10♥", "10♥"])]
+    assert len(errors) == 3
+    assert errors[0].startswith("消息格式错误")
+    assert errors[1] == "Unknown message type: no_such_type"
+    assert errors[2] == "服务器处理消息失败"
+    print("消息分发测试通过")
+
+
+def test_stats_per_type():
+    """统计按类型记录次数、错误数和耗时"""
+    dispatcher, _, _ = _make_dispatcher()
+    ctx = MessageContext(websocket=None, room_id="room", player_id="p1")
+    before = dispatcher.stats().get("test_ping", {}).get("count", 0)
+
+    async def run():
+        for _ in range(5):
+            await dispatcher.dispatch(ctx, {"type": "test_ping"})
+        await dispatcher.dispatch(ctx, {"type": "test_boom"})
+
+    asyncio.run(run())
+    stats = dispatcher.stats()
+    assert stats["test_ping"]["count"] == before + 5
+    assert stats["test_ping"]["p99_ms"] is not None
+    assert stats["test_boom"]["errors"] >= 1
+    print(stats["test_ping"])
+
+
+def test_duplicate_registration_rejected():
+    dispatcher, _, _ = _make_dispatcher()
+    try:
+        @dispatcher.handler("test_ping")
+        async def again(ctx, message):
+            pass
+    except ValueError:
+        return
+    raise AssertionError("重复注册应当报错")
+
+
+def test_game_dispatcher_covers_all_message_types():
+    """游戏WebSocket注册了所有前端会发送的消息类型"""
+    from app.websocket.game_websocket import dispatcher
+    expected = {
+        "ping", "ready_to_start_game", "cancel_ready_to_start_game", "deal_tick", "make_bid",
+        "pass_bid", "submit_bottom", "finish_bidding", "select_cards", "play_card",
+        "auto_deal", "auto_play", "ready_for_next_round",
+    }
+    assert expected <= set(dispatcher.message_types)
+
+
+if __name__ == "__main__":
+    test_dispatch_routes_and_validates()
+    test_stats_per_type()
+    test_duplicate_registration_rejected()
+    test_game_dispatcher_covers_all_message_types()
@@ -0,0 +1,149 @@
+"""
+测试停机排空与交接：暂停倒计时、写检查点、通知客户端重连，新进程恢复房间
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import HTTPException
+from app.game.game_state import GameState
+from app.game.checkpoint import checkpoint_to_json
+from app.services.command_log import CommandLog
+from app.services.room_store import InMemoryRoomStore
+from app.services.drain import drain_state
+from app.websocket import game_websocket
+from app.websocket.game_websocket import ConnectionInfo
+from app.websocket.dispatcher import MessageContext
+
+
+def _playing_game(make_game) -> GameState:
+    """四人都准备并发完牌、进入出牌阶段的对局"""
+    gs = make_game("排空测试", play_time_limit=20)
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+    gs.finish_bidding()
+    return gs
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    """替换为临时的命令日志和房间存储，并在结束后清理全局状态"""
+    log = CommandLog(str(tmp_path))
+    store = InMemoryRoomStore()
+    monkeypatch.setattr(game_websocket, "command_log", log)
+    monkeypatch.setattr(game_websocket, "room_store", store)
+    manager = game_websocket.manager
+    yield log, store
+    drain_state.reset()
+    for room_id in list(manager.game_states):
+        asyncio.run(manager.release_room(room_id))
+        game_websocket.rooms.pop(room_id, None)
+
+
+def test_drain_then_resume(isolated, make_game, fake_websocket):
+    log, store = isolated
+    manager = game_websocket.manager
+
+    async def run():
+        gs = _playing_game(make_game)
+        room_id = gs.room.id
+        game_websocket.rooms[room_id] = gs.room
+        manager.game_states[room_id] = gs
+        ws = fake_websocket(room_id)
+        manager.connections.add(room_id, ConnectionInfo(ws, gs.room.players[0].id, None))
+        await manager.start_countdown(room_id)
+        gs.current_countdown = 7  # 倒计时进行到一半
+
+        assert await game_websocket.drain_rooms(reconnect_delay_ms=1500) == 1
+        assert drain_state.draining and drain_state.drained
+        assert room_id not in manager.countdown_tasks
+        # 客户端收到重连提示并以 1012 关闭
+        assert ws.sent[-1] == {"type": "server_restarting", "retry_after_ms": 1500}
+        assert ws.closed == (1012, "1500")
+        # 排空期间拒绝创建/加入房间
+        with pytest.raises(HTTPException) as exc:
+            drain_state.reject_if_draining()
+        assert exc.value.status_code == 503
+        # 再次调用为空操作
+        assert await game_websocket.drain_rooms() == 0
+
+        expected = checkpoint_to_json(gs)
+        assert await store.load_checkpoint(room_id)
+        assert [kind for kind, _ in log.read(room_id)] == ["k"]
+
+        # 模拟新进程：内存清空后由检查点恢复
+        manager.connections.remove(ws)
+        await manager.release_room(room_id)
+        game_websocket.rooms.pop(room_id)
+        drain_state.reset()
+        assert await game_websocket.recover_rooms() == 1
+        restored = manager.game_states[room_id]
+        assert checkpoint_to_json(restored) == expected
+        assert game_websocket.rooms[room_id] is restored.room
+        # 倒计时从剩余时间继续，而不是重置
+        assert room_id in manager.countdown_tasks
+        assert restored.current_countdown == 7
+        await manager.release_room(room_id)
+    asyncio.run(run())
+    print("✓ 排空与恢复正确")
+
+
+def test_game_actions_rejected_while_draining(isolated, monkeypatch, make_game, fake_websocket):
+    """排空过程中（等待战绩写入时）收到的出牌不会修改已暂停的房间"""
+    log, store = isolated
+    manager = game_websocket.manager
+
+    async def run():
+        gs = _playing_game(make_game)
+        room_id = gs.room.id
+        game_websocket.rooms[room_id] = gs.room
+        manager.game_states[room_id] = gs
+        player = gs.get_player_by_position(gs.current_player)
+        ws = fake_websocket(room_id)
+        manager.connections.add(room_id, ConnectionInfo(ws, player.id, None))
+        await manager.start_countdown(room_id)
+        before = checkpoint_to_json(gs)
+
+        async def flush(timeout):
+            ctx = MessageContext(ws, room_id, player.id, gs.room)
+            async with manager.batch(room_id):
+                await game_websocket.dispatcher.dispatch(ctx, {"type": "play_card", "cards": [str(player.cards[0])]})
+                await game_websocket.dispatcher.dispatch(ctx, {"type": "ping"})
+        monkeypatch.setattr(game_websocket.stats_writer, "flush", flush)
+
+        await game_websocket.drain_rooms()
+        assert checkpoint_to_json(gs) == before
+        assert room_id not in manager.countdown_tasks
+        assert checkpoint_to_json(game_websocket.load_checkpoint(await store.load_checkpoint(room_id))) == before
+        return ws
+
+    ws = asyncio.run(run())
+    batch = next(m for m in ws.sent if m["type"] == "batch")
+    assert [e["type"] for e in batch["events"]] == ["error", "pong"]
+    assert ws.sent[-1]["type"] == "server_restarting"
+    print("✓ 排空期间拒绝游戏操作")
+
+
+def test_store_checkpoint_used_once(isolated, make_game):
+    """房间存储中的交接检查点恢复后被清除，不会再次恢复旧状态"""
+    log, store = isolated
+    manager = game_websocket.manager
+
+    async def run():
+        gs = _playing_game(make_game)
+        room_id = gs.room.id
+        manager.game_states[room_id] = gs
+        await game_websocket.drain_rooms()
+        await manager.release_room(room_id)
+        # 只有房间存储（不同机器上的新进程没有本地命令日志）
+        for name in log.room_ids():
+            log.drop(name)
+        await log.flush()
+        assert await game_websocket.recover_rooms() == 1
+        assert await store.load_checkpoint(room_id) == b""
+        await manager.release_room(room_id)
+        game_websocket.rooms.pop(room_id, None)
+        assert await game_websocket.recover_rooms() == 0
+    asyncio.run(run())
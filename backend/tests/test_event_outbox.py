@@ -0,0 +1,88 @@
+"""
+测试房间发件箱：一次操作产生的多个事件合并为每个接收者一帧
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.websocket.game_websocket import ConnectionManager, ConnectionInfo
+from app.websocket.protocol import PROTOCOL_BINARY
+
+
+def _make_manager(fake_websocket):
+    manager = ConnectionManager()
+    sockets = {
+        "p1": fake_websocket(),
+        "p2": fake_websocket(protocol=PROTOCOL_BINARY),
+        "p3": fake_websocket(),
+    }
+    for pid, ws in sockets.items():
+        manager.connections.add("room", ConnectionInfo(ws, pid, ws.state.protocol))
+    return manager, sockets
+
+
+def test_batch_merges_events_per_recipient(fake_websocket):
+    """批量范围内的广播、定向消息、个人消息按接收者合并"""
+    manager, sockets = _make_manager(fake_websocket)
+
+    async def run():
+        async with manager.batch("room"):
+            await manager.broadcast_to_room({"type": "card_played", "cards": ["10♥"]}, "room")
+            await manager.broadcast_to_room({"type": "trick_complete", "idle_score": 10}, "room", exclude_player_id="p3")
+            await manager.send_to_player({"type": "error", "message": "仅p2"}, "room", "p2")
+            await manager.send_personal_message({"type": "pong"}, sockets["p1"])
+            # 嵌套范围不会提前发送
+            async with manager.batch("room"):
+                await manager.broadcast_to_room({"type": "score_updated", "idle_score": 10}, "room")
+            assert all(not ws.sent for ws in sockets.values())
+
+    asyncio.run(run())
+
+    for ws in sockets.values():
+        assert len(ws.sent) == 1, "每个接收者只应收到一帧"
+
+    p1 = sockets["p1"].sent[0]
+    assert p1["type"] == "batch"
+    assert [e["type"] for e in p1["events"]] == ["card_played", "trick_complete", "pong", "score_updated"]
+
+    p2 = sockets["p2"].sent[0]
+    assert [e["type"] for e in p2["events"]] == ["card_played", "trick_complete", "error", "score_updated"]
+    assert p2["events"][0]["cards"] == ["10♥"]
+
+    p3 = sockets["p3"].sent[0]
+    assert [e["type"] for e in p3["events"]] == ["card_played", "score_updated"]
+    assert "batch" not in manager.outboxes
+    print("发件箱合并测试通过")
+
+
+def test_single_event_is_sent_unwrapped(fake_websocket):
+    """只有一个事件时直接发送，不包装为batch"""
+    manager, sockets = _make_manager(fake_websocket)
+
+    async def run():
+        async with manager.batch("room"):
+            await manager.broadcast_to_room({"type": "countdown_updated", "remaining_time": 5}, "room")
+
+    asyncio.run(run())
+    for ws in sockets.values():
+        assert ws.sent == [{"type": "countdown_updated", "remaining_time": 5}]
+
+
+def test_without_batch_sends_immediately(fake_websocket):
+    """不在批量范围内时保持原有行为，立即发送"""
+    manager, sockets = _make_manager(fake_websocket)
+
+    async def run():
+        await manager.broadcast_to_room({"type": "pong"}, "room")
+        assert all(len(ws.sent) == 1 for ws in sockets.values())
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    from conftest import FakeWebSocket
+
+    test_batch_merges_events_per_recipient(FakeWebSocket)
+    test_single_event_is_sent_unwrapped(FakeWebSocket)
+    test_without_batch_sends_immediately(FakeWebSocket)
@@ -0,0 +1,183 @@
+"""
+测试对局历史（本局时长、批量写入 game_rounds/round_players、最近N局与汇总查询）
+"""
+import sys
+import os
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.user import User, Stats
+from app.models.history import GameRound, RoundPlayer
+from app.models.game import GameRoom, Player, PlayerPosition
+from app.game.game_state import GameState
+from app.services.stats_service import StatsWriter
+from app.services.room_registry import RoomRegistry
+from app.api.stats import my_history, my_summary
+from app.core.security import CurrentUser
+
+POSITIONS = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
+
+
+def _summary(ended_at: float, dealer_wins: bool = False):
+    return {
+        "dealer_side": "north_south", "dealer_position": "north", "dealer_level_up": 1, "idle_level_up": 0,
+        "dealer_wins": dealer_wins, "idle_score": 30, "bottom_score": 5, "bottom_bonus": 10, "total_score": 40,
+        "old_north_south_level": 2, "old_east_west_level": 2, "new_north_south_level": 3, "new_east_west_level": 2,
+        "started_at": ended_at - 300, "ended_at": ended_at, "duration_seconds": 300,
+    }
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+async def _make_db(path, players):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    # 与 PostgreSQL 一样检查外键：游客的座位不能写入 users 中不存在的 user_id
+    event.listen(engine.sync_engine, "connect", _enable_foreign_keys)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        for p in players:
+            if p.user_id:
+                db.add(User(id=p.user_id, username=p.name, password_hash="x", stats=Stats()))
+        await db.commit()
+    return engine, session_factory
+
+
+def test_round_summary_has_duration():
+    """本局总结包含开始/结束时间和时长"""
+    room = GameRoom(id=str(uuid.uuid4()), name="时长测试")
+    for i, pos in enumerate(POSITIONS):
+        room.players.append(Player(id=str(uuid.uuid4()), name=f"玩家{i}", position=pos))
+    gs = GameState(room)
+    for p in room.players:
+        gs.ready_to_start_game(p.id)
+    assert gs.round_started_at is not None
+    gs.round_started_at -= 600
+    while gs.dealt_count < 100:
+        gs.deal_tick()
+    assert gs.finish_bidding()
+    random.seed(0)
+    for _ in range(200):
+        if gs.game_phase == "scoring":
+            break
+        assert gs.auto_play()["success"]
+        # 一墩结束后由处理函数清空当前墩
+        if len(gs.current_trick_with_player) == 4:
+            gs.current_trick_with_player = []
+    summary = gs.round_summary
+    assert summary and 600 <= summary["duration_seconds"] <= 610
+    assert summary["ended_at"] - summary["started_at"] >= 600
+    assert summary["dealer_position"] == gs.dealer_position.value
+    print("✓ 本局时长正确")
+
+
+def test_history_batched_and_queried(tmp_path):
+    """对局记录随战绩一起批量写入，最近N局按结束时间倒序翻页"""
+    ids = [str(uuid.uuid4()) for _ in POSITIONS]
+    players = [SimpleNamespace(id=ids[i], user_id=ids[i], name=f"u{i}", position=pos) for i, pos in enumerate(POSITIONS)]
+    # 西家是游客：不计战绩，但对局记录中保留座位和名字
+    players[1] = SimpleNamespace(id=str(uuid.uuid4()), user_id=None, name="游客", position=PlayerPosition.WEST)
+
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "history.db", players)
+        writer = StatsWriter(session_factory)
+        now = time.time()
+        for i in range(5):
+            assert writer.submit(_summary(now - 3600 * (5 - i), dealer_wins=(i == 4)), players, "room1")
+        assert await writer.flush() == 0
+
+        u0 = CurrentUser(id=players[0].id, username="u0", is_admin=False)
+        u3 = CurrentUser(id=players[3].id, username="u3", is_admin=False)
+        async with session_factory() as db:
+            assert len((await db.execute(select(GameRound))).scalars().all()) == 5
+            seats = (await db.execute(select(RoundPlayer))).scalars().all()
+            assert len(seats) == 20
+            guest = [s for s in seats if s.position == "west"]
+            assert all(s.user_id is None and s.player_name == "游客" for s in guest)
+
+            page = await my_history(limit=3, before=None, user=u0, db=db)
+            assert len(page["rounds"]) == 3 and page["next_before"]
+            newest = page["rounds"][0]
+            assert newest["won"] and newest["is_dealer_side"] and newest["duration_seconds"] == 300
+            assert newest["bottom_bonus"] == 10 and newest["north_south_level"] == [2, 3]
+            assert [p["name"] for p in newest["players"]].count("游客") == 1
+            ends = [r["ended_at"] for r in page["rounds"]]
+            assert ends == sorted(ends, reverse=True)
+
+            rest = await my_history(limit=3, before=datetime.fromisoformat(page["next_before"]), user=u0, db=db)
+            assert len(rest["rounds"]) == 2 and rest["next_before"] is None
+
+            # 东家是闲家方：得分计入，输赢与庄家相反
+            summary = await my_summary(days=None, user=u3, db=db)
+            assert summary["rounds"] == 5 and summary["wins"] == 4 and summary["total_score"] == 200
+            assert summary["avg_duration_seconds"] == 300
+            recent = await my_summary(days=1, user=u3, db=db)
+            assert recent["rounds"] == 5
+
+            # 最近N局的查询走 (user_id, ended_at) 索引
+            plan = (await db.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM round_players WHERE user_id = 'x' ORDER BY ended_at DESC LIMIT 20"
+            ))).all()
+            assert any("ix_round_players_user_ended" in str(row) for row in plan)
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 对局历史写入与查询正确")
+
+
+def test_guest_and_registered_seats(tmp_path):
+    """入座时区分游客和登录用户：游客的玩家ID也是 UUID，但不计战绩、对局记录中 user_id 为空"""
+    registry = RoomRegistry()
+    room = registry.create(GameRoom(id=str(uuid.uuid4()), name="混合座位"))
+    user_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+    registry.assign_seat(room, "alice", user_ids[0])
+    registry.assign_seat(room, "游客甲")
+    registry.assign_seat(room, "bob", user_ids[1])
+    registry.assign_seat(room, "游客乙")
+    guests = [p for p in room.players if p.user_id is None]
+    assert len(guests) == 2 and all(len(p.id) == 36 for p in guests)
+
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "mixed.db", room.players)
+        writer = StatsWriter(session_factory, max_retries=0)
+        committed = []
+
+        async def on_commit(deltas):
+            committed.extend(d["user_id"] for d in deltas)
+        writer.add_commit_listener(on_commit)
+        assert writer.submit(_summary(time.time()), room.players, room.id)
+        assert await writer.flush() == 0
+        assert sorted(committed) == sorted(user_ids)
+        async with session_factory() as db:
+            seats = (await db.execute(select(RoundPlayer))).scalars().all()
+            assert sorted(s.user_id for s in seats if s.user_id) == sorted(user_ids)
+            assert sorted(s.player_name for s in seats if s.user_id is None) == ["游客乙", "游客甲"]
+            stats = (await db.execute(select(Stats))).scalars().all()
+            assert sorted(s.games_played for s in stats) == [1, 1]
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 游客与登录用户混合入座时战绩正确")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_round_summary_has_duration()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_history_batched_and_queried(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_guest_and_registered_seats(Path(tmp))
+    print("\n所有测试通过！")
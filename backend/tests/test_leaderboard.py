@@ -0,0 +1,216 @@
+"""
+测试排行榜（加载、随战绩写入增量更新、定期重新加载、分页、ETag/304）
+"""
+import sys
+import os
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.user import User, Stats
+from app.models.game import PlayerPosition
+from app.services.leaderboard import Leaderboard, leaderboard
+from app.services.stats_service import StatsWriter
+from app.api.stats import router as stats_router
+
+POSITIONS = [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]
+# 南北方坐庄、庄家胜
+SUMMARY = {"dealer_side": "north_south", "dealer_level_up": 2, "idle_level_up": 0,
+           "dealer_wins": True, "total_score": 20}
+
+
+async def _make_db(path, stats):
+    """stats: [(username, games_played, wins, level_ups)]"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    ids = {}
+    async with session_factory() as db:
+        for name, games, wins, level_ups in stats:
+            ids[name] = str(uuid.uuid4())
+            db.add(User(id=ids[name], username=name, password_hash="x",
+                        stats=Stats(games_played=games, wins=wins, dealer_level_ups=level_ups)))
+        await db.commit()
+    return engine, session_factory, ids
+
+
+def _items(board: Leaderboard, by: str, offset: int = 0, limit: int = 20):
+    return json.loads(board.page(by, offset, limit))
+
+
+def test_load_and_rankings(tmp_path):
+    async def run():
+        engine, session_factory, ids = await _make_db(tmp_path / "lb.db", [
+            ("alice", 20, 12, 5), ("bob", 10, 9, 8), ("carol", 3, 3, 1), ("dave", 0, 0, 0),
+        ])
+        board = Leaderboard(min_games=5)
+        await board.load(session_factory)
+
+        wins = _items(board, "wins")
+        assert [i["username"] for i in wins["items"]] == ["alice", "bob", "carol"]
+        assert wins["total"] == 3 and wins["items"][0]["rank"] == 1
+        # 胜率只统计至少5局的用户
+        rate = _items(board, "win_rate")
+        assert [i["username"] for i in rate["items"]] == ["bob", "alice"]
+        assert rate["items"][0]["win_rate"] == 0.9
+        assert [i["username"] for i in _items(board, "level_ups")["items"]] == ["bob", "alice", "carol"]
+
+        # 分页
+        page = _items(board, "wins", offset=1, limit=1)
+        assert [i["username"] for i in page["items"]] == ["bob"] and page["items"][0]["rank"] == 2
+
+        # 增量更新：carol 再赢7局，胜场和胜率都上升
+        version = board.version
+        await board.apply([{"user_id": ids["carol"], "games_played": 7, "wins": 7,
+                            "dealer_level_ups": 10, "idle_level_ups": 0}])
+        assert board.version == version + 1
+        assert [i["username"] for i in _items(board, "wins")["items"]] == ["alice", "carol", "bob"]
+        assert board.rank_of(ids["carol"], "win_rate") == 1
+        assert board.rank_of(ids["carol"], "level_ups") == 1
+
+        # 第一次上场的用户从数据库读取完整战绩
+        async with session_factory() as db:
+            stats = await db.get(Stats, 4)
+            stats.games_played, stats.wins = 1, 1
+            await db.commit()
+        await board.apply([{"user_id": ids["dave"], "games_played": 1, "wins": 1,
+                            "dealer_level_ups": 0, "idle_level_ups": 0}])
+        assert board.rank_of(ids["dave"], "wins") == 4
+
+        board.remove([ids["alice"]])
+        assert board.rank_of(ids["alice"], "wins") is None
+        assert _items(board, "wins")["total"] == 3
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 排名与增量更新正确")
+
+
+def test_updates_on_writer_commit_and_etag(tmp_path):
+    """战绩写入提交后排行榜随之更新；未变化时返回304"""
+    async def setup():
+        engine, session_factory, ids = await _make_db(tmp_path / "lb.db", [
+            (f"p{i}", 1, 0, 0) for i in range(4)
+        ])
+        await leaderboard.load(session_factory)
+        return engine, session_factory, ids
+
+    engine, session_factory, ids = asyncio.run(setup())
+    app = FastAPI()
+    app.include_router(stats_router, prefix="/api/stats")
+    client = TestClient(app)
+
+    r = client.get("/api/stats/leaderboard?by=wins&limit=2")
+    assert r.status_code == 200 and r.json()["total"] == 4
+    etag = r.headers["etag"]
+    r = client.get("/api/stats/leaderboard?by=wins&limit=2", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag
+    assert client.get("/api/stats/leaderboard?by=bogus").status_code == 422
+
+    async def play_round():
+        writer = StatsWriter(session_factory)
+        writer.add_commit_listener(leaderboard.apply)
+        players = [SimpleNamespace(id=ids[f"p{i}"], user_id=ids[f"p{i}"], name=f"p{i}", position=pos) for i, pos in enumerate(POSITIONS)]
+        writer.submit(SUMMARY, players)
+        await writer.flush()
+    asyncio.run(play_round())
+
+    r = client.get("/api/stats/leaderboard?by=wins&limit=2", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    # 北家和南家（庄家方）获胜
+    assert {i["username"] for i in r.json()["items"]} == {"p0", "p2"}
+    assert r.json()["items"][0]["wins"] == 1 and r.json()["items"][0]["games_played"] == 2
+    asyncio.run(engine.dispose())
+    print("✓ 提交后更新与ETag正确")
+
+
+def test_reload_picks_up_other_workers(tmp_path):
+    """两个 worker 共用数据库：另一个 worker 重新加载后排名一致，ETag 也相同"""
+    async def run():
+        engine, session_factory, ids = await _make_db(tmp_path / "lb.db", [
+            (f"p{i}", 1, 0, 0) for i in range(4)
+        ])
+        first, second = Leaderboard(), Leaderboard()
+        await first.load(session_factory)
+        await second.load(session_factory)
+        assert first.etag("wins") == second.etag("wins")
+
+        writer = StatsWriter(session_factory)
+        writer.add_commit_listener(first.apply)
+        players = [SimpleNamespace(id=ids[f"p{i}"], user_id=ids[f"p{i}"], name=f"p{i}", position=pos) for i, pos in enumerate(POSITIONS)]
+        writer.submit(SUMMARY, players)
+        await writer.flush()
+        # 只有写入的 worker 收到增量
+        assert first.rank_of(ids["p0"], "wins") == 1 and _items(second, "wins")["items"][0]["wins"] == 0
+        assert first.etag("wins") != second.etag("wins")
+
+        second.start(0.02)
+        await asyncio.sleep(0.1)
+        await second.stop()
+        assert _items(second, "wins")["items"] == _items(first, "wins")["items"]
+        assert first.etag("wins") == second.etag("wins")
+        # 内容未变化时重新加载不改变版本号
+        version = second.version
+        assert await second.reload() is False and second.version == version
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 定期重新加载与跨进程 ETag 正确")
+
+
+def test_guests_do_not_query_db(tmp_path):
+    """有游客的对局：已上榜用户只按增量更新，不访问数据库；第一次上场的登录用户读取一次"""
+    async def run():
+        engine, session_factory, ids = await _make_db(tmp_path / "lb.db", [
+            ("p0", 1, 0, 0), ("p2", 1, 0, 0), ("newbie", 0, 0, 0),
+        ])
+        sessions = []
+
+        def counting_factory():
+            sessions.append(1)
+            return session_factory()
+
+        board = Leaderboard()
+        await board.load(counting_factory)
+        loaded = len(sessions)
+
+        def seat(name, pos):
+            user_id = ids.get(name)
+            return SimpleNamespace(id=user_id or str(uuid.uuid4()), user_id=user_id, name=name, position=pos)
+
+        writer = StatsWriter(session_factory)
+        writer.add_commit_listener(board.apply)
+        writer.submit(SUMMARY, [seat("p0", POSITIONS[0]), seat("游客甲", POSITIONS[1]),
+                                seat("p2", POSITIONS[2]), seat("游客乙", POSITIONS[3])])
+        await writer.flush()
+        assert len(sessions) == loaded
+        assert board.rank_of(ids["p0"], "wins") == 1 and _items(board, "wins")["total"] == 2
+
+        writer.submit(SUMMARY, [seat("newbie", POSITIONS[0]), seat("游客甲", POSITIONS[1]),
+                                seat("p2", POSITIONS[2]), seat("游客乙", POSITIONS[3])])
+        await writer.flush()
+        assert len(sessions) == loaded + 1
+        assert board.rank_of(ids["newbie"], "wins") is not None and _items(board, "wins")["total"] == 3
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 游客不触发数据库查询")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_load_and_rankings(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_updates_on_writer_commit_and_etag(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_reload_picks_up_other_workers(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_guests_do_not_query_db(Path(tmp))
+    print("\n所有测试通过！")
@@ -0,0 +1,88 @@
+"""
+测试大厅 WebSocket 推送（初始列表、增量事件、慢连接改为重发完整列表）
+"""
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.models.game import GameRoom, Player, PlayerPosition
+from app.services.room_summary import RoomSummaries
+from app.websocket.lobby import LobbyFeed, lobby_resyncs_total
+
+
+class _Socket:
+    """只用于登记订阅，不实际发送"""
+
+
+def test_events_and_resync():
+    summaries = RoomSummaries()
+    feed = LobbyFeed(summaries, max_queue=3)
+    socket = _Socket()
+    sub = feed.subscribe(socket)
+    assert sub.queue.get_nowait() is None  # 订阅后先发送完整列表
+
+    room = GameRoom(id="r1", name="一号房")
+    summaries.update(room, "waiting")
+    room.players.append(Player(id="p1", name="甲", position=PlayerPosition.NORTH, token="secret"))
+    summaries.update(room)
+    summaries.update(room)  # 没有变化，不推送
+    summaries.remove("r1")
+    events = [json.loads(sub.queue.get_nowait()) for _ in range(sub.queue.qsize())]
+    assert [e["type"] for e in events] == ["room_added", "room_updated", "room_removed"]
+    assert [e["version"] for e in events] == [1, 2, 3]
+    assert events[1]["room"]["player_names"] == ["甲"] and "secret" not in json.dumps(events)
+    assert events[2]["room_id"] == "r1"
+
+    # 队列满时丢弃积压，改为重发一次完整列表
+    resyncs = lobby_resyncs_total.labels().value
+    for i in range(5):
+        summaries.update(GameRoom(id=f"x{i}", name=f"房间{i}"))
+    assert sub.queue.qsize() == 2 and sub.queue.get_nowait() is None
+    assert lobby_resyncs_total.labels().value == resyncs + 1
+    snapshot = json.loads(feed.snapshot_frame())
+    assert snapshot["version"] == summaries.version and len(snapshot["rooms"]) == 5
+    assert feed.snapshot_frame() is feed.snapshot_frame()
+
+    # 取消订阅后不再推送
+    feed.unsubscribe(socket)
+    assert len(feed) == 0
+    summaries.remove("x0")
+    assert sub.queue.qsize() == 1
+    print("✓ 增量事件与重发完整列表正确")
+
+
+def test_lobby_websocket():
+    from main import app
+    from app.api.game import rooms
+    from app.services.room_summary import room_summaries
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/lobby") as ws:
+            snapshot = ws.receive_json()
+            assert snapshot["type"] == "lobby_snapshot"
+
+            room = client.post("/api/rooms", json={"name": "推送测试"}).json()
+            event = ws.receive_json()
+            assert event["type"] == "room_added" and event["room"]["id"] == room["id"]
+            assert event["version"] > snapshot["version"]
+
+            client.post(f"/api/rooms/{room['id']}/join", json={"player_name": "乙"})
+            event = ws.receive_json()
+            assert event["type"] == "room_updated" and event["room"]["player_count"] == 1
+
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json() == {"type": "pong"}
+
+            rooms.pop(room["id"], None)
+            room_summaries.remove(room["id"])
+            event = ws.receive_json()
+            assert event == {"type": "room_removed", "room_id": room["id"], "version": event["version"]}
+    print("✓ 大厅WebSocket推送正确")
+
+
+if __name__ == "__main__":
+    test_events_and_resync()
+    test_lobby_websocket()
+    print("\n所有测试通过！")
@@ -0,0 +1,116 @@
+"""
+测试日志配置（队列写出、按模块级别、高频日志采样、结构化字段、运行中调整级别）
+"""
+import sys
+import os
+import io
+import json
+import logging
+import queue
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.core.log_config import (
+    setup_logging, stop_logging, parse_levels, DroppingQueueHandler, log_records_dropped_total
+)
+from app.core.security import token_cache, CurrentUser
+
+
+class _CountingStr:
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "x"
+
+
+def test_levels_and_sampling():
+    stream = io.StringIO()
+    setup_logging(level="WARNING", levels="test.log.countdown=DEBUG", fmt="text", sample_every=5, stream=stream)
+    try:
+        countdown = logging.getLogger("test.log.countdown")
+        other = logging.getLogger("test.log.other")
+        lazy = _CountingStr()
+        other.debug("不会写出 %s", lazy)
+        other.info("不会写出 %s", lazy)
+        assert lazy.calls == 0
+        for second in range(10):
+            countdown.debug("倒计时 %s秒", second, extra={"room_id": "r1", "sampled": True})
+        countdown.debug("停止倒计时", extra={"room_id": "r1"})
+        other.warning("写出 %s", lazy)
+    finally:
+        stop_logging()
+    lines = stream.getvalue().splitlines()
+    ticks = [line for line in lines if "秒" in line]
+    assert len(ticks) == 2 and "倒计时 0秒 room_id=r1" in ticks[0] and "倒计时 5秒" in ticks[1]
+    assert any("停止倒计时 room_id=r1" in line for line in lines)
+    assert any(line.endswith("写出 x") for line in lines)
+    assert parse_levels(" a=debug, b.c=ERROR ,") == {"a": logging.DEBUG, "b.c": logging.ERROR}
+    print("✓ 按模块级别与采样正确")
+
+
+def test_json_format_and_drop():
+    stream = io.StringIO()
+    setup_logging(level="INFO", levels="", fmt="json", stream=stream)
+    try:
+        logger = logging.getLogger("test.log.json")
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("倒计时循环错误", extra={"room_id": "r2"})
+    finally:
+        stop_logging()
+    entry = json.loads(stream.getvalue().splitlines()[0])
+    assert entry["level"] == "ERROR" and entry["logger"] == "test.log.json"
+    assert entry["room_id"] == "r2" and entry["message"] == "倒计时循环错误"
+    assert entry["exc_info"].startswith("Traceback") and "RuntimeError: boom" in entry["exc_info"]
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    # 入队时不格式化：保留模板、参数和异常，由监听线程处理
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord("test", logging.ERROR, __file__, 0, "倒计时 %s秒", (3,), sys.exc_info())
+    prepared = handler.prepare(record)
+    assert prepared is not record and prepared.msg == "倒计时 %s秒" and prepared.args == (3,)
+    assert prepared.exc_info is record.exc_info and prepared.exc_text is None
+    # 可变参数在入队时拼接，之后的修改不影响已记录的消息
+    hand = ["♠A"]
+    record = logging.LogRecord("test", logging.INFO, __file__, 0, "手牌 %s", (hand,), None)
+    prepared = handler.prepare(record)
+    hand.append("♥K")
+    assert prepared.getMessage() == "手牌 ['♠A']" and prepared.args is None
+    dropped = log_records_dropped_total.labels().value
+    for _ in range(3):
+        handler.handle(logging.LogRecord("test", logging.INFO, __file__, 0, "msg", None, None))
+    assert log_records_dropped_total.labels().value == dropped + 2
+    print("✓ JSON 格式与队列满时丢弃正确")
+
+
+def test_log_levels_endpoint():
+    from main import app
+
+    token_cache.put("t-admin", CurrentUser(id="admin", username="admin", is_admin=True))
+    headers = {"Authorization": "Bearer t-admin"}
+    name = "app.websocket.game_websocket.countdown"
+    try:
+        with TestClient(app) as client:
+            assert client.put("/api/admin/log-levels", json={name: "DEBUG"}).status_code == 401
+            response = client.put("/api/admin/log-levels", json={name: "debug"}, headers=headers)
+            assert response.status_code == 200 and response.json()[name] == "DEBUG"
+            assert logging.getLogger(name).isEnabledFor(logging.DEBUG)
+            response = client.put("/api/admin/log-levels", json={name: "WARNING", "x": "LOUD"}, headers=headers)
+            assert response.status_code == 400
+            assert client.get("/api/admin/log-levels", headers=headers).json()[name] == "DEBUG"
+    finally:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+        token_cache.clear()
+    print("✓ 运行中调整日志级别正确")
+
+
+if __name__ == "__main__":
+    test_levels_and_sampling()
+    test_json_format_and_drop()
+    test_log_levels_endpoint()
+    print("\n所有测试通过！")
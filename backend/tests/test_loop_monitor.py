@@ -0,0 +1,89 @@
+"""
+测试事件循环延迟监控（阻塞时抓取调用栈和消息上下文、延迟直方图、日志限流、状态接口权限）
+"""
+import sys
+import os
+import asyncio
+import logging
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.core.loop_monitor import LoopMonitor, loop_lag_seconds, loop_blocked_total
+from app.core.security import token_cache, CurrentUser
+
+
+def _blocking_engine_call(seconds: float):
+    time.sleep(seconds)
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_captures_blocking_stack():
+    async def run():
+        monitor = LoopMonitor(interval=0.02, threshold=0.05, log_interval=60)
+        lag_samples = loop_lag_seconds.labels().count
+        blocked = loop_blocked_total.labels().value
+        monitor.start()
+        await asyncio.sleep(0.1)
+        assert monitor.recent() == []
+
+        with monitor.track("play_card", "room-1"):
+            _blocking_engine_call(0.3)
+        await asyncio.sleep(0.1)
+        # 第二次阻塞：仍然记录事件，但日志被限流
+        _blocking_engine_call(0.3)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        events = monitor.recent()
+        assert len(events) == 2
+        latest, first = events
+        assert first["message_type"] == "play_card" and first["room_id"] == "room-1"
+        assert "_blocking_engine_call" in first["stack"] and first["blocked_ms"] >= 50
+        assert latest["message_type"] is None
+        assert loop_blocked_total.labels().value == blocked + 2
+        assert loop_lag_seconds.labels().count > lag_samples
+        assert loop_lag_seconds.labels().quantile(1.0) >= 0.25
+
+    handler = _Records()
+    logger = logging.getLogger("app.core.loop_monitor")
+    logger.addHandler(handler)
+    try:
+        asyncio.run(run())
+    finally:
+        logger.removeHandler(handler)
+    assert len(handler.records) == 1 and "play_card" in handler.records[0].getMessage()
+    print("✓ 阻塞调用栈与日志限流正确")
+
+
+def test_stats_endpoints_require_admin():
+    """运行状态接口（含调用栈和房间ID）只对管理员开放"""
+    from main import app
+
+    token_cache.put("t-admin", CurrentUser(id="admin", username="admin", is_admin=True))
+    token_cache.put("t-user", CurrentUser(id="user", username="user", is_admin=False))
+    try:
+        with TestClient(app) as client:
+            for path in ("/stats/loop", "/stats/handlers", "/stats/writer"):
+                assert client.get(path).status_code == 401
+                assert client.get(path, headers={"Authorization": "Bearer t-user"}).status_code == 403
+                assert client.get(path, headers={"Authorization": "Bearer t-admin"}).status_code == 200
+            blocked = client.get("/stats/loop", headers={"Authorization": "Bearer t-admin"}).json()["blocked"]
+            assert isinstance(blocked, list)
+    finally:
+        token_cache.clear()
+    print("✓ 运行状态接口需要管理员权限")
+
+
+if __name__ == "__main__":
+    test_captures_blocking_stack()
+    test_stats_endpoints_require_admin()
+    print("\n所有测试通过！")
@@ -0,0 +1,62 @@
+"""
+测试指标的 Prometheus 文本格式输出（计数器、直方图、采集时取值的仪表、/metrics 接口）
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.core.metrics import MetricsRegistry, Counter, Histogram, Gauge, CallbackGauge, exposition
+
+
+def test_text_format():
+    registry = MetricsRegistry()
+    requests = registry.register(Counter("demo_requests_total", "请求数", ["path"]))
+    requests.labels('/a"b').inc(3)
+    latency = registry.register(Histogram("demo_seconds", "耗时", buckets=(0.1, 1.0)))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    registry.register(Gauge("demo_idle", "未记录过的仪表"))
+    phases = {"waiting": 2, "playing": 1}
+    registry.register(CallbackGauge("demo_rooms", "房间数", lambda: phases, ["phase"]))
+
+    lines = exposition(registry).splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{path="/a\\"b"} 3' in lines
+    # 直方图分桶是累计值
+    assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{le="1"} 2' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+    assert "demo_seconds_sum 5.55" in lines and "demo_seconds_count 3" in lines
+    assert "demo_idle 0" in lines
+    # 采集时才取值
+    phases["playing"] = 4
+    lines = exposition(registry).splitlines()
+    assert 'demo_rooms{phase="playing"} 4' in lines and 'demo_rooms{phase="waiting"} 2' in lines
+    print("✓ 文本格式正确")
+
+
+def test_metrics_endpoint():
+    from main import app
+    from app.api.game import rooms
+
+    with TestClient(app) as client:
+        room = client.post("/api/rooms", json={"name": "指标测试"}).json()
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        for name in ("rooms_by_phase", "ws_connections", "ws_handler_latency_seconds",
+                     "ws_broadcast_fanout_seconds", "broadcast_bus_queue_depth", "countdown_lag_seconds",
+                     "auto_play_seconds", "engine_calls_total", "stats_writer_queue_depth"):
+            assert f"# TYPE {name} " in text, name
+        assert 'rooms_by_phase{phase="waiting"}' in text
+        rooms.pop(room["id"], None)
+    print("✓ /metrics 接口正确")
+
+
+if __name__ == "__main__":
+    test_text_format()
+    test_metrics_endpoint()
+    print("\n所有测试通过！")
@@ -0,0 +1,71 @@
+"""
+测试密码哈希线程池（不阻塞事件循环、排队上限快速拒绝）
+"""
+import sys
+import os
+import asyncio
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import HTTPException
+from app.core.security import PasswordHasher, password_hash_seconds, password_hash_rejected_total
+
+
+def test_hash_and_verify_off_loop():
+    """哈希在线程池中执行，期间事件循环照常运行"""
+    async def run():
+        hasher = PasswordHasher(max_workers=1, max_pending=4)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        before = password_hash_seconds.labels("hash").count
+        hashed = await hasher.hash("secret1")
+        assert await hasher.verify("secret1", hashed)
+        assert not await hasher.verify("wrong-password", hashed)
+        ticker.cancel()
+        assert ticks > 5
+        assert password_hash_seconds.labels("hash").count == before + 1
+        assert hasher.pending == 0
+        hasher.shutdown()
+    asyncio.run(run())
+    print("✓ 线程池哈希正确")
+
+
+def test_rejects_when_queue_full():
+    """排队数达到上限时立即返回503，任务完成后恢复"""
+    async def run():
+        hasher = PasswordHasher(max_workers=1, max_pending=2)
+        rejected = password_hash_rejected_total.labels().value
+        running = [asyncio.create_task(hasher._run("verify", time.sleep, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert hasher.pending == 2
+
+        start = time.perf_counter()
+        with pytest.raises(HTTPException) as exc:
+            await hasher._run("verify", time.sleep, 0.2)
+        assert exc.value.status_code == 503 and exc.value.headers["Retry-After"] == "1"
+        assert time.perf_counter() - start < 0.05
+        assert password_hash_rejected_total.labels().value == rejected + 1
+
+        # 请求被取消后，线程中的任务仍然计入队列直到执行完
+        running[1].cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await asyncio.sleep(0.5)
+        assert hasher.pending == 0
+        await hasher._run("verify", time.sleep, 0)
+        hasher.shutdown()
+    asyncio.run(run())
+    print("✓ 排队上限正确")
+
+
+if __name__ == "__main__":
+    test_hash_and_verify_off_loop()
+    test_rejects_when_queue_full()
+    print("\n所有测试通过！")
@@ -0,0 +1,115 @@
+"""
+测试按需性能剖析（采样折叠栈、按房间过滤、cProfile 输出、管理员接口）
+"""
+import sys
+import os
+import asyncio
+import pstats
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.core.loop_monitor import loop_monitor
+from app.core.profiler import Profiler, ProfileAlreadyRunning
+from app.core.security import token_cache, CurrentUser
+
+
+def _hot_room_a(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _hot_room_b(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def _play(room_id: str, hot, rounds: int = 10):
+    for _ in range(rounds):
+        with loop_monitor.track("play_card", room_id):
+            hot(0.02)
+        await asyncio.sleep(0)
+
+
+def test_sampling_room_scope():
+    async def run():
+        profiler = Profiler()
+        work = asyncio.gather(_play("room-a", _hot_room_a), _play("room-b", _hot_room_b))
+        session = await profiler.run("sampling", 0.3, room_id="room-a", interval=0.002)
+        await work
+        return session
+
+    session = asyncio.run(run())
+    text = session.collapsed()
+    assert session.samples > 0 and session.skipped_samples > 0
+    assert "_hot_room_a" in text and "_hot_room_b" not in text
+    stack, count = text.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+    print("✓ 采样按房间过滤正确")
+
+
+def test_cprofile_room_scope(tmp_path):
+    async def run():
+        profiler = Profiler()
+
+        async def handle(room_id, hot):
+            for _ in range(5):
+                with profiler.scope(room_id):
+                    hot(0.01)
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(profiler.run("cprofile", 0.2, room_id="room-a"))
+        await asyncio.sleep(0)
+        try:
+            await profiler.run("sampling", 0.1)
+            assert False, "应该拒绝同时运行两个剖析任务"
+        except ProfileAlreadyRunning:
+            pass
+        await asyncio.gather(handle("room-a", _hot_room_a), handle("room-b", _hot_room_b))
+        return await task
+
+    session = asyncio.run(run())
+    text = session.pstats_text(limit=20)
+    assert "_hot_room_a" in text and "_hot_room_b" not in text
+    path = tmp_path / "profile.pstats"
+    path.write_bytes(session.pstats_bytes())
+    stats = pstats.Stats(str(path))
+    assert any(func[2] == "_hot_room_a" for func in stats.stats)
+    print("✓ cProfile 按房间剖析正确")
+
+
+def test_profile_endpoint():
+    from main import app
+
+    token_cache.put("t-admin", CurrentUser(id="admin", username="admin", is_admin=True))
+    token_cache.put("t-user", CurrentUser(id="user", username="user", is_admin=False))
+    try:
+        with TestClient(app) as client:
+            assert client.post("/api/admin/profile?seconds=0.1").status_code == 401
+            response = client.post("/api/admin/profile?seconds=0.1",
+                                   headers={"Authorization": "Bearer t-user"})
+            assert response.status_code == 403
+            response = client.post("/api/admin/profile?seconds=0.1&mode=cprofile",
+                                   headers={"Authorization": "Bearer t-admin"})
+            assert response.status_code == 200
+            assert "function calls" in response.text
+            response = client.post("/api/admin/profile?seconds=0.1",
+                                   headers={"Authorization": "Bearer t-admin"})
+            assert response.status_code == 200 and "X-Profile-Samples" in response.headers
+            response = client.get("/api/admin/profile/status", headers={"Authorization": "Bearer t-admin"})
+            assert response.json() == {"running": False}
+    finally:
+        token_cache.clear()
+    print("✓ 剖析接口权限与输出正确")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_sampling_room_scope()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cprofile_room_scope(Path(tmp))
+    test_profile_endpoint()
+    print("\n所有测试通过！")
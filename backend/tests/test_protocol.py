@@ -0,0 +1,100 @@
+"""
+测试卡牌编码与紧凑二进制协议
+"""
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.game import Card, Suit, Rank
+from app.game.card_system import CardSystem
+from app.game.card_codes import (
+    card_to_code, code_to_card, card_string_to_code, cards_to_bytes, bytes_to_cards,
+    CODE_TO_CARD_STRING, BIG_JOKER_CODE
+)
+from app.websocket.protocol import encode_frame, decode_frame, encode_message, decode_message, ProtocolError
+from app.websocket.game_websocket import parse_card_strings
+
+
+def test_card_codes_round_trip():
+    """整副牌（含大小王）编码往返无损"""
+    deck = CardSystem().create_deck()
+    for card in deck:
+        code = card_to_code(card)
+        restored = code_to_card(code)
+        assert restored == card, f"{card} -> {code} -> {restored}"
+        # 编码对应的字符串与 str(card) 一致
+        assert CODE_TO_CARD_STRING[code] == str(card)
+        assert card_string_to_code(str(card)) == code
+
+    assert bytes_to_cards(cards_to_bytes(deck)) == deck
+    assert card_string_to_code("JOKER-A") is not None
+    assert code_to_card(card_string_to_code("JOKER-A")).rank == Rank.BIG_JOKER
+    assert card_string_to_code("JOKER/大王") == BIG_JOKER_CODE
+    assert card_string_to_code("11♥") is None
+    print("卡牌编码往返测试通过")
+
+
+def test_parse_card_strings_fast_path():
+    """parse_card_strings 同时接受字符串和编码"""
+    cards = parse_card_strings(["10♥", "JOKER-A", "JOKER-B/小王", card_to_code(Card(suit=Suit.SPADES, rank=Rank.ACE)), "bad"])
+    assert [str(c) for c in cards] == ["10♥", "JOKER-A/大王", "JOKER-B/小王", "A♠"]
+    print("parse_card_strings 测试通过")
+
+
+def test_frame_round_trip_and_size():
+    """二进制帧往返无损，且明显小于JSON"""
+    message = {
+        "type": "card_played",
+        "player_id": "3f1c0a52-7c1e-4a8b-9d0e-2b6c8f1a4e77",
+        "player_position": "north",
+        "cards": ["10♥", "10♥", "J♥", "J♥"],
+        "current_trick": [
+            {"player_id": "3f1c0a52-7c1e-4a8b-9d0e-2b6c8f1a4e77", "player_position": "north", "cards": ["10♥", "10♥", "J♥", "J♥"]}
+        ],
+        "trick_complete": False,
+        "current_player": "west",
+        "current_trick_max_player": "玩家一",
+        "play_type": None,
+        "score": -5,
+        "ratio": 0.5,
+        "big": 2 ** 40,
+    }
+    frame = encode_frame(message)
+    assert decode_frame(frame) == message
+    json_size = len(json.dumps(message).encode("utf-8"))
+    print(f"JSON: {json_size} 字节, 二进制: {len(frame)} 字节")
+    assert len(frame) < json_size / 2
+
+    # 未登记的事件类型也能往返
+    unknown = {"type": "custom_event", "value": 1}
+    assert decode_frame(encode_frame(unknown)) == unknown
+
+
+def test_encode_message_by_protocol():
+    """按协议选择编码方式"""
+    message = {"type": "pong"}
+    assert encode_message(message, None) == json.dumps(message)
+    assert encode_message(json.dumps(message), "json") == json.dumps(message)
+    frame = encode_message(message, "qv1.binary")
+    assert isinstance(frame, bytes)
+    assert decode_message(frame) == message
+    assert decode_message('{"type": "ping"}') == {"type": "ping"}
+
+
+def test_decode_invalid_frame():
+    """格式错误的帧抛出 ProtocolError"""
+    for bad in [b"", b"\x02\x00\xc8\x00", b"\x01\x00\xc6\x05ab", b"\x01\x00\x05"]:
+        try:
+            decode_frame(bad)
+        except ProtocolError:
+            continue
+        raise AssertionError(f"应当拒绝: {bad!r}")
+
+
+if __name__ == "__main__":
+    test_card_codes_round_trip()
+    test_parse_card_strings_fast_path()
+    test_frame_round_trip_and_size()
+    test_encode_message_by_protocol()
+    test_decode_invalid_frame()
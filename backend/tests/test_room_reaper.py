@@ -0,0 +1,186 @@
+"""
+测试空闲房间回收
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.game import GameRoom
+from app.game.game_state import GameState
+from app.websocket.game_websocket import ConnectionManager
+from app.websocket.connection_registry import ConnectionInfo
+from app.game.checkpoint import load_checkpoint
+from app.services.room_registry import RoomRegistry
+from app.services.room_store import InMemoryRoomStore
+from app.services.room_reaper import RoomReaper, CheckpointArchive, rooms_idle, rooms_live, rooms_archived
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reaper_evicts_only_idle_rooms_past_ttl(fake_websocket):
+    manager = ConnectionManager()
+    rooms = {}
+    for room_id in ["busy", "idle", "orphan"]:
+        rooms[room_id] = GameRoom(id=room_id, name=room_id)
+        manager.game_states[room_id] = GameState(rooms[room_id])
+    # orphan 只剩 GameState，房间已不存在
+    del rooms["orphan"]
+    manager.connections.add("busy", ConnectionInfo(fake_websocket(), "p1"))
+
+    archived = []
+
+    async def archive(room_id, room, game_state):
+        archived.append((room_id, game_state is not None))
+
+    clock = FakeClock()
+    reaper = RoomReaper(manager, rooms, ttl_seconds=60, archive=archive, clock=clock)
+
+    async def run():
+        # 模拟一个仍在运行的倒计时任务
+        manager.countdown_tasks["idle"] = asyncio.create_task(asyncio.sleep(3600))
+        countdown = manager.countdown_tasks["idle"]
+
+        assert await reaper.reap() == 0
+        assert rooms_idle.labels().value == 2
+        clock.now = 59
+        assert await reaper.reap() == 0
+        clock.now = 60
+        assert await reaper.reap() == 2
+        assert countdown.cancelled()
+
+    asyncio.run(run())
+
+    assert set(rooms) == {"busy"}
+    assert set(manager.game_states) == {"busy"}
+    assert "idle" not in manager.countdown_tasks
+    assert archived == [("idle", True)]
+    assert reaper.archived_count == 1
+    assert rooms_live.labels().value == 1
+    assert rooms_idle.labels().value == 0
+    print("空闲房间回收测试通过")
+
+
+def test_reconnect_resets_idle_timer(fake_websocket):
+    manager = ConnectionManager()
+    rooms = {"r": GameRoom(id="r", name="r")}
+    clock = FakeClock()
+    reaper = RoomReaper(manager, rooms, ttl_seconds=60, clock=clock)
+    ws = fake_websocket()
+
+    async def run():
+        await reaper.reap()
+        clock.now = 50
+        manager.connections.add("r", ConnectionInfo(ws, "p1"))
+        await reaper.reap()
+        manager.connections.remove(ws)
+        clock.now = 100
+        assert await reaper.reap() == 0
+        clock.now = 160
+        assert await reaper.reap() == 1
+
+    asyncio.run(run())
+    assert rooms == {}
+
+
+def test_checkpoint_archive(tmp_path):
+    manager = ConnectionManager()
+    rooms = {}
+    for room_id in ["played", "empty"]:
+        rooms[room_id] = GameRoom(id=room_id, name=room_id)
+    manager.game_states["played"] = GameState(rooms["played"])
+    manager.game_states["played"].current_countdown = 7
+    archive = CheckpointArchive(str(tmp_path / "archive"))
+    reaper = RoomReaper(manager, rooms, ttl_seconds=0, archive=archive)
+
+    assert asyncio.run(reaper.reap()) == 2
+    # 只有带 GameState 的房间写入检查点
+    assert os.listdir(archive.directory) == ["played.ckpt"]
+    with open(archive.path("played"), "rb") as f:
+        restored = load_checkpoint(f.read())
+    assert restored.room.id == "played" and restored.current_countdown == 7
+    assert reaper.archived_count == 1 and rooms_archived.labels().value == 1
+    print("检查点归档测试通过")
+
+
+class FakeCommandLog:
+    def __init__(self):
+        self.dropped = []
+
+    def drop(self, room_id):
+        self.dropped.append(room_id)
+
+
+def test_foreign_rooms_only_drop_cached_copy():
+    """两个进程共用房间存储：回收从存储读来的其他进程房间时不删除存储中的房间"""
+    async def run():
+        store = InMemoryRoomStore()
+        owner, other = RoomRegistry(store=store), RoomRegistry(store=store)
+        owner.create(GameRoom(id="r", name="r"))
+        await owner.save(owner["r"])
+        assert await other.load("r") is not None and not other.owns("r")
+
+        other_log = FakeCommandLog()
+        other_reaper = RoomReaper(ConnectionManager(), other, ttl_seconds=0, store=store, command_log=other_log)
+        assert await other_reaper.reap() == 1
+        assert "r" not in other and other_log.dropped == []
+        assert await store.load_room("r") is not None
+        assert await owner.load("r") is owner["r"]
+
+        # 房间所在的进程回收时才从存储和命令日志中删除
+        owner_log = FakeCommandLog()
+        owner_reaper = RoomReaper(ConnectionManager(), owner, ttl_seconds=0, store=store, command_log=owner_log)
+        assert await owner_reaper.reap() == 1
+        assert owner_log.dropped == ["r"] and await store.load_room("r") is None
+    asyncio.run(run())
+    print("其他进程房间回收测试通过")
+
+
+class TouchRecordingStore(InMemoryRoomStore):
+    def __init__(self):
+        super().__init__()
+        self.touched = []
+
+    async def touch(self, room_ids):
+        self.touched.append(list(room_ids))
+
+
+def test_active_owned_rooms_are_touched(fake_websocket):
+    """扫描时刷新本进程有连接的房间的存储过期时间，空闲房间和其他进程的房间不刷新"""
+    async def run():
+        store = TouchRecordingStore()
+        owner, other = RoomRegistry(store=store), RoomRegistry(store=store)
+        for room_id in ("playing", "idle"):
+            owner.create(GameRoom(id=room_id, name=room_id))
+            await owner.save(owner[room_id])
+        other.create(GameRoom(id="foreign", name="foreign"))
+        await other.save(other["foreign"])
+        assert await owner.load("foreign") is not None
+
+        manager = ConnectionManager()
+        manager.connections.add("playing", ConnectionInfo(fake_websocket(), "p1"))
+        manager.connections.add("foreign", ConnectionInfo(fake_websocket(), "p2"))
+        reaper = RoomReaper(manager, owner, ttl_seconds=3600, store=store)
+        assert await reaper.reap() == 0
+        assert store.touched == [["playing"]]
+    asyncio.run(run())
+    print("有连接的房间刷新过期时间测试通过")
+
+
+if __name__ == "__main__":
+    from conftest import FakeWebSocket
+
+    test_reaper_evicts_only_idle_rooms_past_ttl(FakeWebSocket)
+    test_reconnect_resets_idle_timer(FakeWebSocket)
+    test_foreign_rooms_only_drop_cached_copy()
+    test_active_owned_rooms_are_touched(FakeWebSocket)
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_checkpoint_archive(Path(tmp))
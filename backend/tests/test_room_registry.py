@@ -0,0 +1,122 @@
+"""
+测试房间注册表（映射接口、令牌/玩家/状态索引、房间数上限、入座）
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.models.game import GameRoom, GameStatus, PlayerPosition
+from app.services.room_registry import RoomRegistry, RoomCapacityExceeded, RoomFull, NameTaken
+from app.services.room_store import InMemoryRoomStore
+from app.services.room_summary import RoomSummaries
+
+
+def test_seats_and_indexes():
+    summaries = RoomSummaries()
+    registry = RoomRegistry(summaries=summaries)
+    room = registry.create(GameRoom(id="r1", name="一号房"))
+    assert "r1" in registry and registry["r1"] is room and len(registry) == 1
+    assert summaries.get("r1")["phase"] == "waiting"
+
+    alice, seated = registry.assign_seat(room, "alice", user_id="u-alice")
+    assert seated and alice.id == "u-alice" and alice.position == PlayerPosition.NORTH
+    assert room.owner_id == "u-alice"
+    # 重复加入返回原来的座位
+    again, seated = registry.assign_seat(room, "alice", user_id="u-alice")
+    assert again is alice and not seated
+    # 游客同名视为重新加入；登录用户的用户名被他人占用时拒绝
+    assert registry.assign_seat(room, "alice")[0] is alice
+    with pytest.raises(NameTaken):
+        registry.assign_seat(room, "alice", user_id="u-other")
+    for name in ("b", "c", "d"):
+        registry.assign_seat(room, name)
+    with pytest.raises(RoomFull):
+        registry.assign_seat(room, "e")
+    assert [p.position for p in room.players] == [
+        PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST
+    ]
+    assert summaries.get("r1")["player_count"] == 4
+
+    found_room, found = registry.find_by_token(room.players[2].token)
+    assert found_room is room and found.name == "c"
+    assert registry.find_by_token("unknown") is None
+    assert registry.rooms_of("u-alice") == ["r1"]
+
+    # 状态在其他地方修改后 refresh 更新索引
+    assert registry.with_status(GameStatus.WAITING) == ["r1"]
+    room.status = GameStatus.PLAYING
+    registry.refresh(room, "bidding")
+    assert registry.with_status(GameStatus.WAITING) == [] and registry.with_status(GameStatus.PLAYING) == ["r1"]
+    assert registry.count_by_status()["playing"] == 1
+    assert summaries.get("r1")["phase"] == "bidding"
+
+    # 移除后索引和摘要一并清除
+    assert registry.pop("r1") is room
+    assert registry.find_by_token(room.players[0].token) is None
+    assert registry.rooms_of("u-alice") == [] and registry.with_status(GameStatus.PLAYING) == []
+    assert summaries.get("r1") is None
+    print("✓ 入座与索引正确")
+
+
+def test_capacity_and_store():
+    async def run():
+        store = InMemoryRoomStore()
+        registry = RoomRegistry(store=store, max_rooms=2)
+        registry.create(GameRoom(id="a", name="A"))
+        registry.create(GameRoom(id="b", name="B"))
+        with pytest.raises(RoomCapacityExceeded):
+            registry.create(GameRoom(id="c", name="C"))
+        player, _ = registry.assign_seat(registry["a"], "甲")
+        await registry.save(registry["a"])
+
+        # 其他进程（另一个注册表）从存储加载，令牌索引随之建立
+        other = RoomRegistry(store=store)
+        room = await other.load("a")
+        assert room is not None and other.find_by_token(player.token)[1].name == "甲"
+        assert await other.load("missing") is None
+    asyncio.run(run())
+    print("✓ 房间数上限与存储加载正确")
+
+
+def test_foreign_rooms_reload_from_store():
+    async def run():
+        store = InMemoryRoomStore()
+        owner = RoomRegistry(store=store)
+        other = RoomRegistry(store=store)
+        owner.create(GameRoom(id="a", name="A"))
+        owner.assign_seat(owner["a"], "甲")
+        await owner.save(owner["a"])
+
+        assert [p.name for p in (await other.load("a")).players] == ["甲"]
+        # 房间所在进程之后的入座对其他进程可见
+        second, _ = owner.assign_seat(owner["a"], "乙")
+        await owner.save(owner["a"])
+        room = await other.load("a")
+        assert [p.name for p in room.players] == ["甲", "乙"]
+        assert other.find_by_token(second.token)[0] is room
+        # 在其他进程上入座后保存，不会丢失房间所在进程的入座
+        other.assign_seat(room, "丙")
+        await other.save(room)
+        assert [p.name for p in (await store.load_room("a")).players] == ["甲", "乙", "丙"]
+
+        # 本进程的房间不再重新读取
+        assert await owner.load("a") is owner["a"]
+        other.claim("a")
+        assert await other.load("a") is room
+
+        # 存储中已删除的房间同时移除缓存
+        third = RoomRegistry(store=store)
+        await third.load("a")
+        await store.delete_room("a")
+        assert await third.load("a") is None and "a" not in third
+    asyncio.run(run())
+    print("✓ 非本进程房间每次从存储读取")
+
+
+if __name__ == "__main__":
+    test_seats_and_indexes()
+    test_capacity_and_store()
+    test_foreign_rooms_reload_from_store()
+    print("\n所有测试通过！")
@@ -0,0 +1,80 @@
+"""
+测试房间状态存储（内存实现与Redis实现）
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.models.game import GameRoom, Player, PlayerPosition, Card, Suit, Rank
+from app.services.room_store import InMemoryRoomStore, RedisRoomStore
+
+
+def _make_room():
+    room = GameRoom(id="room-1", name="测试房间", play_time_limit=25)
+    room.players.append(Player(
+        id="p1", name="玩家一", position=PlayerPosition.NORTH, token="tok",
+        cards=[Card(suit=Suit.HEARTS, rank=Rank.TEN)]
+    ))
+    room.owner_id = "p1"
+    return room
+
+
+async def _exercise(store):
+    room = _make_room()
+    assert await store.load_room("room-1") is None
+    await store.save_room(room)
+    # 保存后修改原对象不影响已保存的状态
+    room.name = "已修改"
+
+    loaded = await store.load_room("room-1")
+    assert loaded.name == "测试房间"
+    assert loaded.play_time_limit == 25
+    assert loaded.owner_id == "p1"
+    assert loaded.players[0].token == "tok"
+    assert loaded.players[0].position == PlayerPosition.NORTH
+    # 手牌不写入元数据
+    assert loaded.players[0].cards == []
+
+    assert await store.load_checkpoint("room-1") is None
+    await store.save_checkpoint("room-1", b"\x01\x02\xff")
+    assert await store.load_checkpoint("room-1") == b"\x01\x02\xff"
+    assert await store.room_ids() == ["room-1"]
+
+    await store.delete_room("room-1")
+    assert await store.load_room("room-1") is None
+    assert await store.load_checkpoint("room-1") is None
+    assert await store.room_ids() == []
+
+
+def test_in_memory_store():
+    asyncio.run(_exercise(InMemoryRoomStore()))
+    print("内存房间存储测试通过")
+
+
+def test_redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        store = RedisRoomStore(fakeredis.FakeAsyncRedis(), ttl_seconds=3600)
+        await _exercise(store)
+        await store.save_room(_make_room())
+        assert 0 < await store.client.ttl("qv:room:room-1") <= 3600
+        # 对局中没有写入时由 touch 刷新过期时间（不存在的房间忽略）
+        await store.client.expire("qv:room:room-1", 5)
+        await store.touch(["room-1", "missing"])
+        assert await store.client.ttl("qv:room:room-1") > 5
+        assert not await store.client.exists("qv:room:missing")
+        # 模拟 Redis 过期删除房间 hash 后，索引中的残留会被清理
+        await store.client.delete("qv:room:room-1")
+        assert await store.room_ids() == []
+        await store.close()
+
+    asyncio.run(run())
+    print("Redis房间存储测试通过")
+
+
+if __name__ == "__main__":
+    test_in_memory_store()
+    test_redis_store()
@@ -0,0 +1,125 @@
+"""
+测试大厅房间摘要（不含手牌和令牌、增量更新、分页筛选、ETag缓存）
+"""
+import sys
+import os
+import json
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from app.models.game import GameRoom, GameStatus, Player, PlayerPosition
+from app.services.room_summary import RoomSummaries, summarize_room
+
+
+def _room(room_id: str, players: int = 0, status: GameStatus = GameStatus.WAITING) -> GameRoom:
+    room = GameRoom(id=room_id, name=f"房间{room_id}", status=status)
+    for i, position in enumerate(list(PlayerPosition)[:players]):
+        room.players.append(Player(id=f"{room_id}-p{i}", name=f"玩家{i}", position=position, token=f"secret-{room_id}-{i}"))
+    return room
+
+
+def test_summary_has_no_secrets():
+    room = _room("r1", players=4)
+    summary = summarize_room(room, "bidding")
+    assert summary["player_count"] == 4 and summary["is_full"]
+    assert summary["player_names"] == ["玩家0", "玩家1", "玩家2", "玩家3"]
+    assert summary["phase"] == "bidding" and summary["status"] == "waiting"
+    encoded = json.dumps(summary, ensure_ascii=False)
+    assert "secret" not in encoded and "r1-p0" not in encoded and "cards" not in encoded
+    print("✓ 摘要不含令牌和手牌")
+
+
+def test_incremental_updates_and_cache():
+    summaries = RoomSummaries()
+    room = _room("r1")
+    assert summaries.update(room, "waiting")
+    assert not summaries.update(_room("demo"))
+    version = summaries.version
+    body = summaries.page()
+    assert summaries.page() is body  # 同一版本内复用编码结果
+
+    # 内容没有变化时不改版本
+    assert not summaries.update(room)
+    assert summaries.version == version and summaries.page() is body
+
+    # 加入玩家后版本变化，未传阶段时沿用之前的阶段
+    room.players.append(Player(id="x", name="新玩家", position=PlayerPosition.NORTH))
+    assert summaries.update(room)
+    assert summaries.version == version + 1
+    data = json.loads(summaries.page())
+    assert data["version"] == summaries.version
+    assert data["rooms"][0]["player_count"] == 1 and data["rooms"][0]["phase"] == "waiting"
+
+    etag = summaries.etag()
+    assert summaries.remove("r1") and not summaries.remove("r1")
+    assert summaries.etag() != etag and json.loads(summaries.page())["total"] == 0
+    print("✓ 增量更新与缓存正确")
+
+
+def test_pagination_and_status_filter():
+    summaries = RoomSummaries()
+    for i in range(5):
+        summaries.update(_room(f"w{i}"))
+    for i in range(3):
+        summaries.update(_room(f"p{i}", players=4, status=GameStatus.PLAYING), "playing")
+
+    data = json.loads(summaries.page(offset=0, limit=3))
+    assert data["total"] == 8 and [r["id"] for r in data["rooms"]] == ["w0", "w1", "w2"]
+    data = json.loads(summaries.page(offset=6, limit=3))
+    assert [r["id"] for r in data["rooms"]] == ["p1", "p2"]
+    data = json.loads(summaries.page(status="playing"))
+    assert data["total"] == 3 and all(r["status"] == "playing" for r in data["rooms"])
+    print("✓ 分页与状态筛选正确")
+
+
+def test_rooms_endpoint_etag():
+    from main import app
+    from app.api import game as game_api
+    from app.api.game import rooms
+    from app.services.room_summary import room_summaries
+
+    with TestClient(app) as client:
+        room = client.post("/api/rooms", json={"name": "大厅测试"}).json()
+        response = client.get("/api/rooms", params={"status": "waiting", "limit": 100})
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        ids = [r["id"] for r in response.json()["rooms"]]
+        assert room["id"] in ids
+
+        # 列表未变化时返回304（与排行榜相同，支持多个 ETag 和 *）
+        response = client.get("/api/rooms", params={"status": "waiting", "limit": 100}, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        for header in (f'W/"old", {etag}', etag.replace("W/", ""), "*"):
+            response = client.get("/api/rooms", params={"status": "waiting", "limit": 100},
+                                  headers={"If-None-Match": header})
+            assert response.status_code == 304
+
+        # 有人加入后 ETag 失效
+        client.post(f"/api/rooms/{room['id']}/join", json={"player_name": "甲"})
+        response = client.get("/api/rooms", params={"status": "waiting", "limit": 100}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        summary = next(r for r in response.json()["rooms"] if r["id"] == room["id"])
+        assert summary["player_names"] == ["甲"] and "players" not in summary
+
+        assert client.get("/api/rooms", params={"limit": 1000}).status_code == 422
+
+        # 分片部署时不缓存，但同样带上版本号
+        original = game_api.shard_map
+        game_api.shard_map = SimpleNamespace(enabled=True)
+        try:
+            data = client.get("/api/rooms", params={"limit": 100}).json()
+        finally:
+            game_api.shard_map = original
+        assert data["version"] == room_summaries.version and room["id"] in [r["id"] for r in data["rooms"]]
+        rooms.pop(room["id"], None)
+        room_summaries.remove(room["id"])
+    print("✓ 房间列表接口ETag正确")
+
+
+if __name__ == "__main__":
+    test_summary_has_no_secrets()
+    test_incremental_updates_and_cache()
+    test_pagination_and_status_filter()
+    test_rooms_endpoint_etag()
+    print("\n所有测试通过！")
@@ -0,0 +1,98 @@
+"""
+测试房间一致性哈希分片与错误分片重定向
+"""
+import sys
+import os
+import asyncio
+from collections import Counter
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.sharding import (
+    HashRing, ShardMap, ShardRoutingMiddleware, room_id_from_path, WRONG_SHARD_CLOSE_CODE
+)
+
+URLS = ["http://127.0.0.1:8000", "http://127.0.0.1:8001", "https://shard2.example.com"]
+
+
+def _room_ids(n):
+    return [f"room-{i}" for i in range(n)]
+
+
+def test_hash_ring_balance_and_stability():
+    """分布大致均匀；增加一个分片时只有约 1/N 的房间迁移"""
+    ring3, ring4 = HashRing(3), HashRing(4)
+    ids = _room_ids(6000)
+    counts = Counter(ring3.shard_for(r) for r in ids)
+    assert set(counts) == {0, 1, 2}
+    assert min(counts.values()) > 6000 / 3 * 0.7, counts
+
+    moved = sum(ring3.shard_for(r) != ring4.shard_for(r) for r in ids)
+    assert moved < 6000 * 0.4, moved
+    # 迁移的房间只会迁到新分片
+    assert all(ring4.shard_for(r) == 3 for r in ids if ring3.shard_for(r) != ring4.shard_for(r))
+    print(f"分布: {dict(counts)}, 增加分片后迁移: {moved}/6000")
+
+
+def test_new_room_id_is_local():
+    shard_map = ShardMap(1, URLS)
+    for _ in range(20):
+        assert shard_map.owner(shard_map.new_room_id()) == 1
+    assert not ShardMap(0, []).enabled
+    assert ShardMap(0, []).is_local("anything")
+    assert shard_map.ws_url(2) == "wss://shard2.example.com"
+
+
+def test_room_id_from_path():
+    assert room_id_from_path("/api/rooms/abc/join") == "abc"
+    assert room_id_from_path("/api/rooms/abc") == "abc"
+    assert room_id_from_path("/ws/game/abc") == "abc"
+    assert room_id_from_path("/api/rooms") is None
+    assert room_id_from_path("/api/auth/login") is None
+
+
+def _call(middleware, scope, incoming=()):
+    sent = []
+    queue = list(incoming)
+
+    async def receive():
+        return queue.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def test_middleware_redirects_foreign_rooms():
+    shard_map = ShardMap(0, URLS)
+    local = next(r for r in _room_ids(100) if shard_map.owner(r) == 0)
+    foreign = next(r for r in _room_ids(100) if shard_map.owner(r) == 2)
+    passed = []
+
+    async def app(scope, receive, send):
+        passed.append(scope["path"])
+
+    middleware = ShardRoutingMiddleware(app, shard_map)
+
+    _call(middleware, {"type": "http", "path": f"/api/rooms/{local}/join", "query_string": b""})
+    _call(middleware, {"type": "http", "path": "/api/rooms", "query_string": b""})
+    assert passed == [f"/api/rooms/{local}/join", "/api/rooms"]
+
+    sent = _call(middleware, {"type": "http", "path": f"/api/rooms/{foreign}/join", "query_string": b"x=1"})
+    assert sent[0]["status"] == 307
+    headers = dict(sent[0]["headers"])
+    assert headers[b"location"] == f"https://shard2.example.com/api/rooms/{foreign}/join?x=1".encode()
+    assert headers[b"x-shard"] == b"2"
+
+    sent = _call(middleware, {"type": "websocket", "path": f"/ws/game/{foreign}"}, [{"type": "websocket.connect"}])
+    assert sent[0]["type"] == "websocket.accept"
+    assert sent[1] == {"type": "websocket.close", "code": WRONG_SHARD_CLOSE_CODE, "reason": "wss://shard2.example.com"}
+    assert len(passed) == 2
+
+
+if __name__ == "__main__":
+    test_hash_ring_balance_and_stability()
+    test_new_room_id_is_local()
+    test_room_id_from_path()
+    test_middleware_redirects_foreign_rooms()
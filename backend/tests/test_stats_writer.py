@@ -0,0 +1,146 @@
+"""
+测试战绩批量写入（合并增量、批量UPDATE、失败重试、队列上限、换事件循环后重新启动）
+"""
+import sys
+import os
+import asyncio
+import uuid
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.user import User, Stats
+from app.models.game import PlayerPosition
+from app.services.stats_service import StatsWriter, compute_stats_deltas
+
+
+def _player(position, registered=True):
+    player_id = str(uuid.uuid4())
+    return SimpleNamespace(id=player_id, user_id=player_id if registered else None, position=position)
+
+
+def _players():
+    return [_player(pos) for pos in [PlayerPosition.NORTH, PlayerPosition.WEST, PlayerPosition.SOUTH, PlayerPosition.EAST]]
+
+
+SUMMARY = {"dealer_side": "north_south", "dealer_level_up": 2, "idle_level_up": 0,
+           "dealer_wins": True, "total_score": 35}
+
+
+async def _make_db(path, players):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        for i, p in enumerate(players):
+            db.add(User(id=p.id, username=f"u{i}", password_hash="x", stats=Stats()))
+        await db.commit()
+    return engine, session_factory
+
+
+async def _stats(session_factory):
+    async with session_factory() as db:
+        rows = (await db.execute(select(Stats))).scalars().all()
+        return {r.user_id: r for r in rows}
+
+
+def test_compute_deltas_skips_guests():
+    # 游客的玩家ID同样是 UUID，只有 user_id 为空
+    players = _players() + [_player(PlayerPosition.NORTH, registered=False)]
+    deltas = compute_stats_deltas(SUMMARY, players)
+    assert len(deltas) == 4
+    north = deltas[0]
+    assert north["wins"] == 1 and north["dealer_level_ups"] == 2 and north["idle_level_ups"] == 0
+    west = deltas[1]
+    assert west["wins"] == 0 and west["dealer_level_ups"] == 0
+
+
+def test_batched_increments(tmp_path):
+    """多局合并为一批，按增量累加到已有战绩上"""
+    players = _players()
+
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "stats.db", players)
+        writer = StatsWriter(session_factory, flush_interval=0.05)
+        writer.start()
+        for _ in range(3):
+            assert writer.submit(SUMMARY, players)
+        assert writer.queue_depth == 3
+        await asyncio.sleep(0.3)
+        assert writer.queue_depth == 0
+        stats = await _stats(session_factory)
+        north, west = stats[players[0].id], stats[players[1].id]
+        assert (north.games_played, north.wins, north.dealer_level_ups, north.total_score) == (3, 3, 6, 105)
+        assert (west.games_played, west.wins, west.idle_level_ups) == (3, 0, 0)
+        await writer.close()
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 批量累加正确")
+
+
+def test_retry_after_failure(tmp_path):
+    """写入失败后重试，不丢失也不重复"""
+    players = _players()
+
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "stats.db", players)
+        calls = {"n": 0}
+
+        def flaky_factory():
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RuntimeError("数据库暂时不可用")
+            return session_factory()
+
+        writer = StatsWriter(flaky_factory, retry_backoff=0.01)
+        writer.submit(SUMMARY, players)
+        assert await writer.flush() == 0
+        assert calls["n"] == 2
+        assert (await _stats(session_factory))[players[0].id].games_played == 1
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 失败重试正确")
+
+
+def test_queue_is_bounded():
+    """队列满时丢弃最旧的一局"""
+    writer = StatsWriter(max_queue=2)
+    for _ in range(3):
+        writer.submit(SUMMARY, _players())
+    assert writer.queue_depth == 2
+    # 没有注册玩家的对局不进入队列
+    assert not writer.submit(SUMMARY, [_player(PlayerPosition.NORTH, registered=False)])
+    assert writer.queue_depth == 2
+
+
+def test_restart_in_new_event_loop(tmp_path):
+    """同一进程内再次启动（换了事件循环，例如应用被启动两次）后后台任务仍能写入"""
+    players = _players()
+    path = tmp_path / "stats.db"
+
+    async def setup():
+        engine, _ = await _make_db(path, players)
+        await engine.dispose()
+
+    async def play_round(writer):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        writer.session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        writer.start()
+        writer.submit(SUMMARY, players)
+        await asyncio.sleep(0.2)
+        # 由后台任务写入，不是 close 时的 flush
+        assert writer.queue_depth == 0
+        await writer.close()
+        games = (await _stats(writer.session_factory))[players[0].id].games_played
+        await engine.dispose()
+        return games
+
+    asyncio.run(setup())
+    writer = StatsWriter(flush_interval=0.01)
+    assert asyncio.run(play_round(writer)) == 1
+    assert asyncio.run(play_round(writer)) == 2
+    print("✓ 换事件循环后重新启动正确")
@@ -0,0 +1,109 @@
+"""
+测试已验证令牌缓存（LRU上限、exp/TTL过期、按用户失效、命中时不查库）
+"""
+import sys
+import os
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.user import User
+from app.core.security import (
+    TokenCache, CurrentUser, token_cache, get_current_user_cached, get_current_user_optional, require_user,
+    create_access_token,
+)
+
+
+def _user(name: str) -> CurrentUser:
+    return CurrentUser(id=str(uuid.uuid4()), username=name, is_admin=False)
+
+
+def test_lru_and_expiry():
+    cache = TokenCache(max_size=2, ttl_seconds=60)
+    a, b, c = _user("a"), _user("b"), _user("c")
+    cache.put("ta", a)
+    cache.put("tb", b)
+    assert cache.get("ta") == a  # ta 变为最近使用
+    cache.put("tc", c)
+    assert cache.get("tb") is None and cache.get("ta") == a and len(cache) == 2
+
+    # 令牌 exp 早于 TTL 时以 exp 为准
+    cache.put("expired", _user("d"), exp=time.time() - 1)
+    assert cache.get("expired") is None
+    short = TokenCache(ttl_seconds=0)
+    short.put("t", a, exp=time.time() + 3600)
+    assert short.get("t") is None
+
+    # 按用户清除全部令牌
+    cache = TokenCache()
+    cache.put("t1", a)
+    cache.put("t2", a)
+    cache.put("t3", b)
+    cache.invalidate_users([a.id])
+    assert cache.get("t1") is None and cache.get("t2") is None and cache.get("t3") == b
+    print("✓ LRU与过期正确")
+
+
+class _NoDb:
+    """命中缓存时不应访问数据库"""
+
+    async def execute(self, *args, **kwargs):
+        raise AssertionError("不应查询数据库")
+
+
+def test_dependency_uses_cache(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with session_factory() as db:
+            db.add(User(id="u-1", username="alice", password_hash="x", is_admin=True))
+            await db.commit()
+
+        token_cache.clear()
+        token = create_access_token({"sub": "alice"})
+        async with session_factory() as db:
+            user = await get_current_user_cached(token, db)
+        assert user == CurrentUser(id="u-1", username="alice", is_admin=True)
+        # 第二次直接命中缓存
+        assert await get_current_user_cached(token, _NoDb()) == user
+        assert await get_current_user_optional(token) == "alice"
+
+        # 无效和过期的令牌
+        assert await get_current_user_cached("not-a-jwt", _NoDb()) is None
+        expired = create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=-1))
+        assert await get_current_user_cached(expired, _NoDb()) is None
+
+        # 用户被删除后清除缓存，再次访问时查不到用户
+        token_cache.invalidate_users(["u-1"])
+        async with session_factory() as db:
+            await db.execute(User.__table__.delete())
+            await db.commit()
+            assert await get_current_user_cached(token, db) is None
+        # 必须登录的接口：未登录返回 401
+        try:
+            await require_user(None)
+            assert False, "未登录时应返回401"
+        except HTTPException as e:
+            assert e.status_code == 401
+        assert await require_user(user) == user
+        token_cache.clear()
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 依赖命中缓存时不查库")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_lru_and_expiry()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_dependency_uses_cache(Path(tmp))
+    print("\n所有测试通过！")
@@ -0,0 +1,95 @@
+"""
+测试不活跃用户清理任务（分批删除、保留对局历史、进度与并发控制）
+"""
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db.database import Base
+from app.models.user import User, Stats
+from app.models.history import GameRound, RoundPlayer
+from app.core.security import token_cache, CurrentUser
+from app.services.user_cleanup import UserCleanupJob, CleanupAlreadyRunning
+
+
+async def _make_db(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    old = datetime.utcnow() - timedelta(days=60)
+    async with session_factory() as db:
+        for i in range(25):
+            db.add(User(id=f"old-{i:02d}", username=f"old{i}", password_hash="x", last_active=old, stats=Stats()))
+        for i in range(3):
+            db.add(User(id=f"new-{i}", username=f"new{i}", password_hash="x", stats=Stats()))
+        db.add(User(id="admin", username="admin", password_hash="x", is_admin=True, last_active=old, stats=Stats()))
+        db.add(GameRound(id="r1", ended_at=old, dealer_side="north_south"))
+        db.add(RoundPlayer(round_id="r1", position="north", user_id="old-00", player_name="old0", ended_at=old))
+        await db.commit()
+    return engine, session_factory
+
+
+def test_cleanup_in_batches(tmp_path):
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "cleanup.db")
+        token_cache.clear()
+        token_cache.put("t-old", CurrentUser(id="old-03", username="old3", is_admin=False))
+
+        job = UserCleanupJob(session_factory, batch_size=10, min_pause=0.001)
+        state = job.start(days=30)
+        assert state["status"] == "running"
+        with pytest.raises(CleanupAlreadyRunning):
+            job.start(days=30)
+        await job._task
+
+        state = job.status()
+        assert state["status"] == "done" and state["deleted"] == 25 and state["batches"] == 3
+        assert state["finished_at"] is not None
+        async with session_factory() as db:
+            names = sorted(u.username for u in (await db.execute(select(User))).scalars().all())
+            assert names == ["admin", "new0", "new1", "new2"]
+            assert (await db.execute(select(func.count()).select_from(Stats))).scalar() == 4
+            # 对局历史保留，只解除关联
+            seat = (await db.execute(select(RoundPlayer))).scalars().one()
+            assert seat.user_id is None and seat.player_name == "old0"
+        assert token_cache.get("t-old") is None
+
+        # 没有可清理的用户时直接完成
+        job.start(days=30)
+        await job._task
+        assert job.status()["deleted"] == 0 and job.status()["status"] == "done"
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 分批清理正确")
+
+
+def test_cleanup_can_be_stopped(tmp_path):
+    async def run():
+        engine, session_factory = await _make_db(tmp_path / "cleanup.db")
+        # 每批之后暂停较久，停止时只完成了第一批
+        job = UserCleanupJob(session_factory, batch_size=10, min_pause=10)
+        job.start(days=30)
+        while job.status()["batches"] == 0:
+            await asyncio.sleep(0.01)
+        await job.stop()
+        assert job.status()["status"] == "cancelled" and job.status()["deleted"] == 10
+        await engine.dispose()
+    asyncio.run(run())
+    print("✓ 停止清理正确")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cleanup_in_batches(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cleanup_can_be_stopped(Path(tmp))
+    print("\n所有测试通过！")
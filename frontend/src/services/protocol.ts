@@ -0,0 +1,149 @@
+/**
+ * WebSocket 紧凑二进制协议（qv1.binary）解码
+ *
+ * 与后端 app/websocket/protocol.py、app/game/compact_codec.py、app/game/card_codes.py 保持一致：
+ * 帧结构为 [版本号][事件类型编号][消息体]，消息体使用带类型标签的紧凑编码。
+ * 事件类型表和驻留字符串表只能在末尾追加。
+ */
+
+export const PROTOCOL_BINARY = 'qv1.binary'
+export const PROTOCOL_JSON = 'json'
+
+const FRAME_VERSION = 1
+const UNKNOWN_EVENT = 0xff
+
+export const EVENT_TYPES = [
+  'state_snapshot', 'card_played', 'trick_complete', 'score_updated', 'round_end',
+  'countdown_updated', 'players_updated', 'deal_tick', 'phase_changed', 'bidding_updated',
+  'bottom_updated', 'ready_to_start_updated', 'ready_for_next_round_updated',
+  'slingshot_failed_notification', 'cards_selected', 'error', 'pong', 'ping', 'play_card',
+  'make_bid', 'pass_bid', 'submit_bottom', 'finish_bidding', 'select_cards',
+  'ready_to_start_game', 'cancel_ready_to_start_game', 'ready_for_next_round', 'auto_deal',
+  'auto_play', 'batch',
+]
+
+export const INTERNED_STRINGS = [
+  'player_id', 'player_position', 'cards', 'current_trick', 'current_player',
+  'trick_complete', 'current_trick_max_player', 'play_type', 'remaining_time',
+  'countdown_active', 'idle_score', 'tricks_won', 'last_trick', 'phase',
+  'players', 'id', 'name', 'position', 'cards_count', 'players_cards_count',
+  'my_hand', 'countdown', 'ready_count', 'total_players', 'ready_players',
+  'message', 'player', 'card', 'dealt_count', 'sorted_hand', 'bidding',
+  'bidding_cards', 'result', 'success',
+  'north', 'south', 'east', 'west', 'north_south', 'east_west',
+  'waiting', 'dealing', 'bottom', 'playing', 'scoring',
+  'single', 'pair',
+  'room_id', 'room_name', 'owner_id', 'current_level', 'north_south_level',
+  'east_west_level', 'dealer_position', 'dealer_player_id', 'trump_suit',
+  'bottom_cards_count', 'dealer_has_bottom', 'bottom_pending', 'play_time_limit',
+  'ace_reset_enabled', 'bottom_cards', 'newly_added_bottom_cards',
+  'current_trick_max_player_id', 'current_trick_max_player_name', 'round_summary',
+  'ready_for_next_round', 'ready_to_start', 'all_ready', 'turn_player_id',
+  'slingshot_failed', 'forced_cards', 'player_name', 'tractor', 'slingshot',
+  'finished', 'done', 'events',
+  '♠', '♥', '♦', '♣',
+]
+
+// 卡牌编码表：花色序号 * 13 + 点数序号，52~55 为大小王
+const SUITS = ['♠', '♥', '♦', '♣']
+const RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+export const CARD_STRINGS: string[] = [
+  ...SUITS.flatMap(s => RANKS.map(r => `${r}${s}`)),
+  'JOKER-B/小王', 'JOKER-A/大王', 'JOKER-B', 'JOKER-A',
+]
+
+const TAG_NIL = 0xc0
+const TAG_FALSE = 0xc2
+const TAG_TRUE = 0xc3
+const TAG_INT32 = 0xc4
+const TAG_FLOAT64 = 0xc5
+const TAG_STR = 0xc6
+const TAG_LIST = 0xc7
+const TAG_MAP = 0xc8
+const TAG_INTERNED_EXT = 0xc9
+const TAG_INT64 = 0xca
+const TAG_BYTES = 0xcb
+const TAG_INTERNED_BASE = 0xd0
+
+const utf8 = new TextDecoder()
+
+class Reader {
+  pos = 0
+  view: DataView
+  constructor(public buf: Uint8Array) {
+    this.view = new DataView(buf.buffer, buf.byteOffset, buf.byteLength)
+  }
+  varint(): number {
+    let result = 0
+    let shift = 0
+    for (;;) {
+      const b = this.buf[this.pos++]
+      if (b === undefined) throw new Error('varint 被截断')
+      result += (b & 0x7f) * Math.pow(2, shift)
+      if (!(b & 0x80)) return result
+      shift += 7
+    }
+  }
+  value(): unknown {
+    const tag = this.buf[this.pos++]
+    if (tag === undefined) throw new Error('数据被截断')
+    if (tag < 0x80) return tag
+    if (tag < TAG_NIL) return CARD_STRINGS[tag - 0x80]
+    if (tag >= TAG_INTERNED_BASE) return INTERNED_STRINGS[tag - TAG_INTERNED_BASE]
+    switch (tag) {
+      case TAG_NIL: return null
+      case TAG_FALSE: return false
+      case TAG_TRUE: return true
+      case TAG_INT32: { const v = this.view.getInt32(this.pos); this.pos += 4; return v }
+      case TAG_INT64: { const v = Number(this.view.getBigInt64(this.pos)); this.pos += 8; return v }
+      case TAG_FLOAT64: { const v = this.view.getFloat64(this.pos); this.pos += 8; return v }
+      case TAG_STR: {
+        const len = this.varint()
+        const s = utf8.decode(this.buf.subarray(this.pos, this.pos + len))
+        this.pos += len
+        return s
+      }
+      case TAG_BYTES: {
+        const len = this.varint()
+        const b = this.buf.slice(this.pos, this.pos + len)
+        this.pos += len
+        return b
+      }
+      case TAG_LIST: {
+        const n = this.varint()
+        const arr: unknown[] = []
+        for (let i = 0; i < n; i++) arr.push(this.value())
+        return arr
+      }
+      case TAG_MAP: {
+        const n = this.varint()
+        const obj: Record<string, unknown> = {}
+        for (let i = 0; i < n; i++) {
+          const k = this.value() as string
+          obj[k] = this.value()
+        }
+        return obj
+      }
+      case TAG_INTERNED_EXT: return INTERNED_STRINGS[this.buf[this.pos++]]
+    }
+    throw new Error(`未知标签: 0x${tag.toString(16)}`)
+  }
+}
+
+/** 解码一个二进制帧为消息对象 */
+export function decodeFrame(data: ArrayBuffer): Record<string, unknown> {
+  const buf = new Uint8Array(data)
+  if (buf[0] !== FRAME_VERSION) throw new Error(`不支持的帧版本: ${buf[0]}`)
+  const reader = new Reader(buf)
+  reader.pos = 2
+  const body = reader.value() as Record<string, unknown>
+  const code = buf[1]
+  if (code === UNKNOWN_EVENT) return body
+  return { type: EVENT_TYPES[code], ...body }
+}
+
+/** 按帧类型解码收到的消息（文本帧为 JSON） */
+export function decodeMessage(data: unknown): Record<string, unknown> {
+  if (data instanceof ArrayBuffer) return decodeFrame(data)
+  return JSON.parse(String(data))
+}
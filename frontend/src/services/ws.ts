@@ -1,5 +1,14 @@
+import { PROTOCOL_BINARY, PROTOCOL_JSON } from '@/services/protocol'
+
+/** 服务端分片部署时，房间不在当前进程的关闭码；关闭原因为目标分片的 WebSocket 地址 */
+const WRONG_SHARD_CLOSE_CODE = 4010
+/** 服务端重启（停机前已保存房间）的关闭码；关闭原因为建议的重连延迟（毫秒） */
+const SERVICE_RESTART_CLOSE_CODE = 1012
+
 export type WsOptions = {
   url: string
+  /** 是否协商紧凑二进制协议（同时提供 json 子协议，由服务端选择） */
+  binary?: boolean
   onOpen?: () => void
   onClose?: () => void
   onMessage?: (ev: MessageEvent) => void
@@ -9,15 +18,35 @@ export function createWsClient(opts: WsOptions) {
   let ws: WebSocket | null = null
   let retry = 0
   let closedByUser = false
+  let url = opts.url
 
   const connect = () => {
-    ws = new WebSocket(opts.url)
+    ws = opts.binary
+      ? new WebSocket(url, [PROTOCOL_BINARY, PROTOCOL_JSON])
+      : new WebSocket(url)
+    ws.binaryType = 'arraybuffer'
     ws.onopen = () => {
       retry = 0
       opts.onOpen?.()
     }
-    ws.onclose = () => {
+    ws.onclose = (ev) => {
+      if (ev.code === WRONG_SHARD_CLOSE_CODE && ev.reason && !closedByUser) {
+        // 换到房间所在分片后立即重连（保留路径和查询参数）
+        const target = new URL(ev.reason)
+        const next = new URL(url)
+        next.protocol = target.protocol
+        next.host = target.host
+        url = next.toString()
+        connect()
+        return
+      }
       opts.onClose?.()
+      if (ev.code === SERVICE_RESTART_CLOSE_CODE && !closedByUser) {
+        // 新进程会恢复房间，按服务端建议的延迟重连，不计入退避次数
+        retry = 0
+        setTimeout(connect, Number(ev.reason) || 1000)
+        return
+      }
       if (!closedByUser) {
         const delay = Math.min(1000 * Math.pow(2, retry++), 10000)
         setTimeout(connect, delay)
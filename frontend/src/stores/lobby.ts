@@ -0,0 +1,95 @@
+import { defineStore } from 'pinia'
+import { createWsClient } from '@/services/ws'
+import { getWebSocketUrl } from '@/config/env'
+
+/** 大厅房间摘要（与后端 room_summary.summarize_room 一致） */
+export type RoomSummary = {
+  id: string
+  name: string
+  status: 'waiting' | 'playing' | 'finished'
+  phase: string | null
+  player_count: number
+  max_players: number
+  player_names: string[]
+  is_full: boolean
+  play_time_limit: number
+  level_up_mode: string
+  ace_reset_enabled: boolean
+  created_at: string
+}
+
+type LobbyMsg = {
+  type?: string
+  version?: number
+  rooms?: RoomSummary[]
+  room?: RoomSummary
+  room_id?: string
+}
+
+/**
+ * 大厅房间列表：连接 /ws/lobby 后先收到完整列表，之后只收增量事件
+ * 每个事件带 version，不比当前列表新的事件直接忽略（重连、重发完整列表时会出现）
+ */
+export const useLobbyStore = defineStore('lobby', {
+  state: () => ({
+    rooms: [] as RoomSummary[],
+    version: -1,
+    loaded: false,
+    connected: false,
+    client: null as null | { send: (d: unknown) => void; close: () => void },
+  }),
+  actions: {
+    connect() {
+      this.disconnect()
+      this.client = createWsClient({
+        url: getWebSocketUrl('/ws/lobby'),
+        onOpen: () => { this.connected = true },
+        onClose: () => { this.connected = false },
+        onMessage: (ev) => {
+          try {
+            this.apply(JSON.parse(ev.data) as LobbyMsg)
+          } catch (error) {
+            console.error('大厅消息解析失败:', error)
+          }
+        },
+      })
+    },
+    disconnect() {
+      if (this.client) {
+        this.client.close()
+        this.client = null
+      }
+      this.connected = false
+    },
+    /** 用完整列表替换（WebSocket 的 lobby_snapshot 或 REST /api/rooms 的结果） */
+    applySnapshot(data: { version?: number; rooms: RoomSummary[] }) {
+      this.rooms = data.rooms
+      // 没有版本号时保留当前版本，之后的推送事件仍按原来的版本比较
+      if (typeof data.version === 'number') {
+        this.version = data.version
+      }
+      this.loaded = true
+    },
+    apply(msg: LobbyMsg) {
+      if (msg.type === 'lobby_snapshot') {
+        this.applySnapshot({ version: msg.version ?? 0, rooms: msg.rooms || [] })
+        return
+      }
+      if (msg.version === undefined || msg.version <= this.version) return
+      this.version = msg.version
+      switch (msg.type) {
+        case 'room_added':
+        case 'room_updated': {
+          const room = msg.room as RoomSummary
+          const index = this.rooms.findIndex(r => r.id === room.id)
+          if (index >= 0) this.rooms.splice(index, 1, room)
+          else this.rooms.push(room)
+          break
+        }
+        case 'room_removed':
+          this.rooms = this.rooms.filter(r => r.id !== msg.room_id)
+          break
+      }
+    },
+  },
+})
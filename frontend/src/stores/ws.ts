@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
 import { createWsClient } from '@/services/ws'
+import { decodeMessage } from '@/services/protocol'
 import { useGameStore } from '@/stores/game'
 
 type Msg = { type?: string; [k: string]: any }
@@ -7,6 +8,8 @@ type Msg = { type?: string; [k: string]: any }
 export const useWsStore = defineStore('ws', {
   state: () => ({
     url: (import.meta.env.VITE_WS_URL as string) || '',
+    // 默认协商紧凑二进制协议，可通过 VITE_WS_BINARY=false 关闭
+    binary: (import.meta.env.VITE_WS_BINARY as string) !== 'false',
     connected: false,
     log: [] as string[],
     client: null as null | { send: (d: unknown) => void; close: () => void },
@@ -22,14 +25,19 @@ export const useWsStore = defineStore('ws', {
       this.disconnect()
       const client = createWsClient({
         url,
+        binary: this.binary,
         onOpen: () => { this.connected = true; this._push('WS 连接成功') },
         onClose: () => { this.connected = false; this._push('WS 连接关闭') },
         onMessage: (ev) => {
           try {
-            const data = JSON.parse(ev.data) as Msg
-            const msgStr = JSON.stringify(data).slice(0, 150)
-            this._push(`<- ${data.type || 'message'}${msgStr.length < 100 ? ': ' + msgStr : ''}`)
-            this._dispatch(data)
+            const data = decodeMessage(ev.data) as Msg
+            // 服务端会把一次操作产生的多个事件合并为 batch 帧，按顺序逐个分发
+            const events = data.type === 'batch' && Array.isArray(data.events) ? data.events as Msg[] : [data]
+            for (const evt of events) {
+              const msgStr = JSON.stringify(evt).slice(0, 150)
+              this._push(`<- ${evt.type || 'message'}${msgStr.length < 100 ? ': ' + msgStr : ''}`)
+              this._dispatch(evt)
+            }
           } catch {
             this._push(`<raw> ${String(ev.data).slice(0,200)}`)
           }